@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the overhead added by Action to driver method calls.
+
+    Usage: python bench_action.py [number of calls]
+"""
+
+import sys
+import timeit
+import inspect
+
+from lantz import Driver, Action
+
+
+class BenchDriver(Driver):
+
+    @Action()
+    def pulse(self):
+        pass
+
+    @Action()
+    def step(self, axis, steps, speed=1):
+        pass
+
+    def plain_step(self, axis, steps, speed=1):
+        pass
+
+
+def bench(name, func, number):
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print('{:40s} {:8.2f} us per call'.format(name, elapsed / number * 1e6))
+
+
+def main(number=100000):
+    obj = BenchDriver()
+    bench('plain method', lambda: obj.plain_step(1, 10), number)
+    bench('inspect.getcallargs', lambda: inspect.getcallargs(obj.plain_step, 1, 10), number)
+    bench('Action without arguments', lambda: obj.pulse(), number)
+    bench('Action with positional arguments', lambda: obj.step(1, 10), number)
+    bench('Action with keyword arguments', lambda: obj.step(1, steps=10), number)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the overhead added by LibraryDriver to foreign function calls,
+    using the C and math libraries.
+
+    Usage: python bench_foreign.py [number of calls]
+"""
+
+import sys
+import timeit
+import ctypes
+from ctypes.util import find_library
+
+from lantz.foreign import LibraryDriver, RetValue, RetTuple, RetArray, BufferPool
+
+
+class BenchDriver(LibraryDriver):
+
+    LIBRARY_NAME = (find_library('m'), find_library('c'))
+
+    def _add_types(self):
+        self.lib.frexp.restype = ctypes.c_double
+        self.lib.frexp.argtypes = (ctypes.c_double, ctypes.c_void_p)
+        self.lib.memset.restype = ctypes.c_void_p
+        self.lib.memset.argtypes = (ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t)
+
+
+def bench(name, func, number):
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print('{:40s} {:8.2f} us per call'.format(name, elapsed / number * 1e6))
+
+
+def main(number=100000):
+    obj = BenchDriver()
+    libm = ctypes.CDLL(find_library('m'))
+    libm.frexp.restype = ctypes.c_double
+    libm.frexp.argtypes = (ctypes.c_double, ctypes.c_void_p)
+    exponent = ctypes.c_int()
+
+    bench('ctypes abs(int)', lambda: libm.abs(-3), number)
+    bench('LibraryDriver abs(int)', lambda: obj.lib.abs(-3), number)
+    bench('ctypes atoi(bytes)', lambda: libm.atoi(b'42'), number)
+    bench('LibraryDriver atoi(str)', lambda: obj.lib.atoi('42'), number)
+    bench('ctypes frexp(float, int*)', lambda: libm.frexp(10., ctypes.byref(exponent)), number)
+    bench('LibraryDriver frexp(float, RetValue)', lambda: obj.lib.frexp(10., RetValue('i')), number)
+
+    size = 4096
+    pool = BufferPool()
+    bench('LibraryDriver memset(RetTuple)', lambda: obj.lib.memset(RetTuple('B', size), 1, size), number // 10)
+    bench('LibraryDriver memset(RetArray)', lambda: obj.lib.memset(RetArray('B', size), 1, size), number // 10)
+    bench('LibraryDriver memset(RetArray, pool)',
+          lambda: obj.lib.memset(RetArray('B', size, pool), 1, size), number // 10)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the number of log records per second ingested by
+    LoggingTCPServer from several senders.
+
+    Usage: python bench_log.py [number of records per sender] [number of senders]
+"""
+
+import sys
+import time
+import socket
+import logging
+import threading
+from logging.handlers import SocketHandler
+
+from lantz.log import LoggingTCPServer, get_logger, pack_records
+
+
+def make_records(number):
+    logger = get_logger('lantz.bench')
+    return [logger.makeRecord('lantz.bench', logging.DEBUG, __file__, 1, 'Getting {} = {}',
+                              ('power', ndx), None, 'get',
+                              {'lantz_driver': 'BenchDriver', 'lantz_name': 'bench',
+                               'lantz_feat': ('power', str(ndx))})
+            for ndx in range(number)]
+
+
+def bench(name, frames, records_per_sender, senders):
+    total = records_per_sender * senders
+    received = [0]
+    done = threading.Event()
+
+    def on_record(record):
+        received[0] += 1
+        if received[0] == total:
+            done.set()
+
+    server = LoggingTCPServer(('localhost', 0), on_record, .1)
+    thread = threading.Thread(target=server.serve_until_stopped)
+    thread.start()
+
+    data = b''.join(frames)
+
+    def send():
+        with socket.create_connection(server.server_address) as sock:
+            sock.sendall(data)
+            done.wait(60)
+
+    clients = [threading.Thread(target=send) for _ in range(senders)]
+    tic = time.perf_counter()
+    for client in clients:
+        client.start()
+    done.wait(60)
+    elapsed = time.perf_counter() - tic
+
+    for client in clients:
+        client.join()
+    server.stop()
+    thread.join()
+
+    print('{:40s} {:10.0f} records/s ({} of {})'.format(name, received[0] / elapsed, received[0], total))
+
+
+def main(number=20000, senders=4):
+    records = make_records(number)
+    pickler = SocketHandler('localhost', 0)
+    bench('pickled records', [pickler.makePickle(record) for record in records], number, senders)
+    bench('packed batches of 256 records',
+          [pack_records(records[ndx:ndx + 256]) for ndx in range(0, number, 256)], number, senders)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
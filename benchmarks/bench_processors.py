@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of Lantz processors applied to large NumPy arrays.
+
+    Compares applying the processor to the whole array with applying it
+    element by element, and the scalar unit conversion with plain pint.
+
+    Usage: python bench_processors.py [number of elements]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from lantz import Q_
+from lantz import processors
+
+
+def bench(name, func, value, elementwise=True, number=3):
+    vectorized = min(timeit.repeat(lambda: func(value), number=1, repeat=number))
+    if elementwise:
+        items = list(value.magnitude if isinstance(value, Q_) else value)
+        if isinstance(value, Q_):
+            items = [Q_(item, value.units) for item in items]
+        python = min(timeit.repeat(lambda: [func(item) for item in items], number=1, repeat=1))
+        print('{:30s} vectorized {:8.4f} s  element-wise {:8.4f} s  ({:.0f}x)'.format(name, vectorized, python,
+                                                                                        python / vectorized))
+    else:
+        print('{:30s} vectorized {:8.4f} s'.format(name, vectorized))
+
+
+def bench_scalar(name, func, value, number=100000):
+    elapsed = min(timeit.repeat(lambda: func(value), number=number, repeat=3))
+    print('{:30s} {:8.2f} us per call'.format(name, elapsed / number * 1e6))
+
+
+def main(size=1000000):
+    bench_scalar('convert_to (scalar)', processors.convert_to('mV', return_float=True), Q_(1, 'V'))
+    bench_scalar('pint Quantity.to (scalar)', lambda value: value.to('mV').magnitude, Q_(1, 'V'))
+
+    data = np.random.uniform(0, 10, size)
+    print('Processing {} elements'.format(size))
+
+    bench('convert_to (return_float)', processors.convert_to('mV', return_float=True), Q_(data, 'V'))
+    bench('check_range_and_coerce_step', processors.check_range_and_coerce_step(0, 10, .5), data)
+
+    codes = np.random.randint(0, 4, size)
+    bench('check_membership', processors.check_membership({0, 1, 2, 3}), codes)
+    bench('get_mapping', processors.get_mapping({0: 10, 1: 11, 2: 12, 3: 13}), codes)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
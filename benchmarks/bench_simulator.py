@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the number of commands per second handled by
+    the simulated function generator.
+
+    Usage: python bench_simulator.py [number of commands]
+"""
+
+import sys
+import timeit
+import logging
+
+from lantz.simulators.fungen import SimFunctionGenerator
+
+
+def bench(name, func, number):
+    elapsed = min(timeit.repeat(func, number=number, repeat=3))
+    print('{:40s} {:10.0f} commands/s'.format(name, number / elapsed))
+
+
+def main(number=100000):
+    logging.disable(logging.INFO)
+    inst = SimFunctionGenerator()
+    for command in ('?IDN', '?AMP', '!AMP 1.5', '?DOU 3', '!DOU 3 1', '?XYZ'):
+        bench(command, lambda: inst.handle(command), number)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
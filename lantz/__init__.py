@@ -22,9 +22,9 @@ ureg = UnitRegistry()
 Q_ = ureg.Quantity
 
 from .log import LOGGER
-from .driver import Driver, Feat, DictFeat, Action, initialize_many, finalize_many
+from .driver import Driver, Feat, DictFeat, Action, initialize_many, finalize_many, group
 
-__all__ = ['Driver', 'Action', 'Feat', 'DictFeat', 'Q_']
+__all__ = ['Driver', 'Action', 'group', 'Feat', 'DictFeat', 'Q_']
 
 
 def _run_pyroma(data):   # pragma: no cover
@@ -15,6 +15,7 @@ import copy
 import inspect
 import functools
 
+from collections import OrderedDict
 from weakref import WeakKeyDictionary
 
 from .processors import (Processor, FromQuantityProcessor,
@@ -33,6 +34,52 @@ def _dget(adict, instance=MISSING):
     except KeyError:
         return adict[MISSING]
 
+def _make_binder(func, argnames):
+    """Return a function mapping the arguments of a call to func
+    (excluding the first one) to a tuple ordered as argnames[1:].
+
+    Positional calls are bound without introspection, other calls
+    are resolved by inspect.getcallargs.
+    """
+    names = tuple(argnames[1:])
+    nargs = len(names)
+
+    spec = inspect.getfullargspec(func)
+    if tuple(spec.args) == tuple(argnames) and spec.defaults:
+        defaults = tuple(spec.defaults)
+    else:
+        defaults = ()
+    required = nargs - len(defaults)
+    index = {name: ndx for ndx, name in enumerate(names)}
+
+    def _bind(instance, args, kwargs):
+        nargs_given = len(args)
+        if not kwargs:
+            if nargs_given == nargs:
+                return args
+            if required <= nargs_given < nargs:
+                return args + defaults[nargs_given - required:]
+        elif nargs_given < nargs:
+            values = list(args) + [MISSING] * (nargs - nargs_given)
+            for name, value in kwargs.items():
+                ndx = index.get(name)
+                if ndx is None or values[ndx] is not MISSING:
+                    break
+                values[ndx] = value
+            else:
+                for ndx in range(max(required, nargs_given), nargs):
+                    if values[ndx] is MISSING:
+                        values[ndx] = defaults[ndx - required]
+                if not any(value is MISSING for value in values):
+                    return tuple(values)
+
+        # Let inspect bind unusual calls and raise the appropriate TypeError.
+        values = inspect.getcallargs(func, *(instance, ) + args, **kwargs)
+        return tuple(values[name] for name in names)
+
+    return _bind
+
+
 def _dset(adict, value, instance=MISSING):
     """Helper function to set an element by key
     copying taken the value from MISSING.
@@ -63,10 +110,19 @@ class Action(object):
                 changed but only tested to belong to the container.
     :param units: `Quantity` or string that can be interpreted as units.
     :param procs: Other callables to be applied to input arguments.
+    :param memoize: cache the returned value for each combination of arguments.
+                    Use an integer to set the maximum number of cached values
+                    per instance (True means MEMOIZE_SIZE).
+    :param invalidated_by: names of the feats that clear the cache when they change.
+                           Implies memoize.
 
     """
 
-    def __init__(self, func=None, *, values=None, units=None, limits=None, procs=None):
+    #: Default maximum number of cached values per instance for memoized actions.
+    MEMOIZE_SIZE = 128
+
+    def __init__(self, func=None, *, values=None, units=None, limits=None, procs=None,
+                 memoize=False, invalidated_by=()):
 
         #: instance: key: value
         self.modifiers = WeakKeyDictionary()
@@ -78,10 +134,23 @@ class Action(object):
                                    'processors': procs}
         self.func = func
         self.args = ()
+        self._bind = _make_binder(func, self.args) if func else None
+
+        if isinstance(invalidated_by, str):
+            invalidated_by = (invalidated_by, )
+        self.invalidated_by = tuple(invalidated_by)
+
+        if memoize is True or (self.invalidated_by and not memoize):
+            memoize = self.MEMOIZE_SIZE
+        self.memoize = memoize
+
+        #: instance: (arguments: value)
+        self.memo = WeakKeyDictionary()
 
     def __call__(self, func):
         self.func = func
         self.args = inspect.getfullargspec(func).args
+        self._bind = _make_binder(func, self.args)
         self.__name__ = func.__name__
         self.__doc__ = func.__doc__
         self.rebuild(store=True)
@@ -108,13 +177,14 @@ class Action(object):
                 instance.log_info('Calling {}', name)
 
             try:
-                values = inspect.getcallargs(self.func, *(instance, ) + args, **kwargs)
-                fargs = self.args
-                values = tuple(values[farg] for farg in fargs)[1:]
-                if len(values) == 1:
-                    t_values = (self.pre_action(values[0], instance), )
+                if len(self.args) < 2 and not (args or kwargs):
+                    t_values = ()
                 else:
-                    t_values = self.pre_action(values, instance)
+                    values = self._bind(instance, args, kwargs)
+                    if len(values) == 1:
+                        t_values = (self.pre_action(values[0], instance), )
+                    else:
+                        t_values = self.pre_action(values, instance)
             except Exception as e:
                 instance.log_error('While pre-processing ({}, {}) for {}: {}', args, kwargs, name, e)
                 raise e
@@ -122,17 +192,48 @@ class Action(object):
             if args or kwargs:
                 instance.log_debug('(raw) Calling {} with {}', name, t_values)
 
+            if self.memoize:
+                memo = self.memo.get(instance)
+                if memo is None:
+                    memo = self.memo[instance] = OrderedDict()
+                try:
+                    out = memo[t_values]
+                except (KeyError, TypeError):
+                    # TypeError: unhashable arguments are never cached.
+                    pass
+                else:
+                    memo.move_to_end(t_values)
+                    instance.log_info('{} returned {} (cached)', name, out)
+                    return out
+
             try:
                 tic = time.time()
                 out = self.func(instance, *t_values)
                 instance.timing.add(name, time.time() - tic)
                 instance.log_info('{} returned {}', name, out)
-
-                return out
             except Exception as e:
                 instance.log_error('While calling {} with {}. {}', name, t_values, e)
                 raise e
 
+            if self.memoize:
+                try:
+                    memo[t_values] = out
+                except TypeError:
+                    pass
+                else:
+                    if len(memo) > self.memoize:
+                        memo.popitem(last=False)
+
+            return out
+
+    def clear_cache(self, instance):
+        """Remove the cached values of a memoized action for a given instance.
+        """
+        memo = self.memo.get(instance)
+        if memo:
+            with instance._lock:
+                memo.clear()
+
     def pre_action(self, value, instance=None):
         procs = _dget(self.action_processors, instance)
         for processor in procs:
@@ -223,3 +324,8 @@ class ActionProxy(object):
 
         self.action.rebuild(self.instance, build_doc=False, store=True)
 
+    def clear_cache(self):
+        """Remove the cached values of a memoized action.
+        """
+        self.action.clear_cache(self.instance)
+
@@ -9,18 +9,20 @@
     :license: BSD, see LICENSE for more details.
 """
 import copy
+import time
 import atexit
 import logging
 import threading
 from functools import wraps
+from contextlib import contextmanager
 from concurrent import futures
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 from .utils.qt import MetaQObject, SuperQObject, QtCore
 from .feat import Feat, DictFeat, MISSING, FeatProxy
 from .action import Action, ActionProxy
 from .stats import RunningStats
-from .log import get_logger
+from .log import get_logger, TruncatedPayload, LogRateLimiter
 
 logger = get_logger('lantz.driver', False)
 
@@ -119,6 +121,90 @@ def repartial_submit(fname):
     return wrapped
 
 
+class ActionFuture(futures.Future):
+    """Future returned by the asynchronous methods of a Driver.
+
+    Unlike a plain Future, a call can be cancelled while it is running.
+    cancel() sets a flag polled by the driver with `check_cancelled` and
+    `sleep`, and runs the callbacks registered with `cancel_callback` to
+    interrupt blocking calls. The call can report its progress (in percent)
+    with `report_progress`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._inner = None
+        self._cancel_event = threading.Event()
+        self._cancel_callbacks = []
+        self._progress = None
+        self._progress_callbacks = []
+
+    @property
+    def cancel_requested(self):
+        """True if cancel() was called before the call finished.
+        """
+        return self._cancel_event.is_set()
+
+    @property
+    def progress(self):
+        """Last progress reported by the call (None if never reported).
+        """
+        return self._progress
+
+    def add_progress_callback(self, fn):
+        """Attach a callable that will be called with the future and the
+        progress value each time the call reports it.
+        """
+        with self._condition:
+            self._progress_callbacks.append(fn)
+
+    def cancel(self):
+        """Cancel the call.
+
+        A pending call is removed from the queue. A running call is asked
+        to stop and the future is cancelled when it does. Returns False
+        only if the call has already finished.
+        """
+        with self._condition:
+            if self.done():
+                return self.cancelled()
+            self._cancel_event.set()
+            callbacks = list(self._cancel_callbacks)
+
+        if self._inner.cancel():
+            return True
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception('exception calling cancel callback for %r', self)
+        return True
+
+    def _set_progress(self, value):
+        self._progress = value
+        with self._condition:
+            callbacks = list(self._progress_callbacks)
+        for callback in callbacks:
+            try:
+                callback(self, value)
+            except Exception:
+                logger.exception('exception calling progress callback for %r', self)
+
+    def _bind(self, inner):
+        self._inner = inner
+        inner.add_done_callback(self._copy)
+
+    def _copy(self, inner):
+        if inner.cancelled() or isinstance(inner.exception(), futures.CancelledError):
+            futures.Future.cancel(self)
+            self.set_running_or_notify_cancel()
+        elif inner.exception() is not None:
+            self.set_exception(inner.exception())
+        else:
+            self.set_result(inner.result())
+
+
 class _DriverType(MetaQObject):
     """Base metaclass for all drivers.
     """
@@ -199,6 +285,11 @@ def _set(inst, feat_name, feat_attr):
         setattr(proxy, feat_attr, value)
     return _inner
 
+def _clear_cache(inst, action):
+    def _inner(*args):
+        action.clear_cache(inst)
+    return _inner
+
 def _raise_must_change(dependent, feat_name, operation):
     def _inner(value):
         raise Exception("You must get or set '{}' before trying to {} '{}'".format(dependent, operation, feat_name))
@@ -215,7 +306,28 @@ class Driver(SuperQObject, metaclass=_DriverType):
     _lantz_features = {}
     _lantz_actions = {}
 
+    #: Maximum number of bytes (or characters) of an I/O payload shown
+    #: in log messages. None means no limit.
+    IO_LOG_LIMIT = 64
+
+    #: Log only one of every IO_LOG_SAMPLE I/O payloads.
+    IO_LOG_SAMPLE = 1
+
+    #: Default log rate limit for all messages of the instrument: maximum sustained
+    #: number of records per second per message (None means no limit), burst
+    #: size and 1-in-N sampling (see set_log_limit).
+    LOG_RATE = None
+    LOG_BURST = 10
+    LOG_SAMPLE = 1
+
+    #: Only records of this level or lower are limited.
+    LOG_LIMIT_LEVEL = logging.INFO
+
+    #: Minimum time in seconds between summaries of suppressed records.
+    LOG_SUMMARY_INTERVAL = 10.
+
     __name = ''
+    __io_count = 0
 
     def __new__(cls, *args, **kwargs):
         inst = SuperQObject.__new__(cls)
@@ -223,6 +335,10 @@ class Driver(SuperQObject, metaclass=_DriverType):
 
         inst._executor = None
         inst._lock = threading.RLock()
+        inst._call_context = threading.local()
+        inst._log_limiter = None
+        if cls.LOG_RATE is not None or cls.LOG_SAMPLE > 1:
+            inst.set_log_limit(None, cls.LOG_RATE, cls.LOG_BURST, cls.LOG_SAMPLE)
         inst.__unfinished_tasks = 0
         inst.timing = RunningStats()
 
@@ -250,6 +366,10 @@ class Driver(SuperQObject, metaclass=_DriverType):
                     feat.modifiers[MISSING][MISSING][attr_name] = attr_value.default
                     feat.rebuild(build_doc=False, store=True)
 
+        for action in cls._lantz_actions.values():
+            for feat_name in action.invalidated_by:
+                getattr(inst, feat_name + '_changed').connect(_clear_cache(inst, action))
+
         inst.log_info('Created ' + inst.name)
         return inst
 
@@ -271,10 +391,21 @@ class Driver(SuperQObject, metaclass=_DriverType):
 
     def _notfirst_submit(self, fn, *args, **kwargs):
         self.__unfinished_tasks += 1
-        fut = self._executor.submit(fn, *args, **kwargs)
-        fut.add_done_callback(self._decrease_unfinished_tasks)
+        fut = ActionFuture()
+        inner = self._executor.submit(self._call_with_future, fut, fn, args, kwargs)
+        inner.add_done_callback(self._decrease_unfinished_tasks)
+        fut._bind(inner)
         return fut
 
+    def _call_with_future(self, future, fn, args, kwargs):
+        context = self._call_context
+        previous = getattr(context, 'future', None)
+        context.future = future
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            context.future = previous
+
     _submit = _first_submit
 
     def _decrease_unfinished_tasks(self, *args):
@@ -282,6 +413,97 @@ class Driver(SuperQObject, metaclass=_DriverType):
 
     unfinished_tasks = property(lambda self: self.__unfinished_tasks)
 
+    def check_cancelled(self):
+        """Raise concurrent.futures.CancelledError if the asynchronous call
+        being executed in this thread was cancelled.
+
+        Long running actions should call it periodically. Outside an
+        asynchronous call it does nothing.
+        """
+        future = getattr(self._call_context, 'future', None)
+        if future is not None and future.cancel_requested:
+            self.log_info('Cancelled')
+            raise futures.CancelledError()
+
+    def sleep(self, seconds):
+        """Like time.sleep, but wakes up and raises concurrent.futures.CancelledError
+        as soon as the asynchronous call being executed is cancelled.
+
+        Use it instead of time.sleep in polling loops.
+        """
+        future = getattr(self._call_context, 'future', None)
+        if future is None:
+            time.sleep(seconds)
+        else:
+            future._cancel_event.wait(seconds)
+            self.check_cancelled()
+
+    def report_progress(self, value):
+        """Report the progress (in percent) of the asynchronous call being executed.
+
+        Outside an asynchronous call it does nothing.
+        """
+        future = getattr(self._call_context, 'future', None)
+        if future is not None:
+            future._set_progress(value)
+
+    @contextmanager
+    def cancel_callback(self, callback):
+        """Context manager to interrupt blocking calls. If the asynchronous
+        call being executed is cancelled within the block, callback is
+        called (without arguments) from the cancelling thread.
+
+            >>> with self.cancel_callback(self.lib.CancelWait):
+            ...     self.lib.WaitForAcquisition()
+        """
+        future = getattr(self._call_context, 'future', None)
+        if future is None:
+            yield
+            return
+
+        with future._condition:
+            future._cancel_callbacks.append(callback)
+            cancelled = future.cancel_requested
+        if cancelled:
+            callback()
+        try:
+            yield
+        finally:
+            with future._condition:
+                future._cancel_callbacks.remove(callback)
+
+    def set_log_limit(self, msg=None, rate=None, burst=10, sample=1):
+        """Limit the number of records logged by this instrument for a given message.
+
+        Records of level LOG_LIMIT_LEVEL or lower are dropped before being
+        formatted and a summary of the suppressed records is logged every
+        LOG_SUMMARY_INTERVAL seconds (from a timer if no further record is
+        logged, or earlier with flush_log).
+
+        :param msg: unformatted message (e.g. 'Getting {}'). None sets the default
+                    for all messages.
+        :param rate: maximum sustained number of records per second (None means no limit).
+        :param burst: maximum number of records logged in a burst.
+        :param sample: only one of every `sample` records is logged.
+        """
+        if self._log_limiter is None:
+            self._log_limiter = LogRateLimiter(summary_interval=self.LOG_SUMMARY_INTERVAL,
+                                               emit=self._log_summary)
+        self._log_limiter.set_limit(msg, rate, burst, sample)
+
+    def flush_log(self):
+        """Log the summaries of the suppressed records without waiting
+        for LOG_SUMMARY_INTERVAL.
+        """
+        if self._log_limiter is not None:
+            self._log_limiter.flush()
+
+    def _log_summary(self, key, suppressed, level=None):
+        if level is None:
+            level = self.LOG_LIMIT_LEVEL
+        logger.log(level, 'Suppressed {} similar messages: {!r}', suppressed, key,
+                   extra=self.log_extra)
+
     def log(self, level, msg, *args, **kwargs):
         """Log with the integer severity 'level'
         on the logger corresponding to this instrument.
@@ -289,12 +511,48 @@ class Driver(SuperQObject, metaclass=_DriverType):
         :param level: severity level for this event.
         :param msg: message to be logged (can contain PEP3101 formatting codes)
         """
+        if not logger.isEnabledFor(level):
+            return
+
+        limiter = self._log_limiter
+        if limiter is not None and level <= self.LOG_LIMIT_LEVEL:
+            allowed = limiter.allow(msg)
+            for key, suppressed in limiter.summaries():
+                self._log_summary(key, suppressed, level)
+            if not allowed:
+                return
+
         if kwargs:
             kwargs.update(self.log_extra)
             logger.log(level, msg, *args, extra=kwargs)
         else:
             logger.log(level, msg, *args, extra=self.log_extra)
 
+    def log_io(self, msg, payload, *args, **kwargs):
+        """Log an I/O payload with the severity 'DEBUG'
+        on the logger corresponding to this instrument.
+
+        The payload is truncated to IO_LOG_LIMIT and nothing is formatted
+        unless DEBUG is enabled. Only one of every IO_LOG_SAMPLE calls is logged.
+
+        :param msg: message to be logged (can contain PEP3101 formatting codes).
+                    The payload is the first positional argument.
+        :param payload: bytes, str or memoryview sent to or received from the instrument.
+        """
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
+        if self.IO_LOG_SAMPLE > 1:
+            self.__io_count += 1
+            if self.__io_count % self.IO_LOG_SAMPLE != 1:
+                return
+
+        if isinstance(payload, memoryview):
+            # The record must not keep the buffer of the caller exported.
+            payload = payload.tobytes()
+
+        self.log(logging.DEBUG, msg, TruncatedPayload(payload, self.IO_LOG_LIMIT), *args, **kwargs)
+
     def log_info(self, msg, *args, **kwargs):
         """Log with the severity 'INFO'
         on the logger corresponding to this instrument.
@@ -353,6 +611,7 @@ class Driver(SuperQObject, metaclass=_DriverType):
 
     def __exit__(self, *args):
         self.finalize()
+        self.flush_log()
 
     @Action()
     def initialize(self):
@@ -638,3 +897,115 @@ def finalize_many(drivers,
             else:
                 if on_finalized:
                     on_finalized(driver)
+
+
+#: Outcome of an operation on a member of a DriverGroup.
+#: exception is None if the operation succeeded and elapsed is in seconds.
+GroupResult = namedtuple('GroupResult', 'driver value exception elapsed')
+
+
+class DriverGroup(object):
+    """A collection of drivers on which the same operation can be performed
+    concurrently. Each operation holds the lock of the corresponding driver
+    and returns a tuple of GroupResult in the same order as the drivers.
+
+    Exceptions raised for a member do not prevent the other members from
+    being processed, they are stored in the corresponding GroupResult::
+
+        controllers = group(drivers)
+        for result in controllers.get('temperature'):
+            print(result.driver, result.value, result.exception, result.elapsed)
+
+    :param drivers: an iterable of drivers.
+    :param max_workers: maximum number of threads used. Default: one per driver.
+    """
+
+    def __init__(self, drivers, max_workers=None):
+        self.drivers = tuple(drivers)
+        self.max_workers = max_workers or max(len(self.drivers), 1)
+        self._executor = None
+
+    def __len__(self):
+        return len(self.drivers)
+
+    def __iter__(self):
+        return iter(self.drivers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        """Release the threads used by this group.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait)
+            self._executor = None
+
+    def _run(self, driver, func, args, kwargs):
+        with driver._lock:
+            tic = time.time()
+            try:
+                value = func(driver, *args, **kwargs)
+            except Exception as e:
+                return GroupResult(driver, None, e, time.time() - tic)
+            return GroupResult(driver, value, None, time.time() - tic)
+
+    def call(self, func, *args, **kwargs):
+        """Call func(driver, *args, **kwargs) for each driver concurrently.
+
+        :param func: callable taking the driver as first argument.
+        :return: a GroupResult for each driver.
+        :rtype: tuple
+        """
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        futs = [self._executor.submit(self._run, driver, func, args, kwargs)
+                for driver in self.drivers]
+        return tuple(fut.result() for fut in futs)
+
+    def get(self, feat_name):
+        """Get the value of a feat in all drivers.
+
+        :param feat_name: name of the feat.
+        """
+        return self.call(getattr, feat_name)
+
+    def set(self, feat_name, value):
+        """Set the value of a feat in all drivers.
+
+        :param feat_name: name of the feat.
+        :param value: new value.
+        """
+        return self.call(setattr, feat_name, value)
+
+    def refresh(self, keys=None):
+        """Refresh the cache of all drivers. See Driver.refresh.
+        """
+        return self.call(Driver.refresh, keys)
+
+    def query(self, command, **kwargs):
+        """Send the same query to all drivers and return the answers.
+
+        :param command: command to be sent to the instruments.
+        """
+        return self.call(lambda driver: driver.query(command, **kwargs))
+
+    def action(self, action_name, *args, **kwargs):
+        """Call an action with the same arguments in all drivers.
+
+        :param action_name: name of the action.
+        """
+        return self.call(lambda driver: getattr(driver, action_name)(*args, **kwargs))
+
+
+def group(drivers, max_workers=None):
+    """Return a DriverGroup to operate concurrently on drivers.
+
+    :param drivers: an iterable of drivers.
+    :param max_workers: maximum number of threads used. Default: one per driver.
+    :rtype: DriverGroup
+    """
+    return DriverGroup(drivers, max_workers)
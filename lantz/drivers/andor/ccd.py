@@ -123,6 +123,14 @@ class CCD(LibraryDriver):
 
     LIBRARY_NAME = 'atmcd64d.dll'
 
+    # WaitForAcquisition runs in a worker thread so that the status and
+    # temperature can be read, and the wait cancelled, while it waits.
+    BLOCKING_FUNCTIONS = ('WaitForAcquisition', )
+    SAFE_FUNCTIONS = ('CancelWait', 'AbortAcquisition', 'GetStatus',
+                      'GetTemperatureF', 'GetAcquisitionProgress',
+                      'GetTotalNumberImagesAcquired', 'GetNumberNewImages')
+    BLOCKING_ABORT = {'WaitForAcquisition': 'CancelWait'}
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cameraIndex = ct.c_int(0)
@@ -761,8 +769,15 @@ class CCD(LibraryDriver):
         If a second event occurs before the first one has been acknowledged,
         the first one will be ignored. Care should be taken in this case, as
         you may have to use CancelWait to exit the function.
+
+        Cancelling the asynchronous call calls CancelWait.
         """
-        self.lib.WaitForAcquisition()
+        with self.cancel_callback(self.lib.CancelWait):
+            try:
+                self.lib.WaitForAcquisition()
+            except Exception:
+                self.check_cancelled()
+                raise
 
     @Action()
     def cancel_wait(self):
@@ -9,9 +9,11 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import time
 import socket
 
 from lantz import Driver
+from lantz.feat import MISSING
 from lantz.drivers.legacy.textual import TextualMixin
 from lantz.errors import LantzTimeoutError
 
@@ -23,6 +25,11 @@ class LantzSocketTimeoutError(socket.timeout, LantzTimeoutError):
 class TCPRawDriver(Driver):
     """Base class for drivers that communicate with instruments via TCP.
 
+    When the connection is lost, it is opened again (with increasing delays
+    between attempts) and the feats in REPLAY_FEATS are set again to their
+    last known values (see on_reconnect). The number of reconnections is
+    stored in reconnect_count and their duration in timing['reconnect'].
+
     :param host: Address of the network resource
     :param port: Port number
     """
@@ -30,46 +37,201 @@ class TCPRawDriver(Driver):
     RECV_TERMINATION = '\n'
     SEND_TERMINATION = '\n'
 
-    RECV_CHUNK = 1024
+    #: Maximum number of bytes per read (a read returns the bytes available).
+    RECV_CHUNK = 65536
+
+    #: Disable Nagle's algorithm so that short commands are sent immediately.
+    NODELAY = True
+
+    #: Enable TCP keepalive probes. Idle seconds before the first probe,
+    #: seconds between probes and number of unanswered probes after which
+    #: the connection is dropped (where supported by the platform).
+    KEEPALIVE = True
+    KEEPALIVE_IDLE = 60
+    KEEPALIVE_INTERVAL = 10
+    KEEPALIVE_COUNT = 3
+
+    #: Reconnect when the connection is lost.
+    RECONNECT = True
+
+    #: Timeout in seconds of each connection attempt.
+    CONNECT_TIMEOUT = 5.
+
+    #: Number of connection attempts (None to retry for ever).
+    CONNECT_ATTEMPTS = 5
+
+    #: Delay in seconds after the first failed connection attempt,
+    #: doubled after each attempt up to RETRY_MAX.
+    RETRY_START = .1
+    RETRY_MAX = 5.
+
+    #: Feats that are set again to their last known value after reconnecting.
+    REPLAY_FEATS = ()
 
     def __init__(self, host='localhost', port=9997, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket = self._new_socket()
         self.host_port = (host, port)
 
+        self.reconnect_count = 0
+        self._connected = False
+        self._replaying = False
+
+    def _new_socket(self, timeout=None):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        if self.NODELAY:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.KEEPALIVE:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for name, value in (('TCP_KEEPIDLE', self.KEEPALIVE_IDLE),
+                                ('TCP_KEEPALIVE', self.KEEPALIVE_IDLE),
+                                ('TCP_KEEPINTVL', self.KEEPALIVE_INTERVAL),
+                                ('TCP_KEEPCNT', self.KEEPALIVE_COUNT)):
+                if hasattr(socket, name):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+        return sock
+
+    def _connect(self):
+        """Connect the socket, retrying with increasing delays.
+        """
+        timeout = self.socket.gettimeout()
+        delay = self.RETRY_START
+        attempt = 0
+        while True:
+            attempt += 1
+            self.socket.settimeout(self.CONNECT_TIMEOUT)
+            try:
+                self.socket.connect(self.host_port)
+                break
+            except OSError as e:
+                if self.CONNECT_ATTEMPTS is not None and attempt >= self.CONNECT_ATTEMPTS:
+                    raise
+                self.log_warning('Could not connect to {} ({}). Retrying in {} seconds',
+                                 self.host_port, e, delay)
+                self.socket.close()
+                self.socket = self._new_socket(timeout)
+                time.sleep(delay)
+                delay = min(delay * 2, self.RETRY_MAX)
+        self.socket.settimeout(timeout)
+        self._connected = True
+
+    def _reconnect(self, reason):
+        if not (self._connected and self.RECONNECT) or self._replaying:
+            return False
+
+        self.log_warning('Connection to {} lost ({}). Reconnecting', self.host_port, reason)
+        tic = time.monotonic()
+        self._connected = False
+        timeout = self.socket.gettimeout()
+        self.socket.close()
+        self.socket = self._new_socket(timeout)
+        self._connect()
+
+        # A partial reply received before the connection was lost is discarded.
+        buffer = getattr(self, '_recv_buffer', None)
+        if buffer:
+            del buffer[:]
+
+        elapsed = time.monotonic() - tic
+        self.reconnect_count += 1
+        self.timing.add('reconnect', elapsed)
+        self.log_info('Reconnected to {} in {:.3f} seconds', self.host_port, elapsed)
+
+        self._replaying = True
+        try:
+            self.on_reconnect()
+        finally:
+            self._replaying = False
+        return True
+
+    def on_reconnect(self):
+        """Called after reconnecting to restore the state of the instrument.
+
+        By default, sets the feats in REPLAY_FEATS to their last known values.
+        """
+        if not self.REPLAY_FEATS:
+            return
+        state = {key: value for key, value in self.recall(list(self.REPLAY_FEATS)).items()
+                 if value is not MISSING}
+        if state:
+            self.log_info('Restoring {}', state)
+            self.update(state, force=True)
+
     def raw_send(self, data):
         """Send raw bytes to the instrument.
 
+        If the connection was lost, it is opened again and the data is sent again.
+
         :param data: bytes to be sent to the instrument.
         :param data: bytes.
+        :return: number of bytes sent.
         """
         try:
-            self.socket.send(data)
+            self.socket.sendall(data)
         except socket.timeout as e:
             raise LantzSocketTimeoutError(str(e))
+        except OSError as e:
+            if not self._reconnect(e):
+                raise
+            self.socket.sendall(data)
+        return len(data)
 
     def raw_recv(self, size):
         """Receive raw bytes to the instrument.
 
+        If the connection was lost, it is opened again and ConnectionResetError
+        is raised as the pending reply is lost.
+
         :param size: number of bytes to receive.
         :return: received bytes.
         :return type: bytes.
         """
+        return self._recv(self.socket.recv, size, size)
+
+    def raw_recv_into(self, buffer, size=0):
+        """Receive raw bytes from the instrument into an existing buffer.
+
+        If the connection was lost, it is opened again and ConnectionResetError
+        is raised as the pending reply is lost.
+
+        :param buffer: writable buffer (e.g. bytearray or memoryview) to be filled.
+        :param size: maximum number of bytes to receive (0 for len(buffer)).
+        :return: number of bytes received.
+        """
+        return self._recv(self.socket.recv_into, size or len(buffer), buffer, size)
+
+    def _recv(self, func, size, *args):
         try:
-            return self.socket.recv(size)
+            received = func(*args)
         except socket.timeout as e:
             raise LantzSocketTimeoutError(str(e))
+        except OSError as e:
+            if self._reconnect(e):
+                raise ConnectionResetError('Connection to {} was lost while receiving '
+                                           'and it has been opened again'.format(self.host_port))
+            raise
+
+        if not received and size:
+            if self._reconnect('closed by the instrument'):
+                raise ConnectionResetError('Connection to {} was closed while receiving '
+                                           'and it has been opened again'.format(self.host_port))
+
+        return received
 
     def initialize(self):
         self.log_debug('Opening port {}', self.host_port)
-        return self.socket.connect(self.host_port)
+        if self.socket.fileno() == -1:
+            self.socket = self._new_socket(self.socket.gettimeout())
+        self._connect()
 
     def finalize(self):
         self.log_debug('Closing port {}', self.host_port)
+        self._connected = False
         return self.socket.close()
 
     def is_open(self):
-        return self.socket.isOpen()
+        return self._connected
 
 
 class TCPDriver(TCPRawDriver, TextualMixin):
@@ -82,5 +244,5 @@ class TCPDriver(TCPRawDriver, TextualMixin):
     RECV_TERMINATION = '\n'
     SEND_TERMINATION = '\n'
 
-    RECV_CHUNK = 1024
+    RECV_CHUNK = 65536
 
@@ -24,9 +24,10 @@
 
 import sys
 import enum
-import xdrlib
+import time
 import socket
 import struct
+import threading
 
 #: Version of the protocol
 RPCVERSION = 2
@@ -92,7 +93,190 @@ def make_auth_null():
     return b''
 
 
-class Packer(xdrlib.Packer):
+_INT = struct.Struct('>i')
+_UINT = struct.Struct('>I')
+_HYPER = struct.Struct('>q')
+_UHYPER = struct.Struct('>Q')
+_FLOAT = struct.Struct('>f')
+_DOUBLE = struct.Struct('>d')
+
+
+class XDRPacker(object):
+    """Packs data in External Data Representation (RFC 1014)
+    into a bytearray.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._buffer = bytearray()
+
+    def get_buffer(self):
+        """Return the packed data (without copying).
+        """
+        return self._buffer
+
+    def get_buf(self):
+        """Return a copy of the packed data as bytes.
+        """
+        return bytes(self._buffer)
+
+    def pack_uint(self, x):
+        self._buffer += _UINT.pack(x)
+
+    def pack_int(self, x):
+        self._buffer += _INT.pack(x)
+
+    pack_enum = pack_int
+
+    def pack_bool(self, x):
+        self._buffer += _UINT.pack(1 if x else 0)
+
+    def pack_uhyper(self, x):
+        self._buffer += _UHYPER.pack(x)
+
+    def pack_hyper(self, x):
+        self._buffer += _HYPER.pack(x)
+
+    def pack_float(self, x):
+        self._buffer += _FLOAT.pack(x)
+
+    def pack_double(self, x):
+        self._buffer += _DOUBLE.pack(x)
+
+    def pack_fstring(self, n, s):
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        data = memoryview(s).cast('B')[:n]
+        self._buffer += data
+        self._buffer += bytes(n - len(data) + (-n) % 4)
+
+    pack_fopaque = pack_fstring
+
+    def pack_string(self, s):
+        n = len(s)
+        self.pack_uint(n)
+        self.pack_fstring(n, s)
+
+    pack_opaque = pack_string
+    pack_bytes = pack_string
+
+    def pack_list(self, list, pack_item):
+        for item in list:
+            self.pack_uint(1)
+            pack_item(item)
+        self.pack_uint(0)
+
+    def pack_farray(self, n, list, pack_item):
+        if len(list) != n:
+            raise ValueError('wrong array size')
+        for item in list:
+            pack_item(item)
+
+    def pack_array(self, list, pack_item):
+        n = len(list)
+        self.pack_uint(n)
+        self.pack_farray(n, list, pack_item)
+
+
+class XDRUnpacker(object):
+    """Unpacks data in External Data Representation (RFC 1014).
+
+    Opaque data is returned as memoryview slices of the buffer given
+    to reset, not as copies.
+    """
+
+    def __init__(self, data):
+        self.reset(data)
+
+    def reset(self, data):
+        self._view = memoryview(data).cast('B') if data else memoryview(b'')
+        self._pos = 0
+
+    def get_position(self):
+        return self._pos
+
+    def set_position(self, position):
+        self._pos = position
+
+    def get_buffer(self):
+        return self._view
+
+    def done(self):
+        if self._pos < len(self._view):
+            raise RPCUnpackError('unextracted data remains')
+
+    def _unpack(self, fmt):
+        i = self._pos
+        self._pos = j = i + fmt.size
+        if j > len(self._view):
+            raise EOFError
+        return fmt.unpack_from(self._view, i)[0]
+
+    def unpack_uint(self):
+        return self._unpack(_UINT)
+
+    def unpack_int(self):
+        return self._unpack(_INT)
+
+    unpack_enum = unpack_int
+
+    def unpack_bool(self):
+        return bool(self._unpack(_INT))
+
+    def unpack_uhyper(self):
+        return self._unpack(_UHYPER)
+
+    def unpack_hyper(self):
+        return self._unpack(_HYPER)
+
+    def unpack_float(self):
+        return self._unpack(_FLOAT)
+
+    def unpack_double(self):
+        return self._unpack(_DOUBLE)
+
+    def unpack_fopaque(self, n):
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        i = self._pos
+        j = i + n + (-n) % 4
+        if j > len(self._view):
+            raise EOFError
+        self._pos = j
+        return self._view[i:i + n]
+
+    def unpack_opaque(self):
+        return self.unpack_fopaque(self.unpack_uint())
+
+    def unpack_fstring(self, n):
+        return self.unpack_fopaque(n).tobytes()
+
+    def unpack_string(self):
+        return self.unpack_fstring(self.unpack_uint())
+
+    unpack_bytes = unpack_string
+
+    def unpack_list(self, unpack_item):
+        list = []
+        while True:
+            x = self.unpack_uint()
+            if x == 0:
+                break
+            if x != 1:
+                raise RPCUnpackError('0 or 1 expected, got %r' % (x, ))
+            list.append(unpack_item())
+        return list
+
+    def unpack_farray(self, n, unpack_item):
+        return [unpack_item() for _ in range(n)]
+
+    def unpack_array(self, unpack_item):
+        return self.unpack_farray(self.unpack_uint(), unpack_item)
+
+
+class Packer(XDRPacker):
 
     def pack_auth(self, auth):
         flavor, stuff = auth
@@ -128,7 +312,7 @@ class Packer(xdrlib.Packer):
         # Caller must add procedure-specific part of reply
 
 
-class Unpacker(xdrlib.Unpacker):
+class Unpacker(XDRUnpacker):
 
     def unpack_auth(self):
         flavor = self.unpack_enum()
@@ -247,42 +431,114 @@ class Client:
 
 # Record-Marking standard support
 
+#: Largest fragment allowed by the record marking standard.
+MAX_FRAGMENT = 0x7fffffff
+
+
+def _sendall(sock, buffers):
+    """Send a sequence of buffers with as few system calls (and copies) as possible.
+    """
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b''.join(buffers))
+        return
+
+    views = [memoryview(buffer).cast('B') for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        while sent:
+            size = len(views[0])
+            if sent < size:
+                views[0] = views[0][sent:]
+                break
+            sent -= size
+            del views[0]
+        while views and not len(views[0]):
+            del views[0]
+
+
 def sendfrag(sock, last, frag):
     x = len(frag)
     if last:
         x = x | 0x80000000
-    header = struct.pack(">I", x)
-    sock.send(header + frag)
+    _sendall(sock, (_UINT.pack(x), frag))
 
 
 def sendrecord(sock, record):
-    sendfrag(sock, 1, record)
+    view = memoryview(record).cast('B')
+    if len(view) <= MAX_FRAGMENT:
+        sendfrag(sock, 1, view)
+        return
+    for offset in range(0, len(view), MAX_FRAGMENT):
+        frag = view[offset:offset + MAX_FRAGMENT]
+        sendfrag(sock, offset + MAX_FRAGMENT >= len(view), frag)
+
+
+def _recv_exactly(sock, view):
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise EOFError
+        view = view[received:]
 
 
 def recvfrag(sock):
-    header = sock.recv(4)
-    if len(header) < 4:
-        raise EOFError
-    x = struct.unpack(">I", header[0:4])[0]
+    header = bytearray(4)
+    _recv_exactly(sock, memoryview(header))
+    x = _UINT.unpack(header)[0]
     last = ((x & 0x80000000) != 0)
     n = int(x & 0x7fffffff)
-    frag = b''
-    while n > 0:
-        buf = sock.recv(n)
-        if not buf:
-            raise EOFError
-        n = n - len(buf)
-        frag = frag + buf
+    frag = bytearray(n)
+    _recv_exactly(sock, memoryview(frag))
     return last, frag
 
 
+class RecordReceiver(object):
+    """Receives records into a buffer that is reused for the next record
+    unless views of the previous one (e.g. unpacked opaque data) are still alive.
+
+    :param size: initial size of the buffer.
+    """
+
+    def __init__(self, size=1 << 16):
+        self.buffer = bytearray(size)
+        self._header = bytearray(4)
+
+    def _reserve(self, size):
+        buffer = self.buffer
+        try:
+            # Resizing fails while the buffer is exported.
+            if len(buffer) < size:
+                buffer.extend(bytes(max(size, 2 * len(buffer)) - len(buffer)))
+            else:
+                buffer.append(0)
+                del buffer[-1]
+        except BufferError:
+            self.buffer = buffer = bytearray(max(size, len(buffer)))
+        return buffer
+
+    def recv(self, sock):
+        """Receive a record from a socket.
+
+        :return: memoryview of the record.
+        """
+        size = 0
+        last = False
+        while not last:
+            _recv_exactly(sock, memoryview(self._header))
+            x = _UINT.unpack(self._header)[0]
+            last = x & 0x80000000
+            n = x & 0x7fffffff
+            # After the first fragment the buffer is not exported,
+            # so it grows keeping the received data.
+            buffer = self._reserve(size + n)
+            with memoryview(buffer) as view:
+                _recv_exactly(sock, view[size:size + n])
+            size += n
+        return memoryview(buffer)[:size]
+
+
 def recvrecord(sock):
-    record = b''
-    last = 0
-    while not last:
-        last, frag = recvfrag(sock)
-        record = record + frag
-    return record
+    return RecordReceiver(0).recv(sock)
 
 
 class RawTCPClient(Client):
@@ -290,6 +546,7 @@ class RawTCPClient(Client):
     """
     def __init__(self, host, prog, vers, port):
         Client.__init__(self, host, prog, vers, port)
+        self.receiver = RecordReceiver()
         self.connect()
     
     def connect(self):
@@ -299,10 +556,40 @@ class RawTCPClient(Client):
     def close(self):
         self.sock.close()
     
+    def send_call(self, proc, args, pack_func):
+        """Send a call without waiting for the reply, which must be
+        received later with recv_reply. Several calls can be in flight.
+
+        :return: transaction id of the call.
+        """
+        if pack_func is None and args is not None:
+            raise TypeError('non-null args with null pack_func')
+        self.start_call(proc)
+        if pack_func:
+            pack_func(args)
+        sendrecord(self.sock, self.packer.get_buffer())
+        return self.lastxid
+
+    def recv_reply(self, unpack_func):
+        """Receive the reply to the oldest call sent with send_call.
+
+        :return: transaction id and unpacked result.
+        """
+        # Release the previous reply so that its buffer can be reused.
+        self.unpacker.reset(b'')
+        reply = self.receiver.recv(self.sock)
+        u = self.unpacker
+        u.reset(reply)
+        xid, verf = u.unpack_replyheader()
+        result = unpack_func() if unpack_func else None
+        u.done()
+        return xid, result
+
     def do_call(self):
-        call = self.packer.get_buf()
-        sendrecord(self.sock, call)
-        reply = recvrecord(self.sock)
+        sendrecord(self.sock, self.packer.get_buffer())
+        # Release the previous reply so that its buffer can be reused.
+        self.unpacker.reset(b'')
+        reply = self.receiver.recv(self.sock)
         u = self.unpacker
         u.reset(reply)
         xid, verf = u.unpack_replyheader()
@@ -534,28 +821,71 @@ class BroadcastUDPPortMapperClient(PartialPortMapperClient, RawBroadcastUDPClien
         PartialPortMapperClient.__init__(self)
 
 
+#: Seconds during which the ports given by the port mapper are reused.
+PORT_CACHE_TTL = 60.
+
+#: (host, prog, vers, prot): (port, time of the query)
+_port_cache = {}
+_port_cache_lock = threading.Lock()
+
+
+def get_port(host, prog, vers, prot):
+    """Return the port of a program registered in the port mapper of a host,
+    reusing the answers given in the last PORT_CACHE_TTL seconds.
+    """
+    key = (host, prog, vers, prot)
+    now = time.monotonic()
+    with _port_cache_lock:
+        cached = _port_cache.get(key)
+    if cached is not None and now - cached[1] < PORT_CACHE_TTL:
+        return cached[0]
+
+    if prot == IPPROTO_TCP:
+        pmap = TCPPortMapperClient(host)
+    else:
+        pmap = UDPPortMapperClient(host)
+    try:
+        port = pmap.get_port((prog, vers, prot, 0))
+    finally:
+        pmap.close()
+    if port == 0:
+        raise RPCError('program not registered')
+
+    with _port_cache_lock:
+        _port_cache[key] = (port, now)
+    return port
+
+
+def forget_port(host, prog, vers, prot):
+    """Remove a port from the cache, e.g. after the server has been restarted.
+    """
+    with _port_cache_lock:
+        _port_cache.pop((host, prog, vers, prot), None)
+
+
+def clear_port_cache():
+    with _port_cache_lock:
+        _port_cache.clear()
+
+
 class TCPClient(RawTCPClient):
     """A TCP Client that find their server through the Port mapper
     """
     def __init__(self, host, prog, vers):
-        pmap = TCPPortMapperClient(host)
-        port = pmap.get_port((prog, vers, IPPROTO_TCP, 0))
-        pmap.close()
-        if port == 0:
-            raise RPCError('program not registered')
-        RawTCPClient.__init__(self, host, prog, vers, port)
+        port = get_port(host, prog, vers, IPPROTO_TCP)
+        try:
+            RawTCPClient.__init__(self, host, prog, vers, port)
+        except ConnectionRefusedError:
+            # The cached port might be stale.
+            forget_port(host, prog, vers, IPPROTO_TCP)
+            RawTCPClient.__init__(self, host, prog, vers, get_port(host, prog, vers, IPPROTO_TCP))
 
 
 class UDPClient(RawUDPClient):
     """A UDP Client that find their server through the Port mapper
     """
     def __init__(self, host, prog, vers):
-        pmap = UDPPortMapperClient(host)
-        port = pmap.get_port((prog, vers, IPPROTO_UDP, 0))
-        pmap.close()
-        if port == 0:
-            raise RPCError('program not registered')
-        RawUDPClient.__init__(self, host, prog, vers, port)
+        RawUDPClient.__init__(self, host, prog, vers, get_port(host, prog, vers, IPPROTO_UDP))
 
 
 class BroadcastUDPClient(Client):
@@ -684,7 +1014,7 @@ class Server:
     def turn_around(self):
         try:
             self.unpacker.done()
-        except RuntimeError:
+        except RPCUnpackError:
             raise RPCGarbageArgs
         self.packer.pack_uint(accept_stat.SUCCESS)
 
@@ -10,6 +10,10 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import threading
+import time
+from collections import deque
+
 import serial
 
 from lantz import Driver
@@ -48,6 +52,7 @@ class SerialDriver(TextualMixin, Driver):
     :param dsrdtr: dsrdtr flow control enabled
     :param timeout: value in seconds, None or negative to wait for ever or 0 for non-blocking mode
     :param write_timeout: see timeout
+    :param background_reader: read the port from a background thread (see BACKGROUND_READER).
 
     """
 
@@ -69,10 +74,25 @@ class SerialDriver(TextualMixin, Driver):
     DSRDTR = False
     XONXOFF = False
 
+    #: Read the port from a background thread, splitting the received bytes
+    #: in frames by RECV_TERMINATION. Frames are replies to queries, returned
+    #: by recv, or unsolicited frames, passed to the subscribed callbacks
+    #: (see is_unsolicited). raw_recv must not be used when it is enabled.
+    BACKGROUND_READER = False
+
     def __init__(self, port=1, timeout=1, write_timeout=1, **kwargs):
+        self.background_reader = kwargs.pop('background_reader', self.BACKGROUND_READER)
         super().__init__(**kwargs)
         self.TIMEOUT = timeout
 
+        self._reader = None
+        self._reader_stop = threading.Event()
+        self._replies = deque()
+        self._replies_ready = threading.Condition()
+        #: Number of replies waited for by recv or query.
+        self._expected = 0
+        self._subscribers = ()
+
         kw = {}
         for key in ('baudrate', 'bytesize', 'parity', 'stopbits',
                     'rtscts', 'dsrdtr', 'xonxoff'):
@@ -124,6 +144,175 @@ class SerialDriver(TextualMixin, Driver):
 
         return data
 
+    def _read_pending(self):
+        """Read the available bytes, waiting for one byte (at most
+        the port timeout) if none is available.
+        """
+        return self.serial.read(self.serial.inWaiting() or 1)
+
+    def recv(self, termination=None, encoding=None, recv_chunk=None):
+        if self._reader is None:
+            termination = termination or self.RECV_TERMINATION
+            recv_chunk = recv_chunk or self.RECV_CHUNK
+            if not termination or recv_chunk != -1:
+                return super().recv(termination, encoding, recv_chunk)
+
+            # raw_recv(-1) returns immediately when nothing is available,
+            # so the message is read with _read_pending to avoid spinning.
+            if self.TIMEOUT is None or self.TIMEOUT < 0:
+                stop = float('+inf')
+            else:
+                stop = time.time() + self.TIMEOUT
+
+            def read():
+                if time.time() > stop:
+                    raise LantzTimeoutError
+                return self._read_pending(), False
+
+            return self._recv_message(termination, encoding or self.ENCODING, read)
+
+        with self._replies_ready:
+            if not self._replies:
+                self._expected += 1
+        return self._wait_reply()
+
+    recv.__doc__ = TextualMixin.recv.__doc__ + """
+        With recv_chunk == -1, the available bytes are read, waiting
+        for one byte if none is available.
+
+        When the background reader is running, the next reply is returned
+        and termination, encoding and recv_chunk are ignored.
+        """
+
+    def query(self, command, *, send_args=(None, None), recv_args=(None, None)):
+        if self._reader is None:
+            return super().query(command, send_args=send_args, recv_args=recv_args)
+
+        # The reply is expected before sending, so that it cannot
+        # be taken as an unsolicited frame.
+        with self._replies_ready:
+            self._expected += 1
+        try:
+            self.send(command, *send_args)
+        except Exception:
+            with self._replies_ready:
+                self._expected = max(self._expected - 1, 0)
+            raise
+        return self._wait_reply()
+
+    query.__doc__ = TextualMixin.query.__doc__
+
+    def _wait_reply(self):
+        if self.TIMEOUT is None or self.TIMEOUT < 0:
+            timeout = None
+        else:
+            timeout = self.TIMEOUT
+
+        with self._replies_ready:
+            if not self._replies_ready.wait_for(lambda: self._replies, timeout):
+                self._expected = max(self._expected - 1, 0)
+                raise LantzTimeoutError
+            frame = self._replies.popleft()
+
+        self.log_io('Received {!r} (len={})', frame, len(frame))
+        return frame
+
+    def is_unsolicited(self, frame):
+        """Return True if a frame received by the background reader
+        is not a reply to a query.
+
+        By default, frames received while no reply is expected are unsolicited.
+        Override it for instruments whose unsolicited frames can be recognized.
+
+        :param frame: received string (without termination).
+        """
+        return not self._expected
+
+    def subscribe(self, callback):
+        """Call callback(frame) from the background reader thread
+        for each unsolicited frame.
+        """
+        self._subscribers += (callback, )
+
+    def unsubscribe(self, callback):
+        """Stop calling a callback given to subscribe.
+        """
+        self._subscribers = tuple(item for item in self._subscribers if item != callback)
+
+    def _route(self, frame):
+        with self._replies_ready:
+            if not self.is_unsolicited(frame):
+                self._expected = max(self._expected - 1, 0)
+                self._replies.append(frame)
+                self._replies_ready.notify()
+                return
+
+        self.log_io('Unsolicited {!r} (len={})', frame, len(frame))
+        for callback in self._subscribers:
+            try:
+                callback(frame)
+            except Exception as e:
+                self.log_error('While calling {} with unsolicited frame {!r}: {}', callback, frame, e)
+
+    def _read_frames(self):
+        termination = bytes(self.RECV_TERMINATION, self.ENCODING)
+        # Deleting from the start of a bytearray does not move the rest
+        # of the bytes, so it works as a ring buffer.
+        buffer = bytearray()
+        start = 0
+        while not self._reader_stop.is_set():
+            try:
+                chunk = self._read_pending()
+            except Exception as e:
+                if not self._reader_stop.is_set():
+                    self.log_error('Background reader stopped: {}', e)
+                break
+
+            if not chunk:
+                if not self.serial.timeout:
+                    # Non-blocking port.
+                    self._reader_stop.wait(.001)
+                continue
+
+            buffer += chunk
+            while True:
+                pos = buffer.find(termination, start)
+                if pos < 0:
+                    start = max(len(buffer) - len(termination) + 1, 0)
+                    break
+                frame = str(bytes(buffer[:pos]), self.ENCODING, 'replace')
+                del buffer[:pos + len(termination)]
+                start = 0
+                self._route(frame)
+
+    def start_reader(self):
+        """Start reading the port from a background thread.
+        """
+        if self._reader is not None:
+            return
+        if not self.RECV_TERMINATION:
+            raise ValueError('The background reader requires RECV_TERMINATION')
+
+        self._reader_stop.clear()
+        self._replies.clear()
+        self._expected = 0
+        self._reader = threading.Thread(target=self._read_frames,
+                                        name='{}-reader'.format(self.name), daemon=True)
+        self._reader.start()
+
+    def stop_reader(self):
+        """Stop the background reader thread.
+        """
+        if self._reader is None:
+            return
+        self._reader_stop.set()
+        reader, self._reader = self._reader, None
+        cancel_read = getattr(self.serial, 'cancel_read', None)
+        if cancel_read is not None:
+            cancel_read()
+        # The reader checks the stop flag after each read, which lasts at most the port timeout.
+        reader.join(self.serial.timeout or 1.)
+
     def initialize(self):
         """Open port
         """
@@ -133,9 +322,13 @@ class SerialDriver(TextualMixin, Driver):
         else:
             self.log_debug('Port {} is already open', self.serial.port)
 
+        if self.background_reader:
+            self.start_reader()
+
     def finalize(self):
         """Close port
         """
+        self.stop_reader()
         self.log_debug('Closing port {}', self.serial.port)
         return self.serial.close()
 
@@ -41,13 +41,13 @@ class TextualMixin(object):
     TIMEOUT = 1
     #: Parsers
     PARSERS = {}
-    #: Size in bytes of the receive chunk (-1 means all bytes in buffer)
-    RECV_CHUNK = 1
+    #: Size in bytes of the receive chunk (-1 means all bytes in buffer).
+    #: Transports returning the bytes available should use a large chunk,
+    #: as each chunk costs one read.
+    RECV_CHUNK = 1024
 
-    #: String containing the part of the message after RECV_TERMINATION
-    #: Used in software based finding of termination character when
-    #: RECV_CHUNK > 1
-    _received = ''
+    #: Bytes received after the last complete message, created on first use.
+    _recv_buffer = None
 
     def raw_recv(self, size):
         """Receive raw bytes from the instrument. No encoding or termination
@@ -92,7 +92,7 @@ class TextualMixin(object):
             encoding = self.ENCODING
 
         message = bytes(command + termination, encoding)
-        self.log_debug('Sending {}', message)
+        self.log_io('Sending {!r}', message)
         return self.raw_send(message)
 
     def recv(self, termination=None, encoding=None, recv_chunk=None):
@@ -117,19 +117,50 @@ class TextualMixin(object):
         else:
             stop = time.time() + self.TIMEOUT
 
-        received = self._received
-        eom = False
-        while not (termination in received or eom):
+        def read():
             if time.time() > stop:
                 raise LantzTimeoutError
-            raw_received = self.raw_recv(recv_chunk)
-            received += str(raw_received, encoding)
+            return self.raw_recv(recv_chunk), False
 
-        self.log_debug('Received {!r} (len={})', received, len(received))
+        return self._recv_message(termination, encoding, read)
 
-        received, self._received = received.split(termination, 1)
+    def _recv_message(self, termination, encoding, read):
+        """Return the next message from the receive buffer, calling read
+        to add bytes to it until the termination is found.
 
-        return received
+        Only the newly received bytes are searched and only the message
+        is decoded. The bytes after the termination are kept for the next call.
+
+        :param termination: termination characters.
+        :param encoding: encoding to transform bytes to string.
+        :param read: callable returning a tuple (received bytes, end of message).
+                     When the end of message is reached without termination,
+                     all the buffered bytes are returned.
+        """
+        buffer = self._recv_buffer
+        if buffer is None:
+            buffer = self._recv_buffer = bytearray()
+
+        termination = termination.encode(encoding)
+        start = 0
+        while True:
+            pos = buffer.find(termination, start)
+            if pos >= 0:
+                end = pos + len(termination)
+                break
+            start = max(len(buffer) - len(termination) + 1, 0)
+            chunk, eom = read()
+            buffer += chunk
+            if eom and buffer.find(termination, start) < 0:
+                pos = end = len(buffer)
+                break
+
+        message = bytes(buffer[:pos])
+        del buffer[:end]
+
+        self.log_io('Received {!r} (len={})', message, len(message))
+
+        return str(message, encoding)
 
     def query(self, command, *, send_args=(None, None), recv_args=(None, None)):
         """Send query to the instrument and return the answer
@@ -14,6 +14,9 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import array
+import errno
+import threading
 from collections import namedtuple, OrderedDict
 from fnmatch import fnmatch
 
@@ -125,6 +128,91 @@ class LantzUSBTimeoutError(usb.core.USBError, LantzTimeoutError):
     pass
 
 
+def _is_timeout(e):
+    return (isinstance(e, getattr(usb.core, 'USBTimeoutError', ())) or
+            getattr(e, 'errno', None) == errno.ETIMEDOUT or
+            getattr(e, 'backend_error_code', None) == -7)
+
+
+def _read_into(ep, buffer, timeout):
+    try:
+        return ep.read(buffer, timeout)
+    except TypeError:
+        # Older versions of PyUSB only accept a size.
+        data = ep.read(len(buffer), timeout)
+        memoryview(buffer)[:len(data)] = data
+        return len(data)
+
+
+class FrameRing(object):
+    """Ring of fixed size frames written by one thread and read by another.
+
+    The writer fills the frame given by next_free and publishes it with commit.
+    The reader takes the frames in order with get. Frames are exchanged, not
+    copied: the writer and the reader each own a spare frame that is swapped
+    with a frame of the ring. The writer never waits: when the ring is full,
+    the oldest frame is dropped, counting an overflow.
+
+    :param frames: number of frames.
+    :param frame_size: size in bytes of each frame.
+    """
+
+    def __init__(self, frames, frame_size):
+        self.frame_size = frame_size
+        self.frames = [array.array('B', bytes(frame_size)) for _ in range(frames)]
+        self.lengths = [0] * frames
+        #: Number of frames committed by the writer.
+        self.head = 0
+        #: Number of frames taken by the reader or dropped.
+        self.tail = 0
+        #: Number of frames dropped because the ring was full.
+        self.overflows = 0
+        self.closed = False
+        self._writing = array.array('B', bytes(frame_size))
+        self._reading = array.array('B', bytes(frame_size))
+        self._ready = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def next_free(self):
+        """Return the frame to be written next, owned by the writer until commit.
+        """
+        return self._writing
+
+    def commit(self, length):
+        """Publish the frame given by next_free, filled with length bytes,
+        dropping the oldest frame if the ring is full.
+        """
+        with self._ready:
+            if self.head - self.tail >= len(self.frames):
+                self.tail += 1
+                self.overflows += 1
+            index = self.head % len(self.frames)
+            self.frames[index], self._writing = self._writing, self.frames[index]
+            self.lengths[index] = length
+            self.head += 1
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """Take the oldest frame, as a memoryview valid until the next call,
+        or return None if none arrives within timeout seconds or the ring is closed.
+        """
+        with self._ready:
+            self._ready.wait_for(lambda: self.head > self.tail or self.closed, timeout)
+            if self.head == self.tail:
+                return None
+            index = self.tail % len(self.frames)
+            self.frames[index], self._reading = self._reading, self.frames[index]
+            self.tail += 1
+            return memoryview(self._reading)[:self.lengths[index]]
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+
+
 def ep_attributes(ep):
     c = ep.bmAttributes
     attrs = []
@@ -293,6 +381,13 @@ class USBDriver(Driver):
 
     TIMEOUT = 1000
 
+    #: Size in bytes of each read of the streaming reader (see start_stream).
+    STREAM_FRAME_SIZE = 16384
+    #: Number of frames buffered by the streaming reader.
+    STREAM_FRAMES = 256
+    #: Timeout in ms of each read of the streaming reader, which bounds the time taken by stop_stream.
+    STREAM_TIMEOUT = 100
+
     find_devices = staticmethod(find_devices)
 
     def __init__(self, vendor=None, product=None, serial_number=None,
@@ -336,6 +431,12 @@ class USBDriver(Driver):
         self.log_debug('EP Address: recv={}, send={}'.format(self.usb_recv_ep.bEndpointAddress,
                                                              self.usb_send_ep.bEndpointAddress))
 
+        #: FrameRing filled by the streaming reader.
+        self.stream_buffer = None
+        self._stream = None
+        self._stream_stop = threading.Event()
+        self._stream_error = None
+
     def _find_interface(self, dev, setting):
         return self.usb_dev.get_active_configuration()[self.INTERFACE]
 
@@ -391,9 +492,96 @@ class USBDriver(Driver):
 
         return data
 
+    def raw_recv_into(self, buffer):
+        """Receive raw bytes from the instrument into an existing buffer.
+
+        :param buffer: array.array('B') to be filled, without a new allocation
+                       with PyUSB versions accepting a buffer in Endpoint.read.
+        :return: number of bytes received.
+        """
+        return _read_into(self.usb_recv_ep, buffer, self.TIMEOUT)
+
+    def start_stream(self, frame_size=None, frames=None, endpoint=None):
+        """Read an IN endpoint continuously from a background thread into
+        a FrameRing (stream_buffer), to be consumed with iter_frames.
+
+        :param frame_size: size in bytes of each read (default STREAM_FRAME_SIZE).
+        :param frames: number of buffered frames (default STREAM_FRAMES).
+        :param endpoint: endpoint to read (default the receive endpoint).
+        """
+        if self._stream is not None:
+            return
+
+        ring = FrameRing(frames or self.STREAM_FRAMES, frame_size or self.STREAM_FRAME_SIZE)
+        self.stream_buffer = ring
+        self._stream_error = None
+        self._stream_stop.clear()
+        self._stream = threading.Thread(target=self._read_stream, args=(endpoint or self.usb_recv_ep, ring),
+                                        name='{}-stream'.format(self.name), daemon=True)
+        self._stream.start()
+
+    def stop_stream(self):
+        """Stop the streaming reader. The frames already buffered
+        can still be consumed with iter_frames.
+        """
+        if self._stream is None:
+            return
+        self._stream_stop.set()
+        stream, self._stream = self._stream, None
+        stream.join()
+        self.stream_buffer.close()
+
+    @property
+    def stream_overflows(self):
+        """Number of frames dropped, oldest first, because the consumer did not keep up.
+        """
+        return self.stream_buffer.overflows if self.stream_buffer is not None else 0
+
+    def iter_frames(self, timeout=None):
+        """Iterate over the frames received by the streaming reader,
+        as memoryviews which are only valid until the next iteration.
+
+        The iteration ends after stop_stream, when the buffered frames are consumed.
+
+        :param timeout: seconds to wait for each frame.
+        :raises LantzUSBTimeoutError: if no frame arrives within timeout.
+        """
+        ring = self.stream_buffer
+        if ring is None:
+            raise InstrumentError('The streaming reader was not started.')
+
+        while True:
+            frame = ring.get(timeout)
+            if frame is None:
+                if self._stream_error is not None:
+                    raise InstrumentError('Streaming reader stopped: {}'.format(self._stream_error))
+                if ring.closed:
+                    return
+                raise LantzUSBTimeoutError('No frame received in {} s.'.format(timeout))
+            try:
+                yield frame
+            finally:
+                frame.release()
+
+    def _read_stream(self, endpoint, ring):
+        while not self._stream_stop.is_set():
+            try:
+                length = _read_into(endpoint, ring.next_free(), self.STREAM_TIMEOUT)
+            except usb.core.USBError as e:
+                if _is_timeout(e):
+                    continue
+                self._stream_error = e
+                self.log_error('Streaming reader stopped: {}', e)
+                ring.close()
+                break
+
+            if length:
+                ring.commit(length)
+
     def finalize(self):
         """Close port
         """
+        self.stop_stream()
         self.log_debug('Closing device {}', str(DeviceInfo.from_device(self.usb_dev)))
         return usb.util.dispose_resources(self.usb_dev)
 
@@ -14,9 +14,15 @@
 
 import enum
 import time
+import array
 import struct
 from collections import namedtuple
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 import usb
 from lantz.drivers.legacy.textual import TextualMixin
 from lantz.errors import InstrumentError
@@ -57,6 +63,10 @@ def find_tmc_devices(vendor=None, product=None, serial_number=None, custom_match
     return find_devices(vendor, product, serial_number, is_usbtmc, **kwargs)
 
 
+#: Size of the header of bulk messages.
+HEADER_SIZE = 12
+
+
 class BulkOutMessage(object):
     """The Host uses the Bulk-OUT endpoint to send USBTMC command messages to the device.
     """
@@ -84,7 +94,7 @@ class BulkInMessage(namedtuple('BulkInMessage', 'msgid btag btaginverse '
 
         transfer_size, transfer_attributes = struct.unpack_from('<LBxxx', data, 4)
 
-        data = data[12:]
+        data = data[HEADER_SIZE:]
         return cls(msgid, btag, btaginverse, transfer_size, transfer_attributes, data)
 
 
@@ -113,8 +123,14 @@ class USBTMCDriver(USBDriver, TextualMixin):
     SEND_TERMINATION = ''
     RECV_TERMINATION = '\n'
 
+    #: Maximum size of the data in each bulk message.
     RECV_CHUNK = 1024 ** 2
 
+    _transfer_buffer = None
+
+    # True if the last bulk message received was the end of the message.
+    _transfer_eom = False
+
     find_devices = staticmethod(find_tmc_devices)
 
     def __init__(self, vendor=None, product=None, serial_number=None, **kwargs):
@@ -160,52 +176,188 @@ class USBTMCDriver(USBDriver, TextualMixin):
             encoding = self.ENCODING
 
         message = bytes(command + termination, encoding)
-        self.log_debug('Sending {}', message)
+        self.log_io('Sending {!r}', message)
+
+        return self._send_message(message)
+
+    send.__doc__ = TextualMixin.send.__doc__
+
+    def send_bytes(self, data):
+        """Send binary data to the instrument as one message.
+
+        :param data: bytes-like object.
+        :return: number of bytes sent.
+        """
+        self.log_io('Sending {!r}', data)
+        return self._send_message(data)
+
+    def _send_message(self, message):
+        view = memoryview(message).cast('B')
+        size = len(view)
 
-        begin, end, size = 0, 0, len(message)
         bytes_sent = 0
-        while not end > size:
-            begin, end = end, begin + self.RECV_CHUNK
+        begin = 0
+        while True:
+            end = min(begin + self.RECV_CHUNK, size)
 
             self._btag = (self._btag % 255) + 1
 
-            data = BulkOutMessage.build_array(self._btag, end > size, message[begin:end])
+            data = BulkOutMessage.build_array(self._btag, end == size, view[begin:end])
 
             bytes_sent += self.raw_send(data)
 
+            begin = end
+            if begin >= size:
+                break
+
         return bytes_sent
 
-    send.__doc__ = TextualMixin.send.__doc__
+    def _read_transfer(self, size):
+        """Request a bulk message of at most size bytes and receive it
+        into a buffer reused by all transfers.
 
-    def recv(self, termination=None, encoding=None, recv_chunk=None):
+        :return: memoryview of the data (valid until the next transfer), end of message.
+        """
+        self._btag = (self._btag % 255) + 1
 
-        termination = termination or self.RECV_TERMINATION
-        encoding = encoding or self.ENCODING
-        recv_chunk = recv_chunk or self.RECV_CHUNK
+        self.raw_send(BulkInMessage.build_array(self._btag, size, None))
 
-        eom = False
+        length = HEADER_SIZE + size + (-size) % 4
+        buffer = self._transfer_buffer
+        if buffer is None or len(buffer) < length:
+            buffer = self._transfer_buffer = array.array('B', bytes(length))
 
-        received = self._received
+        received = self.raw_recv_into(buffer)
+        if received < HEADER_SIZE:
+            raise InstrumentError('Incomplete bulk message header ({} bytes).'.format(received))
 
-        while not (termination in received or eom):
-            self._btag = (self._btag % 255) + 1
+        msgid, btag, transfer_size, attributes = struct.unpack_from('<BBxxLBxxx', buffer)
+        if msgid != MSGID.DEV_DEP_MSG_IN or btag != self._btag:
+            raise InstrumentError('Unexpected bulk message (MsgID {}, bTag {} instead of {}).'.format(msgid, btag,
+                                                                                                 self._btag))
 
-            req = BulkInMessage.build_array(self._btag, recv_chunk, None)
+        view = memoryview(buffer)
+        end = HEADER_SIZE + transfer_size
+        while received < end:
+            data = self.raw_recv(end - received)
+            view[received:received + len(data)] = data
+            received += len(data)
 
-            self.raw_send(req)
+        self._transfer_eom = bool(attributes & 1)
+        return view[HEADER_SIZE:end], self._transfer_eom
+
+    def recv(self, termination=None, encoding=None, recv_chunk=None):
+
+        termination = termination or self.RECV_TERMINATION
+        encoding = encoding or self.ENCODING
+        recv_chunk = recv_chunk or self.RECV_CHUNK
 
-            resp = self.raw_recv(recv_chunk)
+        return self._recv_message(termination, encoding, lambda: self._read_transfer(recv_chunk))
 
-            response = BulkInMessage.from_bytes(resp)
+    recv.__doc__ = TextualMixin.recv.__doc__
 
-            received += str(response.data, encoding)
-            eom = response.transfer_attributes & 1
+    def _take_pending(self, size=-1):
+        """Return at most size bytes received but not consumed by recv,
+        and True if they end the message.
+        """
+        pending = self._recv_buffer
+        if not pending:
+            return bytearray(), False
+        if 0 <= size < len(pending):
+            data = pending[:size]
+            del pending[:size]
+            return data, False
+        data = bytearray(pending)
+        del pending[:]
+        return data, self._transfer_eom
+
+    def recv_into(self, buffer):
+        """Receive a binary message into a writable buffer (e.g. a bytearray or
+        a NumPy array) until it is full or the message ends.
+
+        :return: number of bytes received.
+        """
+        view = memoryview(buffer).cast('B')
+        size = len(view)
 
-        self.log_debug('Received {!r} (len={})', received, len(received))
+        pending, eom = self._take_pending(size)
+        received = len(pending)
+        view[:received] = pending
 
-        received, self._received = received.split(termination, 1)
+        while not eom and received < size:
+            data, eom = self._read_transfer(min(self.RECV_CHUNK, size - received))
+            count = min(len(data), size - received)
+            view[received:received + count] = data[:count]
+            received += count
 
+        self.log_io('Received {!r}', view[:received])
         return received
 
-    recv.__doc__ = TextualMixin.recv.__doc__
+    def recv_bytes(self, size=-1):
+        """Receive a binary message without decoding it.
 
+        :param size: maximum number of bytes, or -1 to receive until the end of the message.
+        :rtype: bytearray
+        """
+        if size >= 0:
+            data = bytearray(size)
+            del data[self.recv_into(data):]
+            return data
+
+        data, eom = self._take_pending()
+        while not eom:
+            chunk, eom = self._read_transfer(self.RECV_CHUNK)
+            data += chunk
+
+        self.log_io('Received {!r}', data)
+        return data
+
+    def recv_block(self, dtype=None):
+        """Receive an IEEE 488.2 definite length arbitrary block (#<n><length><data>),
+        discarding the rest of the message (e.g. the termination).
+
+        :param dtype: NumPy data type of the block. If given, a NumPy array
+                      viewing the received bytes is returned.
+        :rtype: bytearray or numpy.ndarray
+        """
+        data, eom = self._take_pending()
+        while True:
+            start = data.find(b'#')
+            if start >= 0 and len(data) > start + 1:
+                digits = data[start + 1] - 48
+                if not 1 <= digits <= 9:
+                    raise InstrumentError('Invalid or indefinite length block header.')
+                offset = start + 2 + digits
+                if len(data) >= offset:
+                    break
+            if eom:
+                raise InstrumentError('Message ended before the block header.')
+            chunk, eom = self._read_transfer(self.RECV_CHUNK)
+            data += chunk
+
+        length = int(data[start + 2:offset])
+        block = bytearray(length)
+        view = memoryview(block)
+
+        received = min(length, len(data) - offset)
+        view[:received] = data[offset:offset + received]
+        del data
+
+        while received < length:
+            if eom:
+                raise InstrumentError('Block ended after {} of {} bytes.'.format(received, length))
+            chunk, eom = self._read_transfer(min(self.RECV_CHUNK, length - received))
+            count = min(len(chunk), length - received)
+            view[received:received + count] = chunk[:count]
+            received += count
+
+        while not eom:
+            _, eom = self._read_transfer(self.RECV_CHUNK)
+
+        self.log_io('Received block {!r}', block)
+
+        if dtype is None:
+            return block
+        if np is None:
+            raise ImportError('recv_block with dtype requires NumPy')
+        return np.frombuffer(block, dtype)
@@ -12,7 +12,18 @@
 """
 
 import enum
+import time
+import atexit
 import socket
+import struct
+import threading
+from collections import deque, defaultdict
+from concurrent import futures
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from lantz.errors import InstrumentError
 from lantz.drivers.legacy import rpc
@@ -50,6 +61,10 @@ DEVICE_INTR_PROG  = 0x0607b1
 DEVICE_INTR_VERS  = 1
 DEVICE_INTR_SRQ   = 30
 
+# Interrupt channel protocol families
+DEVICE_TCP = 0
+DEVICE_UDP = 1
+
 # Error states
 class ERROR_CODES(enum.IntEnum):
     NO_ERROR = 0
@@ -182,7 +197,7 @@ class Vxi11Unpacker(rpc.Unpacker):
     
     def unpack_device_docmd_resp(self):
         error = self.unpack_int()
-        data_out = self.unpack_opaque()
+        data_out = self.unpack_opaque().tobytes()
         return error, data_out
 
 
@@ -279,7 +294,7 @@ class CoreClient(rpc.TCPClient):
     def create_intr_chan(self, host_addr, host_port, prog_num, prog_vers, prog_family):
         params = (host_addr, host_port, prog_num, prog_vers, prog_family)
         return self.make_call(CREATE_INTR_CHAN, params,
-                              self.packer.pack_device_docmd_parms,
+                              self.packer.pack_device_remote_func_parms,
                               self.unpacker.unpack_device_error)
     
     def destroy_intr_chan(self):
@@ -288,51 +303,287 @@ class CoreClient(rpc.TCPClient):
                               self.unpacker.unpack_device_error)
 
 
+class IntrServer(rpc.TCPServer):
+    """Interrupt channel server, receiving the device_intr_srq calls
+    of an instrument in a background thread.
+
+    :param host: local address to listen to.
+    :param callback: called with the handle of each service request.
+    """
+
+    #: Seconds between checks of the stop flag while waiting for the instrument to connect.
+    ACCEPT_TIMEOUT = .1
+
+    def __init__(self, host, callback):
+        super().__init__(host, DEVICE_INTR_PROG, DEVICE_INTR_VERS, 0)
+        self.port = self.sock.getsockname()[1]
+        self.callback = callback
+        self._connection = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.sock.listen(1)
+        self.sock.settimeout(self.ACCEPT_TIMEOUT)
+        self._thread = threading.Thread(target=self._serve, name='vxi11-intr-{}'.format(self.port))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                # Ends the session with an EOFError.
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+        self.sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                connection = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self._connection = connection[0]
+            try:
+                self.session(connection)
+            finally:
+                self._connection = None
+                connection[0].close()
+
+    def session(self, connection):
+        sock = connection[0]
+        while True:
+            try:
+                call = rpc.recvrecord(sock)
+                reply = self.handle(call)
+                if reply is not None:
+                    rpc.sendrecord(sock, reply)
+            except (EOFError, OSError):
+                # The instrument closed the channel or stop was called.
+                break
+
+    def handle_30(self):
+        handle = self.unpacker.unpack_opaque().tobytes()
+        self.turn_around()
+        self.callback(handle)
+
+
+def _is_open(sock):
+    """Return True if the peer has not closed the connection.
+    """
+    try:
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return sock.recv(1, socket.MSG_PEEK) != b''
+        finally:
+            sock.settimeout(timeout)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+
+def _close_link(client, link):
+    try:
+        client.destroy_link(link)
+    except (OSError, EOFError, rpc.RPCError):
+        pass
+    client.close()
+
+
+class LinkPool(object):
+    """Open links kept alive across driver instances, by host and device,
+    to avoid the round trips of the port mapper and create_link.
+
+    :param max_idle: seconds after which an unused link is destroyed.
+    """
+
+    def __init__(self, max_idle=300.):
+        self.max_idle = max_idle
+        #: (host, device): list of (client, link, max_recv_size, time of release)
+        self._links = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def acquire(self, host, device):
+        """Return an open link as (client, link, max_recv_size), or None.
+        """
+        with self._lock:
+            idle = self._links[(host, device)]
+            expired = self._pop_expired()
+            while idle:
+                client, link, max_recv_size, released = idle.pop()
+                if _is_open(client.sock):
+                    break
+                expired.append((client, link))
+            else:
+                client = None
+
+        for item in expired:
+            _close_link(*item)
+
+        if client is None:
+            return None
+        return client, link, max_recv_size
+
+    def release(self, host, device, client, link, max_recv_size):
+        """Keep an open link for the next acquire.
+        """
+        with self._lock:
+            self._links[(host, device)].append((client, link, max_recv_size, time.monotonic()))
+            expired = self._pop_expired()
+
+        for item in expired:
+            _close_link(*item)
+
+    def clear(self):
+        """Destroy all idle links.
+        """
+        with self._lock:
+            expired = [(client, link) for idle in self._links.values() for client, link, _, _ in idle]
+            self._links.clear()
+
+        for item in expired:
+            _close_link(*item)
+
+    def _pop_expired(self):
+        limit = time.monotonic() - self.max_idle
+        expired = []
+        for idle in self._links.values():
+            while idle and idle[0][3] < limit:
+                client, link, _, _ = idle.pop(0)
+                expired.append((client, link))
+        return expired
+
+
+#: Pool used by the drivers created with keep_link.
+LINK_POOL = LinkPool()
+
+atexit.register(LINK_POOL.clear)
+
+
 class Vxi11Driver(Driver):
     """VXI-11 instrument interface client.
     We do not inherit from TCPDriver because the RPC implementation has its own socket.
+
+    :param host: address of the instrument.
+    :param device: name of the device in the instrument.
+    :param keep_link: keep the link open in LINK_POOL when finalized, for the
+                      next driver of the same device (default KEEP_LINK).
     """
 
-    def __init__(self, host='localhost', *args, **kwargs):
+    ENCODING = 'ascii'
+
+    #: Termination character of reads (None for reads ended by the instrument).
+    term_char = None
+
+    #: Client identifier sent when creating the link.
+    client_id = 0
+
+    #: Size in bytes requested by each device_read call.
+    READ_CHUNK = 1 << 20
+
+    #: Number of device_read calls kept in flight when the number of bytes
+    #: to read is known exactly (see read_into and read_block).
+    PIPELINE_DEPTH = 4
+
+    KEEP_LINK = False
+
+    def __init__(self, host='localhost', *args, device='inst0', keep_link=None, **kwargs):
         super().__init__(host, *args, **kwargs)
 
         self.socket = None
         self.lock_timeout = 10000
         self.io_timeout = 10000
-        self.client = CoreClient(host)
+        self.host = host
+        self.device = device
+        self.keep_link = self.KEEP_LINK if keep_link is None else keep_link
+        self.client = None
         self.link = None
+        # True when replies might have been left unread after an error.
+        self._link_broken = False
+        #: Largest block accepted by device_write, as given by create_link.
+        self.max_recv_size = 1024
+
+        self._intr = None
+        self._srq = threading.Event()
+        self._srq_futures = []
+        self._srq_lock = threading.Lock()
+        self._srq_subscribers = ()
 
     def initialize(self):
         """Open connection to VXI-11 instrument
         """
         super().initialize()
+
+        self._link_broken = False
+        pooled = LINK_POOL.acquire(self.host, self.device) if self.keep_link else None
+        if pooled is not None:
+            self.client, self.link, self.max_recv_size = pooled
+            self.socket = self.client.sock
+            return
+
+        self.client = self._connect()
         self.socket = self.client.sock
-        self.socket.connect((self.client.sock, self.client.port))
 
-        error, link, abort_port, max_recv_size = self.client.create_link(self.client_id, 0, self.lock_timeout, self.name.encode(self.ENCODING))
+        error, link, abort_port, max_recv_size = self.client.create_link(self.client_id, 0, self.lock_timeout,
+                                                                         self.device.encode(self.ENCODING))
         
         if error:
             raise Vxi11Error("error creating link: %d" % error)
         
         self.link = link
-        self.RECV_CHUNK = max_recv_size
-        
+        self.max_recv_size = max_recv_size
+
+    def _connect(self):
+        client = CoreClient(self.host)
+        try:
+            client.sock.connect((client.host, client.port))
+        except ConnectionRefusedError:
+            # The port given by the port mapper might be stale.
+            client.close()
+            rpc.forget_port(self.host, DEVICE_CORE_PROG, DEVICE_CORE_VERS, rpc.IPPROTO_TCP)
+            client = CoreClient(self.host)
+            client.sock.connect((client.host, client.port))
+        return client
+
     def finalize(self):
-        """Close connection
+        """Close connection, or keep it in LINK_POOL if keep_link was given.
         """
-        self.client.destroy_link(self.link)
-        self.client.close()
+        if self._intr is not None:
+            self.disable_srq()
+        if self._link_broken:
+            # Unread replies are in the connection, closing it destroys the link.
+            self.client.close()
+        elif self.keep_link:
+            LINK_POOL.release(self.host, self.device, self.client, self.link, self.max_recv_size)
+        else:
+            self.client.destroy_link(self.link)
+            self.client.close()
+        self.client = None
         super().finalize()
 
+    def _read_flags(self):
+        if self.term_char is None:
+            return 0, 0
+        return OP_FLAG_TERMCHAR_SET, str(self.term_char).encode('utf-8')[0]
+
     def write_raw(self, data):
-        """Write binary data to instrument
+        """Write binary data to instrument, in blocks of at most
+        the size negotiated when creating the link.
         """
 
+        data = memoryview(data).cast('B')
         if self.term_char is not None:
-            flags = OP_FLAG_TERMCHAR_SET
-            term_char = str(self.term_char).encode('utf-8')[0]
-            data += term_char
-        
+            data = memoryview(bytes(data) + str(self.term_char).encode('utf-8'))
+
         flags = 0
         
         num = len(data)
@@ -340,10 +591,10 @@ class Vxi11Driver(Driver):
         offset = 0
         
         while num > 0:
-            if num <= self.RECV_CHUNK:
+            if num <= self.max_recv_size:
                 flags |= OP_FLAG_END
             
-            block = data[offset:offset+self.RECV_CHUNK]
+            block = data[offset:offset+self.max_recv_size]
             
             error, size = self.client.device_write(self.link, self.io_timeout, self.lock_timeout, flags, block)
             
@@ -356,41 +607,154 @@ class Vxi11Driver(Driver):
             num -= size
 
     def read_raw(self, num=-1):
-        """Read binary data from instrument
-        """
+        """Read binary data from instrument.
 
-        read_len = self.RECV_CHUNK
-        if 0 < num < self.RECV_CHUNK:
-            read_len = num
-        
-        flags = 0
+        :param num: maximum number of bytes to read, or -1 to read until the
+                    instrument ends the message.
+        :return: bytearray
+        """
+        flags, term_char = self._read_flags()
+        read_data = bytearray()
         reason = 0
-        
-        term_char = 0
-        
-        if self.term_char is not None:
-            flags = OP_FLAG_TERMCHAR_SET
-            term_char = str(self.term_char).encode('utf-8')[0]
-        
-        read_data = b''
-        
-        while reason & (RX_END | RX_CHR) == 0:
-            error, reason, data = self.client.device_read(self.link, read_len, self.io_timeout, self.lock_timeout, flags, term_char)
-            
+        while reason & (RX_END | RX_CHR) == 0 and (num < 0 or len(read_data) < num):
+            size = self.READ_CHUNK if num < 0 else min(self.READ_CHUNK, num - len(read_data))
+            error, reason, data = self.client.device_read(self.link, size, self.io_timeout,
+                                                          self.lock_timeout, flags, term_char)
             if error:
                 raise Vxi11Error("error reading data: %d" % error)
-            
             read_data += data
-            
-            if num > 0:
-                num = num - len(data)
-                if num <= 0:
-                    break
-                if num < read_len:
-                    read_len = num
-            
+            del data
+
         return read_data
 
+    def read_into(self, buffer, exact=False):
+        """Read binary data from the instrument into a writable buffer
+        (e.g. a bytearray or a NumPy array) until it is full or the
+        instrument ends the message.
+
+        :param exact: True if the instrument is known to send at least len(buffer)
+                      bytes (e.g. as given by a block header). Then up to
+                      PIPELINE_DEPTH device_read calls are kept in flight.
+                      Otherwise they are sent one at a time, so that a short
+                      message returns as soon as the instrument ends it.
+        :return: number of bytes read.
+        """
+        view = memoryview(buffer).cast('B')
+        return self._read_into(view, self.PIPELINE_DEPTH if exact else 1)[0]
+
+    def _read_into(self, view, depth):
+        """Read into a byte memoryview keeping up to depth device_read calls in flight.
+
+        :return: number of bytes read and True if the instrument ended the message.
+        """
+        num = len(view)
+        flags, term_char = self._read_flags()
+        client = self.client
+
+        # (xid, requested size) of the calls in flight, in the order they were sent.
+        in_flight = deque()
+        requested = 0
+        position = 0
+        done = ended = False
+        error = 0
+
+        try:
+            while True:
+                while not done and len(in_flight) < depth and position + requested < num:
+                    size = min(self.READ_CHUNK, num - position - requested)
+                    params = (self.link, size, self.io_timeout, self.lock_timeout, flags, term_char)
+                    xid = client.send_call(DEVICE_READ, params, client.packer.pack_device_read_parms)
+                    in_flight.append((xid, size))
+                    requested += size
+
+                if not in_flight:
+                    break
+
+                xid, (reply_error, reason, data) = client.recv_reply(client.unpacker.unpack_device_read_resp)
+                expected, size = in_flight.popleft()
+                requested -= size
+                if xid != expected:
+                    raise rpc.RPCError('wrong xid in reply %r instead of %r' % (xid, expected))
+
+                # After the end or an error, the remaining replies are only drained.
+                if not done:
+                    if reply_error:
+                        error, done = reply_error, True
+                    else:
+                        received = min(len(data), num - position)
+                        view[position:position + received] = data[:received]
+                        position += received
+                        ended = bool(reason & (RX_END | RX_CHR))
+                        done = ended or position >= num
+                del data
+        except BaseException:
+            # Replies might be left unread in the connection.
+            self._link_broken = True
+            raise
+
+        if error:
+            raise Vxi11Error("error reading data: %d" % error)
+
+        return position, ended
+
+    def read_block(self, dtype=None):
+        """Read an IEEE 488.2 definite length arbitrary block (#<n><length><data>),
+        discarding the rest of the message (e.g. the termination).
+
+        The data after the first reply is read with pipelined device_read calls.
+
+        :param dtype: NumPy data type of the block. If given, a NumPy array
+                      viewing the received bytes is returned.
+        :rtype: bytearray or numpy.ndarray
+        """
+        flags, term_char = self._read_flags()
+        data = bytearray()
+        reason = 0
+        while True:
+            start = data.find(b'#')
+            if start >= 0 and len(data) > start + 1:
+                digits = data[start + 1] - 48
+                if not 1 <= digits <= 9:
+                    raise Vxi11Error('Invalid or indefinite length block header.')
+                offset = start + 2 + digits
+                if len(data) >= offset:
+                    break
+            if reason & (RX_END | RX_CHR):
+                raise Vxi11Error('Message ended before the block header.')
+            error, reason, chunk = self.client.device_read(self.link, self.READ_CHUNK, self.io_timeout,
+                                                           self.lock_timeout, flags, term_char)
+            if error:
+                raise Vxi11Error("error reading data: %d" % error)
+            data += chunk
+            del chunk
+
+        length = int(data[start + 2:offset])
+        block = bytearray(length)
+        view = memoryview(block)
+
+        received = min(length, len(data) - offset)
+        view[:received] = data[offset:offset + received]
+        ended = reason & (RX_END | RX_CHR)
+        del data
+
+        if received < length:
+            if ended:
+                raise Vxi11Error('Block ended after {} of {} bytes.'.format(received, length))
+            count, ended = self._read_into(view[received:], self.PIPELINE_DEPTH)
+            received += count
+            if received < length:
+                raise Vxi11Error('Block ended after {} of {} bytes.'.format(received, length))
+        del view
+
+        if not ended:
+            self.read_raw()
+
+        if dtype is None:
+            return block
+        if np is None:
+            raise ImportError('read_block with dtype requires NumPy')
+        return np.frombuffer(block, dtype)
+
     def read_stb(self):
         """Read status byte
         """
@@ -470,5 +834,86 @@ class Vxi11Driver(Driver):
         if error:
             raise Vxi11Error("error unlocking: %d" % error)
 
+    def enable_srq(self):
+        """Open an interrupt channel and ask the instrument to report
+        service requests through it, instead of polling the status byte.
+        """
+        if self._intr is None:
+            host = self.socket.getsockname()[0]
+            server = IntrServer(host, self._on_srq)
+            server.start()
+            host_addr = struct.unpack('!I', socket.inet_aton(host))[0]
+            error = self.client.create_intr_chan(host_addr, server.port, DEVICE_INTR_PROG,
+                                                 DEVICE_INTR_VERS, DEVICE_TCP)
+            if error:
+                server.stop()
+                raise Vxi11Error("error creating interrupt channel: %d" % error)
+            self._intr = server
+
+        error = self.client.device_enable_srq(self.link, True, str(self.link).encode('ascii'))
 
+        if error:
+            raise Vxi11Error("error enabling service requests: %d" % error)
 
+    def disable_srq(self):
+        """Stop service requests and close the interrupt channel.
+        """
+        if self._intr is None:
+            return
+
+        try:
+            error = self.client.device_enable_srq(self.link, False, b'')
+            if error:
+                raise Vxi11Error("error disabling service requests: %d" % error)
+            error = self.client.destroy_intr_chan()
+            if error:
+                raise Vxi11Error("error destroying interrupt channel: %d" % error)
+        finally:
+            self._intr.stop()
+            self._intr = None
+
+    def wait_srq(self, timeout=None):
+        """Wait for a service request, returning immediately if one
+        arrived since the previous call. Requires enable_srq.
+
+        :param timeout: seconds to wait (None waits forever).
+        :return: False if the timeout expired.
+        """
+        if not self._srq.wait(timeout):
+            return False
+        self._srq.clear()
+        return True
+
+    def srq_future(self):
+        """Return a Future that is done on the next service request.
+        Requires enable_srq.
+        """
+        future = futures.Future()
+        with self._srq_lock:
+            self._srq_futures.append(future)
+        return future
+
+    def subscribe_srq(self, callback):
+        """Call callback() from the interrupt channel thread
+        for each service request.
+        """
+        self._srq_subscribers += (callback, )
+
+    def unsubscribe_srq(self, callback):
+        """Stop calling a callback given to subscribe_srq.
+        """
+        self._srq_subscribers = tuple(item for item in self._srq_subscribers if item != callback)
+
+    def _on_srq(self, handle):
+        self.log_debug('Service request')
+        self._srq.set()
+        with self._srq_lock:
+            pending, self._srq_futures = self._srq_futures, []
+        for future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_result(None)
+        for callback in self._srq_subscribers:
+            try:
+                callback()
+            except Exception as e:
+                self.log_error('While calling {} for a service request: {}', callback, e)
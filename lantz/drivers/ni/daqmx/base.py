@@ -10,14 +10,19 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import time
+
 from lantz import Feat, Action
 from lantz.errors import InstrumentError
-from lantz.foreign import LibraryDriver, RetValue, RetStr
+from lantz.foreign import LibraryDriver, RetValue, RetStr, BufferPool
 
 from .constants import Constants, Types
 
 default_buf_size = 2048
 
+#: String buffers reused by the calls that return names and lists.
+_strings = BufferPool()
+
 _SAMPLE_MODES = {'finite': Constants.Val_FiniteSamps,
                  'continuous': Constants.Val_ContSamps,
                  'hwtimed': Constants.Val_HWTimedSinglePoint}
@@ -160,21 +165,21 @@ class System(_Base):
     def _device_names(self):
         """Return a tuple containing the names of all global devices installed in the system.
         """
-        err, buf = self.lib.GetSysDevNames(*RetStr(default_buf_size))
+        err, buf = self.lib.GetSysDevNames(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
     def _task_names(self):
         """Return a tuple containing the names of all global tasks saved in the system.
         """
-        err, buf = self.lib.GetSysTasks(*RetStr(default_buf_size))
+        err, buf = self.lib.GetSysTasks(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
     def _channel_names(self):
         """Return a tuple containing the names of all global channels saved in the system.
         """
-        err, buf = self.lib.GetSysGlobalChans(*RetStr(default_buf_size))
+        err, buf = self.lib.GetSysGlobalChans(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -206,7 +211,7 @@ class Device(_Base):
     def product_type(self):
         """Return the product name of the device.
         """
-        err, buf = self.lib.GetDevProductType(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevProductType(*RetStr(default_buf_size, pool=_strings))
         return buf
 
     @Feat(read_once=True)
@@ -230,7 +235,7 @@ class Device(_Base):
         physical channels available on the device.
         """
 
-        err, buf = self.lib.GetDevAIPhysicalChans(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevAIPhysicalChans(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -239,7 +244,7 @@ class Device(_Base):
         """Return a tuple with the names of the analog output
         physical channels available on the device.
         """
-        err, buf = self.lib.GetDevAOPhysicalChans(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevAOPhysicalChans(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -248,7 +253,7 @@ class Device(_Base):
         """Return a tuple with the names of the digital input lines
         physical channels available on the device.
         """
-        err, buf = self.lib.GetDevDILines(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevDILines(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -257,7 +262,7 @@ class Device(_Base):
         """Return a tuple with the names of the digital lines
         ports available on the device.
         """
-        err, buf = self.lib.GetDevDOLines(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevDOLines(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -266,7 +271,7 @@ class Device(_Base):
         """Return a tuple with the names of the digital input
         ports available on the device.
         """
-        err, buf = self.lib.GetDevDIPorts(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevDIPorts(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -275,7 +280,7 @@ class Device(_Base):
         """Return a tuple with the names of the digital output
         ports available on the device.
         """
-        err, buf = self.lib.GetDevDOPorts(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevDOPorts(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -284,7 +289,7 @@ class Device(_Base):
         """Return a tuple with the names of the counter input
         physical channels available on the device.
         """
-        err, buf = self.lib.GetDevCIPhysicalChans(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevCIPhysicalChans(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -293,7 +298,7 @@ class Device(_Base):
         """Return a tuple with the names of the counter input
         physical channels available on the device.
         """
-        err, buf = self.lib.GetDevCOPhysicalChans(*RetStr(default_buf_size))
+        err, buf = self.lib.GetDevCOPhysicalChans(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -368,6 +373,9 @@ class Task(_Base):
 
     _REGISTRY = {}
 
+    #: Polling interval (in seconds) used by wait_until_done.
+    WAIT_POLL = 0.01
+
     @classmethod
     def register_class(cls, klass):
         cls._REGISTRY[klass.IO_TYPE] = klass
@@ -383,7 +391,7 @@ class Task(_Base):
 
     def _create_task(self, name):
         err, self.__task_handle = self.lib.CreateTask(name, RetValue('u32'))
-        err, self.name = self.lib.GetTaskName(*RetStr(default_buf_size))
+        err, self.name = self.lib.GetTaskName(*RetStr(default_buf_size, pool=_strings))
         self.log_debug('Created task with {} ({})'.format(self.name, self.__task_handle))
 
     def __init__(self, name='', *args, **kwargs):
@@ -418,14 +426,14 @@ class Task(_Base):
     def _channel_names(self):
         """Return a tuple with the names of all virtual channels in the task.
         """
-        err, buf = self.lib.GetTaskChannels(*RetStr(default_buf_size))
+        err, buf = self.lib.GetTaskChannels(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
     def _device_names(self):
         """Return a tuple with the names of all devices in the task.
         """
-        err, buf = self.lib.GetTaskDevices(*RetStr(default_buf_size))
+        err, buf = self.lib.GetTaskDevices(*RetStr(default_buf_size, pool=_strings))
         names = tuple(n.strip() for n in buf.split(',') if n.strip())
         return names
 
@@ -1315,7 +1323,7 @@ class Task(_Base):
 
         Use None to Reset
         """
-        err, value = self.lib.GetDigEdgeArmStartTrigSrc(RetStr(default_buf_size))
+        err, value = self.lib.GetDigEdgeArmStartTrigSrc(RetStr(default_buf_size, pool=_strings))
         return value
 
     @arm_start_trigger_source.setter
@@ -1379,7 +1387,7 @@ class Task(_Base):
         else:
             raise InstrumentError('Pause trigger type is not specified')
 
-        err, value = fun(*RetStr(default_buf_size))
+        err, value = fun(*RetStr(default_buf_size, pool=_strings))
         return value
 
     @pause_trigger_source.setter
@@ -1493,10 +1501,25 @@ class Task(_Base):
           If you set timeout to 0, the function checks once and
           returns an error if the measurement or generation is not
           done.
+
+        The task is polled every WAIT_POLL seconds, reporting the fraction
+        of samples acquired as progress. The wait can be interrupted by
+        cancelling the asynchronous call.
         """
-        if timeout < 0:
-            timeout = Constants.Val_WaitInfinitely
-        return self.lib.WaitUntilTaskDone(timeout)
+        deadline = time.time() + timeout if timeout >= 0 else None
+        while deadline is None or time.time() < deadline:
+            # The library is queried directly, as reading the is_done feat
+            # would log every poll.
+            err, done = self.lib.IsTaskDone(RetValue('u32'))
+            if done != 0:
+                return
+            if getattr(self, 'samples_per_channel', None) and getattr(self, 'IO_TYPE', None) == 'AI':
+                acquired = self.samples_per_channel_acquired()
+                self.report_progress(min(100., 100. * acquired / self.samples_per_channel))
+            self.sleep(self.WAIT_POLL)
+
+        # Let the library report the timeout error.
+        return self.lib.WaitUntilTaskDone(0)
 
 
 class Channel(_Base):
@@ -1544,7 +1567,7 @@ class Channel(_Base):
     def physical_channel_name(self,):
         """Name of the physical channel upon which this virtual channel is based.
         """
-        err, value = self.lib.GetPhysicalChanName(*RetStr(default_buf_size))
+        err, value = self.lib.GetPhysicalChanName(*RetStr(default_buf_size, pool=_strings))
         return value
 
     def operation_direction(self):
@@ -12,7 +12,7 @@
 import numpy as np
 
 from lantz import Feat, Action
-from lantz.foreign import RetStr, RetTuple, RetValue
+from lantz.foreign import RetStr, RetTuple, RetValue, RetArray
 
 from .base import Task, Channel
 from .constants import Constants
@@ -127,12 +127,12 @@ class AnalogInputTask(Task):
 
         number_of_channels = self.number_of_channels()
         if group_by == Constants.Val_GroupByScanNumber:
-            data = np.zeros((samples_per_channel, number_of_channels), dtype=np.float64)
+            shape = (samples_per_channel, number_of_channels)
         else:
-            data = np.zeros((number_of_channels, samples_per_channel), dtype=np.float64)
+            shape = (number_of_channels, samples_per_channel)
 
         err, data, count = self.lib.ReadAnalogF64(samples_per_channel, timeout, group_by,
-                                                  data.ctypes.data, data.size, RetValue('i32'), None)
+                                                  *RetArray('f64', shape), RetValue('i32'), None)
 
         if samples_per_channel < count:
             if group_by == 'scan':
@@ -314,12 +314,12 @@ class DigitalTask(Task):
         number_of_channels = self.number_of_channels()
 
         if group_by == Constants.Val_GroupByScanNumber:
-            data = np.zeros((samples_per_channel, number_of_channels),dtype=dtype)
+            data = RetArray(dtype, (samples_per_channel, number_of_channels))
         else:
-            data = np.zeros((number_of_channels, samples_per_channel),dtype=dtype)
+            data = RetArray(dtype, (number_of_channels, samples_per_channel))
 
-        err, count, bps = self.lib.ReadDigitalLines(samples_per_channel, float64 (timeout),
-              group_by, data.ctypes.data, uInt32 (data.size * c),
+        err, data, count, bps = self.lib.ReadDigitalLines(samples_per_channel, float64 (timeout),
+              group_by, data, uInt32 (data.array.size * c),
               RetValue('i32'), RetValue('i32'),
               None
         )
@@ -506,10 +506,9 @@ class CounterInputTask(Task):
         if samples_per_channel is None:
             samples_per_channel = self.samples_per_channel_available()
 
-        data = np.zeros((samples_per_channel,),dtype=np.int32)
-
-        err, count = self.lib.ReadCounterU32(samples_per_channel, float64(timeout),
-                                             data.ctypes.data, data.size, RetValue('i32'), None)
+        err, data, count = self.lib.ReadCounterU32(samples_per_channel, float64(timeout),
+                                                   *RetArray('i32', samples_per_channel),
+                                                   RetValue('i32'), None)
 
         return data[:count]
 
@@ -343,8 +343,14 @@ class SR830(MessageBasedDriver):
 
     ## AUTO FUNCTIONS
 
-    def wait_bit1(self):
-        pass
+    def wait_bit1(self, poll=0.05):
+        """Wait until no command execution is in progress
+        (bit 1 of the serial poll status byte).
+
+        Can be interrupted by cancelling the asynchronous call.
+        """
+        while not int(self.query('*STB? 1')):
+            self.sleep(poll)
 
     @Action()
     def auto_gain_async(self):
@@ -52,6 +52,17 @@ def _dget(adict, instance=MISSING, key=MISSING):
     except KeyError:
         return adict[MISSING]
 
+def _equal(value, other):
+    """Return True if value and other are equal, also for
+    objects with element-wise comparison such as NumPy arrays.
+    """
+    try:
+        return bool(value == other)
+    except ValueError:
+        # Element-wise comparison without a single truth value.
+        return False
+
+
 def _dset(adict, value, instance=MISSING, key=MISSING):
     if instance not in adict:
         adict[instance] = copy.deepcopy(adict[MISSING])
@@ -255,7 +266,7 @@ class Feat(object):
         # and timing, caching, logging and error handling
         with instance._lock:
             current_value = self.get_cache(instance, key)
-            if not force and value == current_value:
+            if not force and _equal(value, current_value):
                 instance.log_info('No need to set {} = {} (current={}, force={})', name, value, current_value, force)
                 return
 
@@ -302,7 +313,7 @@ class Feat(object):
     def set_cache(self, instance, value, key=MISSING):
         old_value = self.get_cache(instance, key)
 
-        if value == old_value:
+        if _equal(value, old_value):
             return
 
         if isinstance(value, Q_):
@@ -383,7 +394,7 @@ class DictFeat(Feat):
     def set_cache(self, instance, value, key=MISSING):
         old_value = self.get_cache(instance, key)
 
-        if value == old_value:
+        if _equal(value, old_value):
             return
 
         if key is MISSING:
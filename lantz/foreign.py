@@ -10,12 +10,27 @@
 """
 
 import os
+import time
+import queue
 import ctypes
 import inspect
+import threading
+from collections import deque
+from concurrent import futures
 from ctypes.util import find_library
 from itertools import chain
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from lantz import Driver
+from lantz.errors import LantzTimeoutError
+
+
+class LantzForeignTimeoutError(futures.TimeoutError, LantzTimeoutError):
+    pass
 
 
 class Wrapper(object):
@@ -113,11 +128,63 @@ TYPES = {'c': ctypes.c_char,
          'f64': ctypes.c_double}
 
 
+class BufferPool(object):
+    """Reusable buffers for RetStr and RetArray.
+
+    Each thread has its own buffers and, for each type and size, `depth`
+    buffers are handed out in turn. A buffer obtained from the pool is
+    therefore valid until `depth` other buffers of the same type and size
+    are requested from the same thread.
+
+    :param depth: number of buffers per type and size.
+    """
+
+    def __init__(self, depth=2):
+        self.depth = depth
+        self._local = threading.local()
+
+    def _get(self, key, factory):
+        try:
+            rings = self._local.rings
+        except AttributeError:
+            rings = self._local.rings = {}
+
+        try:
+            ring = rings[key]
+        except KeyError:
+            ring = rings[key] = deque(factory() for _ in range(self.depth))
+
+        item = ring[0]
+        ring.rotate(-1)
+        return item
+
+    def string(self, length):
+        """Return a ctypes char array of the given length, holding an empty string.
+        """
+        buffer = self._get(('c', length), lambda: ctypes.create_string_buffer(length))
+        buffer[0] = b'\0'
+        return buffer
+
+    def array(self, dtype, shape):
+        """Return a NumPy array of the given dtype and shape (not initialized)
+        and a ctypes pointer to its data.
+        """
+        return self._get((dtype, shape), lambda: _new_array(dtype, shape, np.empty))
+
+    def clear(self):
+        """Release the buffers of the calling thread.
+        """
+        self._local.rings = {}
+
+
 class RetStr(object):
 
-    def __init__(self, length, encoding='ascii'):
+    def __init__(self, length, encoding='ascii', pool=None):
         self.length = length
-        self.buffer = ctypes.create_string_buffer(b'', length)
+        if pool is None:
+            self.buffer = ctypes.create_string_buffer(b'', length)
+        else:
+            self.buffer = pool.string(length)
         self.encoding = encoding
 
     def __iter__(self):
@@ -163,7 +230,127 @@ class RetTuple(object):
 
     @property
     def value(self):
-        return tuple(self.buffer[:])
+        return tuple(self.buffer)
+
+
+#: NumPy dtypes indexed by the type given to RetArray.
+_DTYPES = {}
+
+
+def _new_array(dtype, shape, factory):
+    array = factory(shape, dtype=dtype)
+    try:
+        ctype = np.ctypeslib.as_ctypes_type(dtype)
+    except (NotImplementedError, TypeError):
+        ctype = ctypes.c_char
+    return array, array.ctypes.data_as(ctypes.POINTER(ctype))
+
+
+class RetArray(object):
+    """NumPy array filled by a foreign function.
+
+    The function receives a pointer to the data of the array, which is
+    returned without copying. When iterated, yields itself and the
+    number of elements of the array.
+
+    :param dtype: a key of TYPES or any value accepted by numpy.dtype.
+    :param shape: int or tuple of ints.
+    :param pool: BufferPool from which the array is taken instead of
+                 allocating a new one. The array is then reused by later
+                 calls (see BufferPool).
+    """
+
+    def __init__(self, dtype, shape, pool=None):
+        if np is None:
+            raise ImportError('RetArray requires NumPy')
+
+        try:
+            dtype = _DTYPES[dtype]
+        except KeyError:
+            try:
+                dtype = _DTYPES[dtype] = np.dtype(TYPES.get(dtype, dtype))
+            except TypeError:
+                raise KeyError('The type {} is not defined ({})'.format(dtype, TYPES.keys()))
+
+        if pool is None:
+            self.array, self.buffer = _new_array(dtype, shape, np.zeros)
+        else:
+            self.array, self.buffer = pool.array(dtype, shape)
+
+    def __iter__(self):
+        yield self
+        yield self.array.size
+
+    @property
+    def value(self):
+        return self.array
+
+
+#: Marshalling plans indexed by the types of the arguments.
+_PLANS = {}
+
+
+def _make_plan(types):
+    """Build a function that converts arguments of the given types
+    to the arguments of a foreign function.
+
+    The function takes the tuple of arguments and returns the converted
+    arguments and the arguments to be collected after the call:
+    RetStr, RetTuple, RetValue and RetArray are replaced by their buffers
+    and collected, str is encoded as ascii and other values are unchanged.
+    """
+    names, new_args, collect = [], [], []
+    for ndx, type_ in enumerate(types):
+        name = 'a{:d}'.format(ndx)
+        names.append(name)
+        if issubclass(type_, (RetStr, RetTuple, RetValue, RetArray)):
+            new_args.append(name + '.buffer')
+            collect.append(name)
+        elif issubclass(type_, str):
+            new_args.append('bytes({}, "ascii")'.format(name))
+        else:
+            new_args.append(name)
+
+    if names:
+        source = 'def plan(args):\n    {}, = args\n    return ({}, ), ({})\n'
+        source = source.format(', '.join(names), ', '.join(new_args),
+                               ''.join(item + ', ' for item in collect))
+    else:
+        source = 'def plan(args):\n    return (), ()\n'
+
+    namespace = {}
+    exec(source, namespace)
+    return namespace['plan']
+
+
+class CallFuture(futures.Future):
+    """Future of a library function called in the worker thread
+    of a LibraryDriver.
+
+    result and exception wait at most until the deadline
+    (in time.monotonic seconds) unless a timeout is given.
+    """
+
+    def __init__(self, deadline=None):
+        super().__init__()
+        self.deadline = deadline
+
+    def remaining(self):
+        """Seconds left until the deadline, or None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.)
+
+    def result(self, timeout=None):
+        if timeout is None:
+            timeout = self.remaining()
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        if timeout is None:
+            timeout = self.remaining()
+        return super().exception(timeout)
 
 
 class LibraryDriver(Driver):
@@ -171,16 +358,45 @@ class LibraryDriver(Driver):
     calling a library (dll or others)
 
     To use this class you must override LIBRARY_NAME
+
+    Library functions listed in BLOCKING_FUNCTIONS are called in a worker
+    thread. The calling thread waits for them (at most BLOCKING_TIMEOUT
+    seconds) without holding the driver lock, so other threads can use the
+    driver meanwhile. While a blocking function is running, only the
+    functions listed in SAFE_FUNCTIONS (or in BLOCKING_ABORT) are called,
+    the others wait for it to finish.
     """
 
     #: Name of the library
     LIBRARY_NAME = ''
     LIBRARY_PREFIX = ''
 
+    #: Names of the library functions that are called in the worker thread.
+    BLOCKING_FUNCTIONS = ()
+
+    #: Names of the library functions that can be called
+    #: while a blocking function is running.
+    SAFE_FUNCTIONS = ()
+
+    #: Default time in seconds to wait for a blocking function (None waits forever).
+    BLOCKING_TIMEOUT = None
+
+    #: Name of the library function (called without arguments) that
+    #: aborts a blocking function when it times out, by blocking function.
+    BLOCKING_ABORT = {}
+
     def __init__(self, *args, **kwargs):
         library_name = kwargs.pop('library_name', None)
         super().__init__(*args, **kwargs)
 
+        self._blocking_names = frozenset(self.BLOCKING_FUNCTIONS)
+        self._safe_names = frozenset(self.SAFE_FUNCTIONS) | frozenset(self.BLOCKING_ABORT.values())
+        #: Name of the blocking function being called by the worker thread.
+        self._blocking = None
+        self._blocking_done = threading.Condition(self._lock)
+        self._worker = None
+        self._worker_queue = queue.Queue()
+
         folder = os.path.dirname(inspect.getfile(self.__class__))
         for name in chain(iter_lib(library_name, folder), iter_lib(self.LIBRARY_NAME, folder)):
             if name is None:
@@ -205,20 +421,87 @@ class LibraryDriver(Driver):
         return ret_value
 
     def _preprocess_args(self, name, *args):
-        new_args = []
-        collect = []
-        for arg in args:
-            if isinstance(arg, (RetStr, RetTuple, RetValue)):
-                collect.append(arg)
-                new_args.append(arg.buffer)
-            elif isinstance(arg, str):
-                new_args.append(bytes(arg, 'ascii'))
-            else:
-                new_args.append(arg)
-
-        return new_args, collect
+        types = tuple(map(type, args))
+        try:
+            plan = _PLANS[types]
+        except KeyError:
+            plan = _PLANS[types] = _make_plan(types)
+        return plan(args)
 
     def _wrapper(self, name, func, *args):
+        if name in self._blocking_names:
+            return self._call_blocking(name, func, args)
+        if self._worker is None or name in self._safe_names \
+                or threading.current_thread() is self._worker:
+            return self._call(name, func, args)
+
+        # Holding the lock keeps the worker from starting a blocking function.
+        with self._lock:
+            if self._blocking is not None:
+                self._wait_blocking(name)
+            return self._call(name, func, args)
+
+    def call_async(self, name, *args, timeout=None):
+        """Call a library function in the worker thread.
+
+        :param name: name of the library function.
+        :param timeout: seconds after which the result of the future is no
+                        longer waited for (defaults to BLOCKING_TIMEOUT).
+        :return: a CallFuture with the value returned by the function.
+        """
+        func = getattr(self.lib, name)
+        return self._submit_blocking(name, getattr(func, 'wrapped', func), args, timeout)
+
+    def _submit_blocking(self, name, func, args, timeout):
+        if timeout is None:
+            timeout = self.BLOCKING_TIMEOUT
+        fut = CallFuture(None if timeout is None else time.monotonic() + timeout)
+
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._serve_blocking,
+                                            name='{}-worker'.format(self.name), daemon=True)
+            self._worker.start()
+        self._worker_queue.put((fut, name, func, args))
+        return fut
+
+    def _serve_blocking(self):
+        while True:
+            fut, name, func, args = self._worker_queue.get()
+            if not fut.set_running_or_notify_cancel():
+                continue
+
+            with self._lock:
+                self._blocking = name
+            try:
+                fut.set_result(self._call(name, func, args))
+            except BaseException as e:
+                fut.set_exception(e)
+            finally:
+                with self._lock:
+                    self._blocking = None
+                    self._blocking_done.notify_all()
+
+    def _call_blocking(self, name, func, args):
+        if threading.current_thread() is self._worker:
+            return self._call(name, func, args)
+
+        fut = self._submit_blocking(name, func, args, None)
+        with self._lock:
+            # Waiting on the condition releases the driver lock.
+            if not self._blocking_done.wait_for(fut.done, fut.remaining()):
+                self.log_error('{} did not finish in {} seconds', name, self.BLOCKING_TIMEOUT)
+                abort = self.BLOCKING_ABORT.get(name)
+                if abort:
+                    getattr(self.lib, abort)()
+                raise LantzForeignTimeoutError('{} did not finish in {} seconds'.format(name, self.BLOCKING_TIMEOUT))
+        return fut.result()
+
+    def _wait_blocking(self, name):
+        self.log_debug('{} waits for {} to finish', name, self._blocking)
+        if not self._blocking_done.wait_for(lambda: self._blocking is None, self.BLOCKING_TIMEOUT):
+            raise LantzForeignTimeoutError('Cannot call {} while {} is running'.format(name, self._blocking))
+
+    def _call(self, name, func, args):
         new_args, collect = self._preprocess_args(name, *args)
 
         try:
@@ -232,10 +515,9 @@ class LibraryDriver(Driver):
 
     def _postprocess(self, name, ret, collect):
         if collect:
-            values = [item.value for item in collect]
-            values.insert(0, ret)
+            values = (ret, ) + tuple([item.value for item in collect])
             self.log_debug('Function call {} returned {}. Collected: {}', name, ret, collect)
-            return tuple(values)
+            return values
 
         self.log_debug('Function call {} returned {}.', name, ret)
         return ret
@@ -243,7 +525,7 @@ class LibraryDriver(Driver):
 
 def iter_lib(library_name, folder=''):
     if not library_name:
-        raise StopIteration
+        return
     if isinstance(library_name, str):
         if folder:
             yield os.path.join(folder, library_name)
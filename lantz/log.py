@@ -9,23 +9,31 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import os
+import copy
+import glob
+import zlib
+import queue
 import pickle
 
-import select
+import time
 import socket
 import struct
 import logging
+import selectors
 import threading
 
 from logging import DEBUG, INFO, WARNING, ERROR, CRITICAL
 from logging.handlers import SocketHandler, DEFAULT_TCP_LOGGING_PORT, DEFAULT_UDP_LOGGING_PORT
 
-from socketserver import (ThreadingUDPServer, DatagramRequestHandler,
-                          ThreadingTCPServer, StreamRequestHandler)
-
 
 from stringparser import Parser
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class _LogRecord(logging.LogRecord):
 
     def getMessage(self):
@@ -72,6 +80,865 @@ def get_logger(name, add_NullHandler=True, patch_makeRecord=True):
 LOGGER = get_logger('lantz')
 
 
+class TruncatedPayload(object):
+    """Lazy representation of a (possibly large) I/O payload for logging.
+
+    Nothing is computed until the record is actually formatted by a handler.
+    Payloads longer than `limit` are shown as a prefix followed by the total
+    length and the crc32 checksum of the complete payload.
+
+        >>> '{!r}'.format(TruncatedPayload(b'spam', 10))
+        "b'spam'"
+        >>> '{!r}'.format(TruncatedPayload(b'spam and eggs', 4))
+        "b'spam'... (len=13, crc32=2c0e6100)"
+
+    :param payload: bytes or str sent to or received from the instrument.
+    :param limit: maximum number of elements of the payload to show.
+    """
+
+    __slots__ = ('payload', 'limit')
+
+    def __init__(self, payload, limit=64):
+        self.payload = payload
+        self.limit = limit
+
+    def __repr__(self):
+        payload = self.payload
+        if self.limit is None or len(payload) <= self.limit:
+            return repr(payload)
+
+        if isinstance(payload, str):
+            checksum = zlib.crc32(payload.encode('utf-8', 'surrogateescape'))
+        else:
+            checksum = zlib.crc32(payload)
+        return '{!r}... (len={}, crc32={:08x})'.format(payload[:self.limit], len(payload), checksum)
+
+    __str__ = __repr__
+
+    def __format__(self, format_spec):
+        return format(repr(self), format_spec)
+
+
+class LogRateLimiter(object):
+    """Limit the number of log records per message key (usually the
+    unformatted message) with 1-in-N sampling and/or a token bucket.
+
+    The number of suppressed records for each key is accumulated and
+    returned by summaries at most once every summary_interval seconds.
+    If emit is given, the pending summaries are also passed to it when
+    summary_interval expires without further records, and on flush.
+
+    :param rate: maximum sustained number of records per second per key (None means no limit).
+    :param burst: maximum number of records logged in a burst.
+    :param sample: only one of every `sample` records is considered.
+    :param summary_interval: minimum time in seconds between summaries.
+    :param emit: callable(key, number of suppressed records), called from a timer thread.
+    """
+
+    def __init__(self, rate=None, burst=10, sample=1, summary_interval=10., emit=None):
+        self.default = (rate, burst, sample)
+        self.summary_interval = summary_interval
+        self.emit = emit
+
+        #: key: (rate, burst, sample)
+        self.limits = {}
+
+        #: key: [tokens, last time, sample count, suppressed]
+        self._state = {}
+        self._lock = threading.Lock()
+        self._now = self._last_summary = time.monotonic()
+        self._suppressed = False
+        self._timer = None
+
+    def set_limit(self, key, rate=None, burst=10, sample=1):
+        """Set the limits for a given key (None means the default for all keys).
+        """
+        with self._lock:
+            if key is None:
+                self.default = (rate, burst, sample)
+            else:
+                self.limits[key] = (rate, burst, sample)
+            self._state.clear()
+
+    def allow(self, key):
+        """Return True if a record with the given key should be logged.
+        """
+        rate, burst, sample = self.limits.get(key, self.default)
+        with self._lock:
+            self._now = now = time.monotonic()
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = [burst, now, 0, 0]
+
+            if sample > 1:
+                state[2] += 1
+                if state[2] % sample != 1:
+                    self._suppress(state)
+                    return False
+
+            if rate is not None:
+                tokens = min(burst, state[0] + (now - state[1]) * rate)
+                state[1] = now
+                if tokens < 1:
+                    state[0] = tokens
+                    self._suppress(state)
+                    return False
+                state[0] = tokens - 1
+
+            return True
+
+    def summaries(self):
+        """Return a list of (key, number of suppressed records) if there are
+        suppressed records and summary_interval has elapsed since the last call.
+        """
+        if not self._suppressed or self._now - self._last_summary < self.summary_interval:
+            return ()
+
+        with self._lock:
+            return self._take()
+
+    def flush(self):
+        """Pass the pending summaries to emit (if given) regardless
+        of summary_interval, and return them.
+        """
+        with self._lock:
+            self._now = time.monotonic()
+            out = self._take()
+        if self.emit is not None:
+            for key, suppressed in out:
+                self.emit(key, suppressed)
+        return out
+
+    def _suppress(self, state):
+        state[3] += 1
+        self._suppressed = True
+        if self.emit is not None and self._timer is None:
+            delay = max(self._last_summary + self.summary_interval - self._now, 0.)
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _take(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_summary = self._now
+        self._suppressed = False
+        out = []
+        for key, state in self._state.items():
+            if state[3]:
+                out.append((key, state[3]))
+                state[3] = 0
+        return out
+
+
+#: Batches of records are framed as a 4-byte length followed by the header,
+#: the string table (number of strings, their lengths and utf-8 contents)
+#: and one fixed size row per record referring to strings by index.
+_BATCH_MAGIC = b'LZ'
+_BATCH_VERSION = 1
+_BATCH_HEADER = struct.Struct('>2sBII')
+_RECORD_ROW = struct.Struct('>dBII11H')
+_NO_STRING = 0xFFFF
+
+#: Attributes of records received from other processes.
+_RECORD_DEFAULTS = dict(_LogRecord(None, None, "", 0, "", (), None, None).__dict__,
+                        thread=None, threadName=None, process=None, processName=None)
+
+#: Maximum number of records in a batch (each record uses up to 11 strings).
+MAX_BATCH_SIZE = _NO_STRING // 11
+
+
+def pack_records(records, dropped=0):
+    """Encode a batch of log records in a compact binary format.
+
+    Only the information used by Lantz log viewers is kept. The message is
+    merged with its arguments and repeated strings (logger, driver and feat
+    names) are stored once per batch.
+
+    :param records: sequence of LogRecord (at most MAX_BATCH_SIZE).
+    :param dropped: number of records dropped by the sender since the last batch.
+    :return: bytes, including the length prefix.
+    """
+    if len(records) > MAX_BATCH_SIZE:
+        raise ValueError('Cannot pack more than {} records in a batch'.format(MAX_BATCH_SIZE))
+
+    strings = {}
+
+    def index(value):
+        if value is None:
+            return _NO_STRING
+        try:
+            return strings[value]
+        except KeyError:
+            ndx = strings[value] = len(strings)
+            return ndx
+
+    rows = []
+    for record in records:
+        try:
+            msg = record.getMessage()
+        except Exception:
+            msg = '{!r} {!r}'.format(record.msg, record.args)
+
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+
+        feat_name, feat_value = getattr(record, 'lantz_feat', (None, None))
+
+        rows.append(_RECORD_ROW.pack(record.created, record.levelno, record.lineno or 0, record.process or 0,
+                                     index(record.name), index(msg), index(record.pathname),
+                                     index(record.funcName), index(record.threadName),
+                                     index(record.processName), index(exc_text),
+                                     index(getattr(record, 'lantz_driver', None)),
+                                     index(getattr(record, 'lantz_name', None)),
+                                     index(feat_name), index(feat_value)))
+
+    encoded = [value.encode('utf-8', 'surrogateescape') for value in strings]
+    body = b''.join((_BATCH_HEADER.pack(_BATCH_MAGIC, _BATCH_VERSION, len(rows), dropped),
+                     struct.pack('>I{}I'.format(len(encoded)), len(encoded), *map(len, encoded)),
+                     b''.join(encoded),
+                     b''.join(rows)))
+
+    return struct.pack('>L', len(body)) + body
+
+
+def is_packed(payload):
+    """Return True if the payload (without the length prefix) was encoded by pack_records.
+    """
+    return payload[:2] == _BATCH_MAGIC
+
+
+def unpack_records(payload):
+    """Decode a batch of records encoded by pack_records.
+
+    If the sender dropped records, a warning record is prepended.
+
+    :param payload: bytes-like object without the length prefix.
+    :return: list of LogRecord.
+    """
+    magic, version, count, dropped = _BATCH_HEADER.unpack_from(payload)
+    if magic != _BATCH_MAGIC or version != _BATCH_VERSION:
+        raise ValueError('Unknown log batch format')
+
+    offset = _BATCH_HEADER.size
+    nstrings, = struct.unpack_from('>I', payload, offset)
+    offset += 4
+    lengths = struct.unpack_from('>{}I'.format(nstrings), payload, offset)
+    offset += 4 * nstrings
+
+    strings = []
+    for length in lengths:
+        strings.append(bytes(payload[offset:offset + length]).decode('utf-8', 'surrogateescape'))
+        offset += length
+
+    records = []
+    if dropped:
+        record = _LogRecord('lantz.log', WARNING, '', 0, 'The sender dropped {} log records',
+                            (dropped, ), None)
+        records.append(record)
+
+    # LogRecord.__init__ inspects the current thread and process, which is
+    # useless here. Records are created from default attributes instead.
+    new = _LogRecord.__new__
+    files = {}
+    rows = memoryview(payload)[offset:offset + count * _RECORD_ROW.size]
+    for created, levelno, lineno, process, *indices in _RECORD_ROW.iter_unpack(rows):
+        (name, msg, pathname, func, thread_name, process_name, exc_text,
+         driver, driver_name, feat_name, feat_value) = [None if ndx == _NO_STRING else strings[ndx]
+                                                        for ndx in indices]
+
+        try:
+            filename, module = files[pathname]
+        except KeyError:
+            filename, module = files[pathname] = _file_info(pathname)
+
+        record = new(_LogRecord)
+        attrs = record.__dict__
+        attrs.update(_RECORD_DEFAULTS)
+        attrs.update(name=name, msg=msg, levelno=levelno, levelname=logging.getLevelName(levelno),
+                     pathname=pathname or '', filename=filename, module=module,
+                     lineno=lineno, funcName=func, created=created,
+                     msecs=(created - int(created)) * 1000,
+                     relativeCreated=(created - logging._startTime) * 1000,
+                     process=process, threadName=thread_name, processName=process_name,
+                     exc_text=exc_text)
+        if driver is not None:
+            attrs['lantz_driver'] = driver
+        if driver_name is not None:
+            attrs['lantz_name'] = driver_name
+        if feat_name is not None:
+            attrs['lantz_feat'] = (feat_name, feat_value)
+        records.append(record)
+
+    return records
+
+
+def _file_info(pathname):
+    """Return the filename and module LogRecord derives from a pathname.
+    """
+    try:
+        filename = os.path.basename(pathname)
+        return filename, os.path.splitext(filename)[0]
+    except (TypeError, ValueError, AttributeError):
+        return pathname, "Unknown module"
+
+
+def _records_from_payload(payload):
+    """Decode the records in a frame, either a batch encoded by
+    pack_records or a single pickled record (logging.handlers.SocketHandler).
+    """
+    if is_packed(payload):
+        return unpack_records(payload)
+
+    record = _LogRecord.__new__(_LogRecord)
+    record.__dict__.update(_RECORD_DEFAULTS)
+    record.__dict__.update(pickle.loads(payload))
+    return [record]
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class QueuedSocketHandler(logging.Handler):
+    """Send log records to a TCP socket without blocking the logging thread.
+
+    Records are put in a bounded queue and shipped in batches (see pack_records)
+    by a background thread. When the queue is full, or the connection fails,
+    records are dropped and the number of dropped records is reported to the
+    receiver with the next batch.
+
+    :param host: socket host.
+    :param port: socket port.
+    :param capacity: maximum number of records waiting to be sent.
+    :param batch_size: maximum number of records per send.
+    :param timeout: socket timeout in seconds.
+    """
+
+    #: Seconds to wait before reconnecting after a failure (doubles up to RETRY_MAX).
+    RETRY_START = 1.0
+    RETRY_MAX = 30.0
+
+    def __init__(self, host, port, capacity=10000, batch_size=256, timeout=1.0):
+        super().__init__()
+        self.address = (host, port)
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.timeout = timeout
+
+        #: Total number of records that could not be sent.
+        self.dropped = 0
+        self._unreported = 0
+        self._dropped_lock = threading.Lock()
+
+        self.sock = None
+        self._retry_time = None
+        self._retry_delay = self.RETRY_START
+
+        self.queue = queue.Queue(capacity)
+        self._thread = threading.Thread(target=self._serve, name='lantz-log-sender')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _drop(self, count):
+        with self._dropped_lock:
+            self.dropped += count
+            self._unreported += count
+
+    def prepare(self, record):
+        """Return a copy of the record with the message merged with its arguments
+        and the exception formatted, as the arguments may change (or be reused
+        buffers) by the time the sender thread packs the record.
+        """
+        try:
+            msg = record.getMessage()
+        except Exception:
+            msg = '{!r} {!r}'.format(record.msg, record.args)
+
+        record = copy.copy(record)
+        record.msg = msg
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self._drop(1)
+
+    def _connect(self):
+        now = time.time()
+        if self._retry_time is not None and now < self._retry_time:
+            return False
+        try:
+            self.sock = socket.create_connection(self.address, self.timeout)
+        except OSError:
+            self._retry_time = now + self._retry_delay
+            self._retry_delay = min(2 * self._retry_delay, self.RETRY_MAX)
+            return False
+        self._retry_time = None
+        self._retry_delay = self.RETRY_START
+        return True
+
+    def _send(self, batch):
+        if self.sock is None and not self._connect():
+            self._drop(len(batch))
+            return
+
+        with self._dropped_lock:
+            dropped, self._unreported = self._unreported, 0
+
+        try:
+            self.sock.sendall(pack_records(batch, dropped))
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            self._drop(len(batch) + dropped)
+        except Exception:
+            self._drop(len(batch) + dropped)
+
+    def _serve(self):
+        get, get_nowait = self.queue.get, self.queue.get_nowait
+        stop = False
+        while not stop:
+            batch = [get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(get_nowait())
+                except queue.Empty:
+                    break
+            taken = len(batch)
+            if None in batch:
+                batch = [record for record in batch if record is not None]
+                stop = True
+            if batch:
+                self._send(batch)
+            for _ in range(taken):
+                self.queue.task_done()
+
+    def flush(self, timeout=None):
+        """Wait until the records in the queue have been sent (or dropped).
+
+        :param timeout: maximum time to wait in seconds (default 10 socket timeouts).
+        """
+        end = time.time() + (10 * self.timeout if timeout is None else timeout)
+        while self.queue.unfinished_tasks and self._thread.is_alive() and time.time() < end:
+            time.sleep(.01)
+
+    def close(self):
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(10 * self.timeout)
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        super().close()
+
+
+#: Feat log files start with this header, followed by entries starting with
+#: one byte: b'S' defines the next string (used for feat names and units),
+#: b'N' stores a numeric value and b'T' a text value.
+_FEAT_FILE_HEADER = b'LZFEATS1'
+_FEAT_STRING = struct.Struct('>cI')
+_FEAT_NUMBER = struct.Struct('>cdIId')
+_FEAT_TEXT = struct.Struct('>cdII')
+_FEAT_NUMBER_OFFSET = 1 + 8 + 4 + 4
+
+
+def _parse_feat_value(value):
+    """Split the string representation of a feat value in magnitude and units.
+
+    :return: (float, units or None) or (None, None) if the value is not numeric.
+    """
+    try:
+        return float(value), None
+    except ValueError:
+        pass
+    magnitude, _, units = value.partition(' ')
+    try:
+        return float(magnitude), units
+    except ValueError:
+        return None, None
+
+
+def _feat_segments(path):
+    """Return the sorted list of file names of a feat log.
+    """
+    return sorted(glob.glob(glob.escape(path) + '.[0-9][0-9][0-9][0-9][0-9]' + FeatFileHandler.SUFFIX))
+
+
+class FeatFileHandler(logging.Handler):
+    """Write the feat values found in Lantz log records (lantz_feat) to
+    compact append-only binary files. Other records are ignored.
+
+    Files are named path.00000.lzf, path.00001.lzf, ... A new file is started
+    when the current one reaches max_bytes. Use FeatLogReader to query them.
+
+    :param path: path prefix of the files.
+    :param max_bytes: maximum size of each file.
+    :param max_files: number of files to keep (default None, meaning all).
+    :param flush_interval: maximum time in seconds a value stays in memory
+                           (the file is flushed by a timer thread).
+    """
+
+    SUFFIX = '.lzf'
+
+    def __init__(self, path, max_bytes=64 * 2 ** 20, max_files=None, flush_interval=1.):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self._timer = None
+
+        segments = _feat_segments(path)
+        if segments:
+            number = int(segments[-1][-len(self.SUFFIX) - 5:-len(self.SUFFIX)]) + 1
+        else:
+            number = 0
+        self.stream = None
+        self._open(number)
+
+    def _open(self, number):
+        self.number = number
+        self.filename = '{}.{:05d}{}'.format(self.path, number, self.SUFFIX)
+        self.stream = open(self.filename, 'wb')
+        self.stream.write(_FEAT_FILE_HEADER)
+        self.size = len(_FEAT_FILE_HEADER)
+        self._strings = {}
+
+        if self.max_files:
+            for filename in _feat_segments(self.path)[:-self.max_files]:
+                for name in (filename, filename + FeatLogReader.INDEX_SUFFIX):
+                    if os.path.exists(name):
+                        os.remove(name)
+
+    def _string(self, value):
+        try:
+            return self._strings[value]
+        except KeyError:
+            encoded = value.encode('utf-8', 'surrogateescape')
+            self.stream.write(_FEAT_STRING.pack(b'S', len(encoded)) + encoded)
+            self.size += _FEAT_STRING.size + len(encoded)
+            ndx = self._strings[value] = len(self._strings)
+            return ndx
+
+    def emit(self, record):
+        feat = getattr(record, 'lantz_feat', None)
+        if feat is None:
+            return
+
+        try:
+            name, value = feat
+            driver_name = getattr(record, 'lantz_name', None)
+            key = self._string(driver_name + '.' + name if driver_name else name)
+
+            magnitude, units = _parse_feat_value(value)
+            if magnitude is None:
+                encoded = value.encode('utf-8', 'surrogateescape')
+                entry = _FEAT_TEXT.pack(b'T', record.created, key, len(encoded)) + encoded
+            else:
+                units = _NO_FEAT_STRING if units is None else self._string(units)
+                entry = _FEAT_NUMBER.pack(b'N', record.created, key, units, magnitude)
+            self.stream.write(entry)
+            self.size += len(entry)
+
+            if self.size >= self.max_bytes:
+                self.rotate()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        except Exception:
+            self.handleError(record)
+
+    def rotate(self):
+        """Close the current file and start a new one.
+        """
+        self.acquire()
+        try:
+            self.stream.close()
+            self._open(self.number + 1)
+        finally:
+            self.release()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._cancel_timer()
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            self._cancel_timer()
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+        super().close()
+
+
+_NO_FEAT_STRING = 0xFFFFFFFF
+
+
+class _FeatSegment(object):
+    """Index of a feat log file.
+
+    For each value in the file, the index stores the time, the key (as a
+    string id), the kind of value and its offset in the file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.index_filename = filename + FeatLogReader.INDEX_SUFFIX
+        self._reset()
+        if os.path.exists(self.index_filename):
+            try:
+                self._load()
+            except Exception:
+                self._reset()
+        self.update()
+
+    def _reset(self):
+        self.size = len(_FEAT_FILE_HEADER)
+        self.strings = []
+        self.times = np.zeros(0, np.float64)
+        self.keys = np.zeros(0, np.uint32)
+        self.kinds = np.zeros(0, np.uint8)
+        self.offsets = np.zeros(0, np.int64)
+        self.units = np.zeros(0, np.uint32)
+
+    def _load(self):
+        with np.load(self.index_filename) as data:
+            self.size = int(data['size'])
+            self.strings = [str(value) for value in data['strings']]
+            for attr in ('times', 'keys', 'kinds', 'offsets', 'units'):
+                setattr(self, attr, data[attr])
+
+    def _save(self):
+        with open(self.index_filename, 'wb') as fp:
+            np.savez(fp, size=self.size, strings=np.array(self.strings, dtype=str),
+                     times=self.times, keys=self.keys, kinds=self.kinds,
+                     offsets=self.offsets, units=self.units)
+
+    def update(self):
+        """Index the entries appended to the file since the last update.
+        """
+        with open(self.filename, 'rb') as fp:
+            if fp.read(len(_FEAT_FILE_HEADER)) != _FEAT_FILE_HEADER:
+                raise ValueError('{} is not a feat log file'.format(self.filename))
+            if os.fstat(fp.fileno()).st_size < self.size:
+                # The index belongs to another file.
+                self._reset()
+            fp.seek(self.size)
+            data = fp.read()
+
+        if not data:
+            return
+
+        times, keys, kinds, offsets, units = [], [], [], [], []
+        strings = self.strings
+        pos, end = 0, len(data)
+        while pos < end:
+            kind = data[pos:pos + 1]
+            if kind == b'N':
+                if pos + _FEAT_NUMBER.size > end:
+                    break
+                _, created, key, unit, _ = _FEAT_NUMBER.unpack_from(data, pos)
+                size = _FEAT_NUMBER.size
+            elif kind == b'T':
+                if pos + _FEAT_TEXT.size > end:
+                    break
+                _, created, key, length = _FEAT_TEXT.unpack_from(data, pos)
+                unit = _NO_FEAT_STRING
+                size = _FEAT_TEXT.size + length
+            elif kind == b'S':
+                if pos + _FEAT_STRING.size > end:
+                    break
+                _, length = _FEAT_STRING.unpack_from(data, pos)
+                size = _FEAT_STRING.size + length
+                if pos + size > end:
+                    break
+                strings.append(data[pos + _FEAT_STRING.size:pos + size].decode('utf-8', 'surrogateescape'))
+                pos += size
+                continue
+            else:
+                raise ValueError('Corrupted feat log file {} at {}'.format(self.filename, self.size + pos))
+
+            if pos + size > end:
+                # Incomplete entry, being written.
+                break
+            times.append(created)
+            keys.append(key)
+            kinds.append(kind == b'N')
+            offsets.append(self.size + pos)
+            units.append(unit)
+            pos += size
+
+        self.size += pos
+        self.times = np.concatenate((self.times, np.array(times, np.float64)))
+        self.keys = np.concatenate((self.keys, np.array(keys, np.uint32)))
+        self.kinds = np.concatenate((self.kinds, np.array(kinds, np.uint8)))
+        self.offsets = np.concatenate((self.offsets, np.array(offsets, np.int64)))
+        self.units = np.concatenate((self.units, np.array(units, np.uint32)))
+        self._save()
+
+    def key_names(self):
+        return {self.strings[key] for key in np.unique(self.keys)}
+
+    def select(self, key, start=None, stop=None):
+        """Return the positions in the index of the values of a key
+        with start <= time < stop.
+        """
+        try:
+            key = self.strings.index(key)
+        except ValueError:
+            return np.zeros(0, np.intp)
+        mask = self.keys == key
+        if start is not None:
+            mask &= self.times >= start
+        if stop is not None:
+            mask &= self.times < stop
+        return np.flatnonzero(mask)
+
+    def read(self, positions):
+        """Return the times and the values at the given positions of the index.
+        """
+        times = self.times[positions]
+        kinds = self.kinds[positions]
+        offsets = self.offsets[positions]
+
+        raw = np.memmap(self.filename, np.uint8, 'r', shape=(self.size, ))
+
+        if kinds.all():
+            ndx = offsets[:, None] + np.arange(_FEAT_NUMBER_OFFSET, _FEAT_NUMBER_OFFSET + 8)
+            values = raw[ndx].copy().view('>f8').ravel().astype(np.float64)
+        else:
+            values = np.empty(len(positions), dtype=object)
+            for ndx, (kind, offset) in enumerate(zip(kinds, offsets)):
+                if kind:
+                    values[ndx] = _FEAT_NUMBER.unpack_from(raw, offset)[-1]
+                else:
+                    length = _FEAT_TEXT.unpack_from(raw, offset)[-1]
+                    begin = offset + _FEAT_TEXT.size
+                    values[ndx] = raw[begin:begin + length].tobytes().decode('utf-8', 'surrogateescape')
+
+        return times, values
+
+
+class FeatLogReader(object):
+    """Query the feat values written by FeatFileHandler (see log_to_file).
+
+    Each file is indexed once by time and feat name. The index is stored
+    next to the file and updated incrementally, so queries read only the
+    requested values.
+
+        >>> reader = FeatLogReader('overnight')
+        >>> times, values = reader.query('laser.power', start, stop)
+        >>> reader.value_at('laser.power', when)
+
+    Keys are the driver name and the feat name joined by a dot.
+
+    :param path: path prefix given to log_to_file.
+    """
+
+    INDEX_SUFFIX = '.idx'
+
+    def __init__(self, path):
+        if np is None:
+            raise ImportError('FeatLogReader requires NumPy')
+        self.path = path
+        self.segments = []
+        self.refresh()
+
+    def refresh(self):
+        """Index the values written since the reader was created or refreshed.
+        """
+        known = {segment.filename: segment for segment in self.segments}
+        segments = []
+        for filename in _feat_segments(self.path):
+            segment = known.get(filename)
+            if segment is None:
+                segment = _FeatSegment(filename)
+            else:
+                segment.update()
+            segments.append(segment)
+        self.segments = segments
+
+    def keys(self):
+        """Return the sorted list of keys in the log.
+        """
+        keys = set()
+        for segment in self.segments:
+            keys.update(segment.key_names())
+        return sorted(keys)
+
+    def units(self, key):
+        """Return the last units in which a key was logged (None if dimensionless or unknown).
+        """
+        for segment in reversed(self.segments):
+            positions = segment.select(key)
+            for position in positions[::-1]:
+                if segment.kinds[position]:
+                    unit = segment.units[position]
+                    return None if unit == _NO_FEAT_STRING else segment.strings[unit]
+        return None
+
+    def query(self, key, start=None, stop=None):
+        """Return the values of a key logged within a time range.
+
+        :param key: driver name and feat name joined by a dot.
+        :param start: first time (as given by time.time()), None means from the beginning.
+        :param stop: end time (excluded), None means until the end.
+        :return: (times, values). The values are a float array if all are numeric
+                 (magnitudes, see units) or an object array otherwise.
+        """
+        times, values = [], []
+        for segment in self.segments:
+            if not len(segment.times):
+                continue
+            if start is not None and segment.times.max() < start:
+                continue
+            if stop is not None and segment.times.min() >= stop:
+                continue
+            positions = segment.select(key, start, stop)
+            if len(positions):
+                segment_times, segment_values = segment.read(positions)
+                times.append(segment_times)
+                values.append(segment_values)
+
+        if not times:
+            return np.zeros(0, np.float64), np.zeros(0, np.float64)
+
+        values = np.concatenate(values) if len({value.dtype for value in values}) == 1 \
+            else np.concatenate([value.astype(object) for value in values])
+        return np.concatenate(times), values
+
+    def value_at(self, key, when):
+        """Return the last value of a key logged at or before a given time.
+
+        :raises KeyError: if no value was logged before.
+        """
+        for segment in reversed(self.segments):
+            positions = segment.select(key, stop=np.nextafter(when, np.inf))
+            if len(positions):
+                return segment.read(positions[-1:])[1][0]
+        raise KeyError('No value for {} before {}'.format(key, when))
+
+
 class ColorizingFormatter(logging.Formatter):
     """Color capable logging formatter.
 
@@ -166,8 +1033,63 @@ def init_colorama():
 colorama, DEFAULT_FMT = init_colorama()
 
 
+class _FrameReader(object):
+    """Reassemble length prefixed frames received from a stream socket
+    into a reusable buffer.
+
+    Call fill to receive data and then iterate over frames to get the
+    complete payloads as memoryviews, which are valid until the next fill.
+    """
+
+    def __init__(self, size=1 << 18):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = self.end = 0
+
+    def _reserve(self, needed):
+        pending = self.end - self.start
+        if needed > len(self.buffer):
+            buffer = bytearray(max(needed, 2 * len(self.buffer)))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer, self.view = buffer, memoryview(buffer)
+        else:
+            self.buffer[:pending] = self.view[self.start:self.end]
+        self.start, self.end = 0, pending
+
+    def fill(self, sock):
+        """Receive available data from the socket.
+
+        :return: number of bytes received (0 if the connection was closed).
+        """
+        if self.end == len(self.buffer):
+            self._reserve(self.end - self.start + 1)
+        nbytes = sock.recv_into(self.view[self.end:])
+        self.end += nbytes
+        return nbytes
+
+    def frames(self):
+        """Yield the payloads of the complete frames in the buffer.
+        """
+        while self.end - self.start >= 4:
+            slen, = struct.unpack_from('>L', self.buffer, self.start)
+            begin = self.start + 4
+            if self.end - begin < slen:
+                if begin + slen > len(self.buffer):
+                    self._reserve(4 + slen)
+                break
+            self.start = begin + slen
+            yield self.view[begin:self.start]
+
+        if self.start == self.end:
+            self.start = self.end = 0
+
+
 class BaseServer(object):
-    """Mixin for common server functionality
+    """Mixin for common server functionality.
+
+    All sockets are served from the thread calling serve_until_stopped
+    using a selector. The data of each registered key is called with the
+    socket when it becomes readable.
     """
 
     allow_reuse_address = True
@@ -176,95 +1098,123 @@ class BaseServer(object):
         self._record_handler = handler
         self._stop = threading.Event()
         self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
 
     def handle_record(self, record):
         self._record_handler(record)
 
+    def handle_payload(self, payload):
+        for record in _records_from_payload(payload):
+            self._record_handler(record)
+
     def serve_until_stopped(self):
-        while not self._stop.isSet():
-            rd, wr, ex = self.select()
-            if rd:
-                self.handle_request()
+        while not self._stop.is_set():
+            for key, events in self.selector.select(self.timeout):
+                key.data(key.fileobj)
         self.server_close()
 
-    def select(self):
-        return select.select([self.socket.fileno()], [], [], self.timeout)
+    def server_close(self):
+        for key in list(self.selector.get_map().values()):
+            self.selector.unregister(key.fileobj)
+            key.fileobj.close()
+        self.selector.close()
 
     def stop(self):
         self._stop.set()
 
 
-class LogRecordStreamHandler(StreamRequestHandler):
-    """ Handler for a streaming logging request. It basically logs the record
-    using whatever logging policy is configured locally.
-    """
+class LoggingTCPServer(BaseServer):
+    """A TCP socket-based logging receiver.
 
-    def handle(self):
-        """Handle multiple requests - each expected to be a 4-byte length,
-        followed by the LogRecord in pickle format. Logs the record
-        according to whatever policy is configured locally.
-        """
-        while True:
-            try:
-                chunk = self.connection.recv(4)
-                if len(chunk) < 4:
-                    break
-                slen = struct.unpack(">L", chunk)[0]
-                chunk = self.connection.recv(slen)
-                while len(chunk) < slen:
-                    chunk = chunk + self.connection.recv(slen - len(chunk))
-                obj = pickle.loads(chunk)
-                record = _LogRecord(None, None, "", 0, "", (), None, None)
-                record.__dict__.update(obj)
-                self.server.handle_record(record)
-            except socket.error as e:
-                if not isinstance(e.args, tuple):
-                    raise e
-                else:
-                    if e.args[0] != logging.RESET_ERROR:
-                        raise e
-                    break
-
-
-class LoggingTCPServer(ThreadingTCPServer, BaseServer):
-    """A simple-minded TCP socket-based logging receiver suitable for test
-    purposes.
+    Connections are served by a selector in a single thread, each receiving
+    into its own reusable buffer.
     """
 
     allow_reuse_address = True
 
+    request_queue_size = 16
+
     def __init__(self, addr, handler, timeout=1):
-        ThreadingTCPServer.__init__(self, addr, LogRecordStreamHandler)
         BaseServer.__init__(self, handler, timeout)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-
-class LogRecordDatagramHandler(DatagramRequestHandler):
-    """Handler for a datagram logging request. It basically logs the record
-    using whatever logging policy is configured locally.
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.allow_reuse_address:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(addr)
+        self.socket.listen(self.request_queue_size)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+        self._readers = {}
+        self.selector.register(self.socket, selectors.EVENT_READ, self._accept)
+
+    def _accept(self, sock):
+        try:
+            connection, address = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        connection.setblocking(False)
+        self._readers[connection] = _FrameReader()
+        self.selector.register(connection, selectors.EVENT_READ, self._read)
+
+    def _close(self, connection):
+        self.selector.unregister(connection)
+        del self._readers[connection]
+        connection.close()
+
+    def _read(self, connection):
+        reader = self._readers[connection]
+        try:
+            if not reader.fill(connection):
+                self._close(connection)
+                return
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(connection)
+            return
+
+        try:
+            for payload in reader.frames():
+                self.handle_payload(payload)
+        except Exception as e:
+            LOGGER.warning('Closing log connection, invalid data received: {}', e)
+            self._close(connection)
+
+
+class LoggingUDPServer(BaseServer):
+    """A UDP datagram-based logging receiver.
+
+    Datagrams are received into a reusable buffer by a selector in a single thread.
     """
-    def handle(self):
-        chunk = self.packet
-        slen = struct.unpack(">L", chunk[:4])[0]
-        chunk = chunk[4:]
-        assert len(chunk) == slen
-        obj = pickle.loads(chunk)
-        record = _LogRecord(None, None, "", 0, "", (), None, None)
-        record.__dict__.update(obj)
-        self.server.handle_record(record)
-
-    def finish(self):
-        pass
 
-
-class LoggingUDPServer(ThreadingUDPServer, BaseServer):
-    """A simple-minded UDP datagram-based logging receiver suitable for test
-    purposes.
-    """
+    max_packet_size = 65536
 
     def __init__(self, addr, handler, timeout=1):
-        ThreadingUDPServer.__init__(self, addr, LogRecordDatagramHandler)
         BaseServer.__init__(self, handler, timeout)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.allow_reuse_address:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(addr)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+        self._buffer = bytearray(self.max_packet_size)
+        self._view = memoryview(self._buffer)
+        self.selector.register(self.socket, selectors.EVENT_READ, self._read)
+
+    def _read(self, sock):
+        while True:
+            try:
+                nbytes = sock.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if nbytes < 4 or struct.unpack_from('>L', self._buffer)[0] != nbytes - 4:
+                LOGGER.warning('Invalid log datagram received')
+                continue
+            try:
+                self.handle_payload(self._view[4:nbytes])
+            except Exception as e:
+                LOGGER.warning('Invalid log datagram received: {}', e)
 
 
 class SocketListener(object):
@@ -302,16 +1252,25 @@ class SocketListener(object):
 
 
 def log_to_socket(level=logging.INFO, host='localhost',
-                  port=DEFAULT_TCP_LOGGING_PORT):
+                  port=DEFAULT_TCP_LOGGING_PORT, capacity=10000):
     """Log all Lantz events to a socket with a specific host address and port.
 
+    Records are sent in batches from a background thread (see QueuedSocketHandler)
+    so a slow or missing receiver does not block the instruments.
+
     :param level: logging level for the lantz handler
     :param host: socket host (default 'localhost')
     :param port: socket port (default DEFAULT_TCP_LOGGING_PORT as defined in the
                  logging module)
+    :param capacity: maximum number of records waiting to be sent. If None,
+                     records are pickled and sent one by one from the calling
+                     thread using logging.handlers.SocketHandler.
     :return: lantz logger
     """
-    handler = SocketHandler(host, port)
+    if capacity is None:
+        handler = SocketHandler(host, port)
+    else:
+        handler = QueuedSocketHandler(host, port, capacity)
     handler.setLevel(level)
     LOGGER.addHandler(handler)
     if LOGGER.getEffectiveLevel() > level:
@@ -337,6 +1296,25 @@ def log_to_screen(level=logging.INFO, scheme='blackbg'):
     return LOGGER
 
 
+def log_to_file(path, level=logging.INFO, max_bytes=64 * 2 ** 20, max_files=None):
+    """Log the values of all Lantz feats to compact binary files.
+
+    The files can be queried with FeatLogReader.
+
+    :param path: path prefix of the files (a number and .lzf are appended)
+    :param level: logging level for the lantz handler
+    :param max_bytes: maximum size of each file before starting a new one
+    :param max_files: number of files to keep (default None, meaning all)
+    :return: lantz logger
+    """
+    handler = FeatFileHandler(path, max_bytes, max_files)
+    handler.setLevel(level)
+    LOGGER.addHandler(handler)
+    if LOGGER.getEffectiveLevel() > level:
+        LOGGER.setLevel(level)
+    return LOGGER
+
+
 def get_address(value, default_port=DEFAULT_TCP_LOGGING_PORT):
     """Split host:port string into (host, port) tuple
 
@@ -372,7 +372,7 @@ class MessageBasedDriver(Driver):
         :return: number of bytes sent.
 
         """
-        self.log_debug('Writing {!r}', command)
+        self.log_io('Writing {!r}', command)
         return self.resource.write(command, termination, encoding)
 
     def read(self, termination=None, encoding=None):
@@ -384,5 +384,5 @@ class MessageBasedDriver(Driver):
         :return: string encoded from received bytes
         """
         ret =  self.resource.read(termination, encoding)
-        self.log_debug('Read {!r}', ret)
+        self.log_io('Read {!r}', ret)
         return ret
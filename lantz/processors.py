@@ -8,6 +8,14 @@
 """
 
 import warnings
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pint import DimensionalityError
 
 from . import Q_
 from .log import LOGGER as _LOG
@@ -22,6 +30,20 @@ def _do_nothing(value):
     return value
 
 
+def _is_array(value):
+    """Return True if value is a NumPy array.
+    """
+    return np is not None and isinstance(value, np.ndarray)
+
+
+def _to_float(value):
+    """Convert value to float, or to a float array if value is a NumPy array.
+    """
+    if _is_array(value):
+        return value.astype(float, copy=False)
+    return float(value)
+
+
 def _getitem(a, b):
     """Return a[b] or if not found a[type(b)]
     """
@@ -32,6 +54,58 @@ def _getitem(a, b):
 
 getitem = _getitem
 
+
+#: Cache of (factor, offset) tuples indexed by (source units, target units)
+#: such that target magnitude = factor * source magnitude + offset.
+#: None indicates that the conversion is not affine and pint must be used.
+_CONVERSION_FACTORS = {}
+
+#: Distance between the points used to compute the factor of offset units.
+_AFFINE_SPAN = 1e6
+
+
+def _affine_factors(source, target):
+    """Return (factor, offset) to convert magnitudes from source to target units
+    or None if the conversion is not affine (e.g. logarithmic units).
+
+    :raises: :class:`DimensionalityError` if the units are incompatible.
+    """
+    offset = Q_(0., source).to(target).magnitude
+    if offset:
+        # Taken from two distant points, so that the rounding error
+        # of the offset is negligible compared to the scale.
+        factor = (Q_(_AFFINE_SPAN, source).to(target).magnitude - offset) / _AFFINE_SPAN
+    else:
+        factor = Q_(1., source).to(target).magnitude
+    check = Q_(2., source).to(target).magnitude
+    if abs(check - (2. * factor + offset)) > 1e-12 * max(abs(check), 1.):
+        return None
+    return factor, offset
+
+
+def _convert_magnitude(value, units):
+    """Return the magnitude of the Quantity value expressed in units.
+
+    The conversion factors for each (source units, target units) pair are
+    computed once with pint and then applied with a multiplication.
+
+    :raises: :class:`DimensionalityError` if the units are incompatible.
+    """
+    key = (value.units, units)
+    try:
+        factors = _CONVERSION_FACTORS[key]
+    except KeyError:
+        factors = _CONVERSION_FACTORS[key] = _affine_factors(*key)
+
+    if factors is None:
+        return value.to(units).magnitude
+
+    factor, offset = factors
+    if offset:
+        return value.magnitude * factor + offset
+    return value.magnitude * factor
+
+
 def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                return_float=False):
     """Return a function that convert a Quantity to to another units.
@@ -66,12 +140,14 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
         raise ValueError("{} is not a valid value for 'units'. "
                          "It should be either str or Quantity")
 
+    target = units.units
+
     if return_float:
         def _inner(value):
             if isinstance(value, Q_):
                 try:
-                    return value.to(units).magnitude
-                except ValueError as e:
+                    return _convert_magnitude(value, target)
+                except (ValueError, DimensionalityError) as e:
                     if on_incompatible == 'raise':
                         raise ValueError(e)
                     elif on_incompatible == 'warn':
@@ -91,14 +167,14 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                         _LOG.warn(msg)
 
                 # on_incompatible == 'ignore'
-                return float(value)
+                return _to_float(value)
         return _inner
     else:
         def _inner(value):
             if isinstance(value, Q_):
                 try:
-                    return value.to(units)
-                except ValueError as e:
+                    return Q_(_convert_magnitude(value, target), target)
+                except (ValueError, DimensionalityError) as e:
                     if on_incompatible == 'raise':
                         raise ValueError(e)
                     elif on_incompatible == 'warn':
@@ -107,7 +183,7 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                         _LOG.warn(msg)
 
                 # on_incompatible == 'ignore'
-                return float(value.magnitude) * units
+                return _to_float(value.magnitude) * units
             else:
                 if not units.dimensionless:
                     if on_dimensionless == 'raise':
@@ -118,7 +194,7 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                         _LOG.warn(msg)
 
                 # on_incompatible == 'ignore'
-                return float(value) * units
+                return _to_float(value) * units
         return _inner
 
 
@@ -272,6 +348,20 @@ class MapProcessor(Processor):
                         'not {}'.format(obj))
 
 
+@functools.lru_cache(maxsize=256)
+def _reversed_mapping(items):
+    """Return a dictionary mapping values to keys.
+
+    Shared and bounded cache of reversed dictionaries indexed by the content
+    of the original one, so equal mappings built by different instances are
+    reversed only once. The types are part of the content because equal keys
+    of different types (e.g. True and 1) must not share an entry.
+
+    :param items: tuple of (key, type of key, value, type of value).
+    """
+    return {value: key for key, _, value, _ in items}
+
+
 class ReverseMapProcessor(Processor):
     """Processor to map the function parameter values.
 
@@ -285,16 +375,11 @@ class ReverseMapProcessor(Processor):
         True
     """
 
-    #: Shared cache of reversed dictionaries indexed by the id()
-    __reversed_cache = {}
-
     @classmethod
     def to_callable(cls, obj):
         if isinstance(obj, dict):
-            obj = cls.__reversed_cache.setdefault(id(obj),
-                                                  {value: key for key, value
-                                                   in obj.items()})
-            return get_mapping(obj)
+            return get_mapping(_reversed_mapping(tuple((key, type(key), value, type(value))
+                                                       for key, value in obj.items())))
         if isinstance(obj, set):
             return check_membership(obj)
         raise TypeError('ReverseMapProcessor argument must be a dict or a callable, '
@@ -348,8 +433,17 @@ def check_range_and_coerce_step(low, high, step=None):
         >>> checker(1), checker(5.4), checker(10)
         (1, 5, 10)
 
+    NumPy arrays are checked and coerced in a single vectorized operation.
     """
     def _inner(value):
+        if _is_array(value):
+            outside = (value < low) | (value > high)
+            if outside.any():
+                raise ValueError('{} not in range ({}, {})'.format(value[outside][0], low, high))
+            if step:
+                value = np.round((value - low) / step) * step + low
+            return value
+
         if not (low <= value <= high):
             raise ValueError('{} not in range ({}, {})'.format(value, low, high))
         if step:
@@ -373,9 +467,16 @@ def check_membership(container):
         ...
         ValueError: 0 not in (1, 2, 3)
 
+    NumPy arrays are checked in a single vectorized operation.
     """
 
     def _inner(value):
+        if _is_array(value):
+            valid = np.isin(value, tuple(container))
+            if not valid.all():
+                raise ValueError('{!r} not in {}'.format(value[~valid][0], container))
+            return value
+
         if value not in container:
             raise ValueError('{!r} not in {}'.format(value, container))
         return value
@@ -392,9 +493,19 @@ def get_mapping(container):
         ...
         ValueError: 0 not in ('A', 'B')
 
+    NumPy arrays are mapped looking up each distinct value only once.
     """
 
     def _inner(key):
+        if _is_array(key):
+            distinct, inverse = np.unique(key, return_inverse=True)
+            distinct = distinct.tolist()
+            for item in distinct:
+                if item not in container:
+                    raise ValueError("{!r} not in {}".format(item, tuple(container.keys())))
+            mapped = np.asarray([container[item] for item in distinct])
+            return mapped[inverse].reshape(key.shape)
+
         if key not in container:
             raise ValueError("{!r} not in {}".format(key, tuple(container.keys())))
         return container[key]
@@ -12,6 +12,7 @@
 
 import logging
 import socket
+import inspect
 import socketserver
 
 try:
@@ -90,52 +91,139 @@ def create_TCPInstrumentHandler(instrument):
     return TCPHandler
 
 
+#: class: {name: command(inst, name, sig, value)}
+_COMMANDS = {}
+
+_MISSING = object()
+
+
+def _value_command(inst, name, current, sig, value, put):
+    """Get or set a value or, if it is a dict, one of its items.
+    The value is set with put(inst, name, value) (None if read-only).
+    """
+    if isinstance(current, dict):
+        try:
+            key_convert = getattr(inst, name + '_key_convert')
+        except AttributeError:
+            raise SimError
+        key = key_convert(value[1])
+        if sig == '?':
+            return current[key]
+        elif sig == '!':
+            current[key] = type(current[key])(value[2])
+            return 'OK'
+        return 'ERROR'
+
+    if sig == '?':
+        return current
+    elif sig == '!' and put is not None:
+        put(inst, name, type(current)(value[1]))
+        return 'OK'
+    return 'ERROR'
+
+
+def _call_command(func, args, sig):
+    try:
+        out = func(*args)
+    except Exception as ex:
+        logging.exception('While calling %s with %s: %s', func, args, ex)
+        return 'ERROR'
+    if out is None or sig == '!':
+        return 'OK'
+    elif sig == '?':
+        return out
+    return 'ERROR'
+
+
+def _attribute_command(inst, name, sig, value):
+    """Command for names that are not properties or methods of the class,
+    looked up in the instance on each call.
+    """
+    current = getattr(inst, name, _MISSING)
+    if current is _MISSING:
+        return 'ERROR'
+    if callable(current):
+        return _call_command(current, value[1:], sig)
+    return _value_command(inst, name, current, sig, value, setattr)
+
+
+def _property_command(prop):
+    fget, fset = prop.fget, prop.fset
+    if fset is None:
+        put = None
+    else:
+        def put(inst, name, value):
+            fset(inst, value)
+
+    def command(inst, name, sig, value):
+        return _value_command(inst, name, fget(inst), sig, value, put)
+    return command
+
+
+def _method_command(func):
+    def command(inst, name, sig, value):
+        return _call_command(func, (inst, ) + tuple(value[1:]), sig)
+    return command
+
+
+def _class_commands(cls):
+    """Return the commands of a handler class by name, built once per class
+    from its properties and functions.
+    """
+    try:
+        return _COMMANDS[cls]
+    except KeyError:
+        pass
+    commands = {}
+    for klass in reversed(cls.__mro__):
+        for name, member in vars(klass).items():
+            if isinstance(member, property):
+                commands[name] = _property_command(member)
+            elif inspect.isfunction(member):
+                commands[name] = _method_command(member)
+            else:
+                commands.pop(name, None)
+    _COMMANDS[cls] = commands
+    return commands
+
+
 class InstrumentHandler(object):
+    """Base class of simulated instruments.
+
+    A command is a signature ('?' to get, '!' to set) followed by the name of
+    an attribute, property or method and its arguments. Properties and methods
+    are found in a table built once per class and called with the instance;
+    other names are looked up in the instance on each call.
+    """
 
     CONVERSION = {float: '{:.4f}',
                   int: '{:d}',
                   str: '{}'}
 
+    #: class: {type: formatting function}
+    _formatters = {}
+
     def handle(self, data):
         out = self.dispatch(data)
-        out = self.CONVERSION[type(out)].format(out)
-        return out
+        cls = type(self)
+        formatters = self._formatters.get(cls)
+        if formatters is None:
+            formatters = self._formatters[cls] = {key: fmt.format for key, fmt in self.CONVERSION.items()}
+        return formatters[type(out)](out)
 
     def dispatch(self, data):
         data = data.strip()
-        dict_key = None
         try:
             sig, value = data[0], data[1:].split()
-            prop = value[0].lower()
-            try:
-                current = getattr(self, prop)
-            except AttributeError:
-                raise SimError
-            if isinstance(current, dict):
-                dict_key = getattr(self, prop + '_key_convert')(value[1])
-            elif callable(current):
-                try:
-                    current = current(*value[1:])
-                    if current is None:
-                        return 'OK'
-                except Exception as ex:
-                    logging.exception('While calling %s with %s: %s', current, value, ex)
-                    return 'ERROR'
-
-            if sig == '?':
-                if dict_key is not None:
-                    return current[dict_key]
-                return current
-            elif sig == '!':
-                if dict_key is not None:
-                    cls = type(current[dict_key])
-                    current[dict_key] = cls(value[2])
-                else:
-                    cls = type(current)
-                    setattr(self, prop, cls(value[1]))
-                return 'OK'
+            name = value[0].lower()
+        except IndexError:
             return 'ERROR'
-        except (SimError, IndexError) as e:
+
+        commands = _COMMANDS.get(type(self)) or _class_commands(type(self))
+        try:
+            command = commands.get(name, _attribute_command)
+            return command(self, name, sig, value)
+        except (SimError, IndexError, KeyError, ValueError, TypeError):
             return 'ERROR'
         except Exception as e:
             logging.exception('Exception {}'.format(e))
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import threading
 import unittest
-from lantz import Driver, Action, Q_
+from concurrent import futures
+
+from lantz import Driver, Action, Feat, Q_
 
 
 class aDriver(Driver):
@@ -26,6 +29,53 @@ class aDriver(Driver):
     def run5(self, x, y, z):
         return x, y, z
 
+    @Action()
+    def run6(self, x, y=2, z=3):
+        return x, y, z
+
+
+class MemoDriver(Driver):
+
+    calls = 0
+    _mode = 1
+
+    @Feat()
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        self._mode = value
+
+    @Action(memoize=2, invalidated_by=('mode', ))
+    def config(self, position):
+        self.calls += 1
+        return self._mode * position
+
+
+class SlowDriver(Driver):
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.interrupted = threading.Event()
+
+    @Action()
+    def poll(self, steps):
+        for step in range(steps):
+            self.report_progress(100. * step / steps)
+            self.started.set()
+            self.sleep(.01)
+        return steps
+
+    @Action()
+    def block(self):
+        with self.cancel_callback(self.interrupted.set):
+            self.started.set()
+            self.interrupted.wait(5)
+        self.check_cancelled()
+        return 'done'
+
 
 class ActionTest(unittest.TestCase):
 
@@ -48,6 +98,77 @@ class ActionTest(unittest.TestCase):
         obj = aDriver()
         self.assertEqual(obj.run5(1, 'a', 3), (1, 1, '3'))
 
+    def test_binding(self):
+        obj = aDriver()
+        self.assertEqual(obj.run6(1), (1, 2, 3))
+        self.assertEqual(obj.run6(1, 4), (1, 4, 3))
+        self.assertEqual(obj.run6(1, 4, 5), (1, 4, 5))
+        self.assertEqual(obj.run6(1, z=5), (1, 2, 5))
+        self.assertEqual(obj.run6(z=5, x=1), (1, 2, 5))
+        self.assertEqual(obj.run5(z=3, y='b', x=1), (1, 2, '3'))
+        self.assertRaises(TypeError, obj.run6)
+        self.assertRaises(TypeError, obj.run6, 1, 2, 3, 4)
+        self.assertRaises(TypeError, obj.run, 1)
+
+    def test_memoize(self):
+        obj = MemoDriver()
+        other = MemoDriver()
+        self.assertEqual(obj.config(2), 2)
+        self.assertEqual(obj.config(2), 2)
+        self.assertEqual(obj.calls, 1)
+        self.assertEqual(other.config(2), 2)
+        self.assertEqual(other.calls, 1)
+
+        # Bounded size, least recently used are discarded.
+        obj.config(3)
+        obj.config(4)
+        self.assertEqual(obj.calls, 3)
+        obj.config(2)
+        self.assertEqual(obj.calls, 4)
+
+        obj.mode = 10
+        self.assertEqual(obj.config(2), 20)
+        self.assertEqual(obj.calls, 5)
+        self.assertEqual(other.config(2), 2)
+        self.assertEqual(other.calls, 1)
+
+        obj.actions.config.clear_cache()
+        obj.config(2)
+        self.assertEqual(obj.calls, 6)
+
+    def test_cancel(self):
+        obj = SlowDriver()
+        self.assertEqual(obj.poll(3), 3)
+
+        progress = []
+        fut = obj.poll_async(4)
+        fut.add_progress_callback(lambda f, value: progress.append(value))
+        self.assertEqual(fut.result(), 4)
+        # Callbacks get the values reported after they were attached.
+        self.assertEqual(progress, [0., 25., 50., 75.][4 - len(progress):])
+        self.assertEqual(fut.progress, 75.)
+        self.assertFalse(fut.cancel())
+
+        obj.started.clear()
+        fut = obj.poll_async(1000)
+        queued = obj.poll_async(1)
+        self.assertTrue(obj.started.wait(5))
+        self.assertTrue(queued.cancel())
+        self.assertTrue(queued.cancelled())
+        self.assertTrue(fut.cancel())
+        futures.wait([fut], timeout=5)
+        self.assertTrue(fut.cancelled())
+        self.assertRaises(futures.CancelledError, fut.result)
+        self.assertLess(fut.progress, 50.)
+
+        obj.started.clear()
+        fut = obj.block_async()
+        self.assertTrue(obj.started.wait(5))
+        fut.cancel()
+        self.assertRaises(futures.CancelledError, fut.result, 5)
+        self.assertTrue(obj.interrupted.is_set())
+        self.assertEqual(obj.block_async().result(5), 'done')
+
     def test_instance_specific(self):
         x = aDriver()
         y = aDriver()
@@ -1,15 +1,44 @@
 # -*- coding: utf-8 -*-
 
+import logging
 import unittest
-from time import sleep
+import contextlib
+from time import sleep, time
 
-from lantz import Driver, Feat, Action, Q_
+from lantz import Driver, Feat, Action, Q_, group
 from lantz.driver import Self
+from lantz.log import get_logger
 
 SLEEP = .1
 WAIT = .2
 
 
+class MemHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.history = list()
+
+    def emit(self, record):
+        self.history.append(record.getMessage())
+
+
+@contextlib.contextmanager
+def driver_log(level=logging.INFO):
+    """Collect the messages of the driver logger in a MemHandler.
+    """
+    hdl = MemHandler()
+    logger = get_logger('lantz.driver', False)
+    logger.addHandler(hdl)
+    old_level = logger.level
+    logger.setLevel(level)
+    try:
+        yield hdl
+    finally:
+        logger.removeHandler(hdl)
+        logger.setLevel(old_level)
+
+
 class aDriver(Driver):
 
     def __init__(self, slow=False, *args, **kwargs):
@@ -169,6 +198,26 @@ class DriverTest(unittest.TestCase):
         fut = obj.refresh_async({'eggs': None, 'ham': None})
         self.assertEqual(fut.result(), {'eggs': 3, 'ham': 23})
 
+    def test_group(self):
+        objs = [aDriver(slow=True) for _ in range(4)]
+        for ndx, obj in enumerate(objs):
+            obj._eggs = ndx
+
+        with group(objs) as grp:
+            tic = time()
+            results = grp.get('eggs')
+            self.assertLess(time() - tic, 4 * SLEEP)
+            self.assertEqual([r.driver for r in results], objs)
+            self.assertEqual([r.value for r in results], [0, 1, 2, 3])
+            self.assertTrue(all(r.exception is None for r in results))
+            self.assertTrue(all(r.elapsed >= SLEEP for r in results))
+
+            results = grp.set('eggs', 42)
+            self.assertEqual([obj.recall('eggs') for obj in objs], [42] * 4)
+
+            results = grp.get('spam')
+            self.assertTrue(all(isinstance(r.exception, AttributeError) for r in results))
+
     def test_derived_class(self):
 
         class X(Driver):
@@ -372,6 +421,84 @@ class DriverTest(unittest.TestCase):
         self.assertEqual(x.feats.a_value.units, 'ms')
         self.assertEqual(x.a_value, Q_(1, 'ms'))
 
+    def test_log_io(self):
+
+        with driver_log() as hdl:
+            history = hdl.history
+            x = aDriver()
+            x.IO_LOG_LIMIT = 4
+            del history[:]
+
+            x.log_io('Read {!r}', b'spam and eggs')
+            self.assertEqual(history, [])
+
+            get_logger('lantz.driver', False).setLevel(logging.DEBUG)
+            x.log_io('Read {!r}', b'spam')
+            x.log_io('Read {!r}', b'spam and eggs')
+            self.assertEqual(history, ["Read b'spam'",
+                                       "Read b'spam'... (len=13, crc32=2c0e6100)"])
+
+            del history[:]
+            x.IO_LOG_SAMPLE = 3
+            for _ in range(6):
+                x.log_io('Sending {!r}', 'ham')
+            self.assertEqual(history, ["Sending 'ham'"] * 2)
+
+    def test_log_limit(self):
+
+        with driver_log() as hdl:
+            history = hdl.history
+            x = aDriver()
+            x.set_log_limit('Getting {}', sample=3)
+            x.set_log_limit('Got {}', rate=1e-6, burst=2)
+            del history[:]
+
+            for ndx in range(6):
+                x.log_info('Getting {}', ndx)
+            for ndx in range(5):
+                x.log_info('Got {}', ndx)
+            x.log_error('Got {}', 'error')
+            self.assertEqual(history, ['Getting 0', 'Getting 3', 'Got 0', 'Got 1', 'Got error'])
+
+            del history[:]
+            x._log_limiter.summary_interval = 0
+            x.log_info('Other {}', 1)
+            self.assertEqual(history, ["Suppressed 4 similar messages: 'Getting {}'",
+                                       "Suppressed 3 similar messages: 'Got {}'",
+                                       'Other 1'])
+
+    def test_log_summary_timer(self):
+
+        with driver_log() as hdl:
+            history = hdl.history
+            x = aDriver()
+            x.set_log_limit('Got {}', rate=1e-6, burst=1)
+            x._log_limiter.summary_interval = .05
+            del history[:]
+
+            for ndx in range(3):
+                x.log_info('Got {}', ndx)
+            self.assertEqual(history, ['Got 0'])
+
+            # No further record is logged.
+            summary = "Suppressed 2 similar messages: 'Got {}'"
+            tic = time()
+            while summary not in history and time() - tic < 5:
+                sleep(.01)
+            self.assertEqual(history, ['Got 0', summary])
+
+            del history[:]
+            x._log_limiter.summary_interval = 100
+            x.log_info('Got {}', 3)
+            self.assertIsNotNone(x._log_limiter._timer)
+            with x:
+                pass
+            self.assertEqual(history[-1], "Suppressed 1 similar messages: 'Got {}'")
+            self.assertIsNone(x._log_limiter._timer)
+            del history[:]
+            x.flush_log()
+            self.assertEqual(history, [])
+
 
 if __name__ == '__main__':
     unittest.main()
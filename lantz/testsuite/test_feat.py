@@ -4,6 +4,11 @@ import time
 import logging
 import unittest
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from lantz import Driver, Feat, Q_
 from lantz.feat import MISSING
 from lantz.log import get_logger
@@ -270,6 +275,28 @@ class FeatTest(unittest.TestCase):
                                        '(raw) Setting eggs = 10',
                                        'eggs was set to 10'])
 
+    @unittest.skipIf(np is None, 'NumPy not installed')
+    def test_units_array(self):
+
+        class Spam(Driver):
+
+            _eggs = np.zeros(3)
+
+            @Feat(units='ms', limits=(0, 10000, 1))
+            def eggs(self_):
+                return self_._eggs
+
+            @eggs.setter
+            def eggs(self_, value):
+                self_._eggs = value
+
+        obj = Spam()
+        obj.eggs = Q_(np.array([1., 2.5001, 3.]), 's')
+        np.testing.assert_allclose(obj._eggs, [1000., 2500., 3000.])
+        obj.eggs = Q_(np.array([1., 2.5001, 3.]), 's')
+        np.testing.assert_allclose(obj.eggs.to('s').magnitude, [1., 2.5, 3.])
+        self.assertRaises(ValueError, setattr, obj, 'eggs', Q_(np.array([1., 20.]), 's'))
+
     def test_units(self):
 
         hdl = MemHandler()
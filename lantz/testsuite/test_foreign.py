@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import time
 import ctypes
 import unittest
+import threading
 
 from array import array
+from concurrent import futures
+from ctypes.util import find_library
 
-from lantz.foreign import LibraryDriver, RetStr, RetTuple, RetValue, TYPES
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lantz.errors import LantzTimeoutError
+from lantz.foreign import (LibraryDriver, RetStr, RetTuple, RetValue, RetArray,
+                           BufferPool, CallFuture, TYPES)
 
 class Array(array):
 
@@ -24,6 +35,14 @@ class MyWrongDriver(LibraryDriver):
 
     LIBRARY_NAME = 'no_simplelib.dylib'
 
+class BlockingDriver(LibraryDriver):
+
+    LIBRARY_NAME = find_library('c')
+
+    BLOCKING_FUNCTIONS = ('usleep', )
+    SAFE_FUNCTIONS = ('abs', )
+
+
 class ForeignTest(unittest.TestCase):
 
     def setUp(self):
@@ -107,4 +126,110 @@ class ForeignTest(unittest.TestCase):
         ret, value = self.driver.lib.double_param(RetValue('d'))
         self.assertEqual((ret, value, type(value)), (1, 7., float))
 
+    @unittest.skipIf(np is None, 'NumPy not installed')
+    def test_return_ndarray(self):
+        ret, value = self.driver.lib.double_array_length_param(*RetArray('d', 10))
+        self.assertEqual(ret, 1)
+        self.assertIsInstance(value, np.ndarray)
+        np.testing.assert_array_equal(value, np.arange(10.))
+
+        ret, value = self.driver.lib.double_array_length_param(*RetArray(np.float64, (2, 5)))
+        np.testing.assert_array_equal(value, np.arange(10.).reshape(2, 5))
+
+        pool = BufferPool(depth=2)
+        ret, first = self.driver.lib.double_array_length_param(*RetArray('d', 10, pool))
+        ret, second = self.driver.lib.double_array_length_param(*RetArray('d', 10, pool))
+        ret, third = self.driver.lib.double_array_length_param(*RetArray('d', 10, pool))
+        self.assertIsNot(first, second)
+        self.assertIs(first, third)
+        np.testing.assert_array_equal(third, np.arange(10.))
+
+    def test_pooled_string(self):
+        pool = BufferPool()
+        ret, value = self.driver.lib.write_in_charp(*RetStr(20, pool=pool))
+        self.assertEqual((ret, value), (1, '28G11AC10T32'))
+        ret, value = self.driver.lib.write_in_charp(RetStr(20, pool=pool), 3)
+        self.assertEqual((ret, value), (1, '28G'))
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_string(self):
+        pool = BufferPool(depth=2)
+        first, second, third = pool.string(10), pool.string(10), pool.string(10)
+        self.assertIsNot(first, second)
+        self.assertIs(first, third)
+        self.assertIsNot(pool.string(20), first)
+
+        first.value = b'abc'
+        self.assertEqual(pool.string(10).value, b'')
+
+    @unittest.skipIf(np is None, 'NumPy not installed')
+    def test_array(self):
+        pool = BufferPool(depth=1)
+        array, pointer = pool.array(np.dtype('int32'), (3, 4))
+        self.assertEqual((array.shape, array.dtype), ((3, 4), np.dtype('int32')))
+        self.assertIs(pool.array(np.dtype('int32'), (3, 4))[0], array)
+        self.assertEqual(ctypes.addressof(pointer.contents), array.ctypes.data)
+
+        pool.clear()
+        self.assertIsNot(pool.array(np.dtype('int32'), (3, 4))[0], array)
+
+    @unittest.skipIf(np is None, 'NumPy not installed')
+    def test_ret_array(self):
+        ret = RetArray('i32', 4)
+        self.assertEqual(list(ret)[1], 4)
+        self.assertEqual(ret.value.dtype, np.dtype('int32'))
+        self.assertRaises(KeyError, RetArray, 'nope', 4)
+
+
+@unittest.skipIf(find_library('c') is None, 'C library not found')
+class BlockingTest(unittest.TestCase):
 
+    def setUp(self):
+        self.driver = BlockingDriver()
+
+    def test_call(self):
+        self.assertEqual(self.driver.lib.usleep(1000), 0)
+        self.assertEqual(self.driver.lib.abs(-3), 3)
+        fut = self.driver.call_async('usleep', 1000)
+        self.assertIsInstance(fut, CallFuture)
+        self.assertEqual(fut.result(1), 0)
+
+    def test_releases_lock(self):
+        driver = self.driver
+
+        def hold_and_block():
+            with driver._lock:
+                driver.lib.usleep(300000)
+
+        thread = threading.Thread(target=hold_and_block)
+        thread.start()
+        time.sleep(.05)
+        self.assertTrue(driver._lock.acquire(timeout=.1))
+        driver._lock.release()
+        thread.join()
+
+    def test_safe_and_unsafe(self):
+        driver = self.driver
+        fut = driver.call_async('usleep', 300000)
+        time.sleep(.05)
+
+        tic = time.monotonic()
+        self.assertEqual(driver.lib.abs(-3), 3)
+        self.assertLess(time.monotonic() - tic, .1)
+        self.assertFalse(fut.done())
+
+        self.assertEqual(driver.lib.atoi(b'4'), 4)
+        self.assertTrue(fut.done())
+
+    def test_timeout(self):
+        driver = self.driver
+        driver.BLOCKING_TIMEOUT = .05
+        self.assertRaises(LantzTimeoutError, driver.lib.usleep, 300000)
+        self.assertRaises(futures.TimeoutError, driver.call_async('usleep', 1000).result)
+
+        driver.BLOCKING_TIMEOUT = None
+        fut = driver.call_async('usleep', 300000, timeout=.05)
+        self.assertRaises(futures.TimeoutError, fut.result)
+        self.assertEqual(fut.result(1), 0)
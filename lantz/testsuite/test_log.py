@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import socket
+import tempfile
+import logging
+import unittest
+import threading
+from logging.handlers import SocketHandler, DatagramHandler
+
+from lantz.log import (get_logger, pack_records, unpack_records, is_packed,
+                       QueuedSocketHandler, LoggingTCPServer, LoggingUDPServer, _FrameReader,
+                       FeatFileHandler, FeatLogReader)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class LogTest(unittest.TestCase):
+
+    def make_record(self, msg, *args, **extra):
+        logger = get_logger('lantz.test')
+        return logger.makeRecord('lantz.test', logging.INFO, __file__, 10, msg, args, None,
+                                 'func', extra)
+
+    def test_pack(self):
+        records = [self.make_record('Getting {}', 'x', lantz_driver='aDriver', lantz_name='inst',
+                                    lantz_feat=('x', '42')),
+                   self.make_record('Created {} ñ', 'inst', lantz_driver='aDriver', lantz_name='inst')]
+        payload = pack_records(records, dropped=3)
+        self.assertTrue(is_packed(payload[4:]))
+
+        out = unpack_records(payload[4:])
+        self.assertEqual(len(out), 3)
+        self.assertEqual(out[0].levelno, logging.WARNING)
+        self.assertEqual(out[0].getMessage(), 'The sender dropped 3 log records')
+
+        for original, record in zip(records, out[1:]):
+            self.assertEqual(record.getMessage(), original.getMessage())
+            for attr in ('name', 'levelno', 'levelname', 'created', 'lineno', 'funcName',
+                         'pathname', 'threadName', 'lantz_driver', 'lantz_name'):
+                self.assertEqual(getattr(record, attr), getattr(original, attr))
+        self.assertEqual(out[1].lantz_feat, ('x', '42'))
+        self.assertFalse(hasattr(out[2], 'lantz_feat'))
+
+    def test_frame_reader(self):
+        records = [self.make_record('Value {}', 'x' * ndx) for ndx in range(2000)]
+        data = b''.join(pack_records(records[ndx:ndx + 100]) for ndx in range(0, 2000, 100))
+        data += SocketHandler('localhost', 0).makePickle(records[0])
+
+        reader = _FrameReader(64)
+        received = []
+        left, right = socket.socketpair()
+        with left, right:
+            for ndx in range(0, len(data), 1000):
+                left.sendall(data[ndx:ndx + 1000])
+                reader.fill(right)
+                for payload in reader.frames():
+                    if is_packed(payload):
+                        received.extend(unpack_records(payload))
+                    else:
+                        received.append(None)
+        self.assertEqual(len(received), 2001)
+        self.assertEqual(received[1999].getMessage(), records[1999].getMessage())
+        self.assertIsNone(received[2000])
+
+    def serve(self, server_class, sender, records):
+        received = []
+        done = threading.Event()
+
+        def on_record(record):
+            received.append(record)
+            if len(received) == len(records):
+                done.set()
+
+        server = server_class(('localhost', 0), on_record, .1)
+        thread = threading.Thread(target=server.serve_until_stopped)
+        thread.daemon = True
+        thread.start()
+        try:
+            sender(server.server_address, records)
+            self.assertTrue(done.wait(5))
+        finally:
+            server.stop()
+            thread.join()
+        return received
+
+    def test_udp_server(self):
+        def send(address, records):
+            handler = DatagramHandler(*address)
+            for record in records:
+                handler.handle(record)
+            handler.close()
+
+        records = [self.make_record('Value {}', ndx, lantz_driver='aDriver') for ndx in range(10)]
+        received = self.serve(LoggingUDPServer, send, records)
+        self.assertEqual(sorted(record.getMessage() for record in received),
+                         sorted(record.getMessage() for record in records))
+        self.assertEqual(received[0].lantz_driver, 'aDriver')
+
+    def test_queued_socket(self):
+        received = []
+        done = threading.Event()
+
+        def on_record(record):
+            received.append(record)
+            if len(received) == 100:
+                done.set()
+
+        server = LoggingTCPServer(('localhost', 0), on_record, .1)
+        thread = threading.Thread(target=server.serve_until_stopped)
+        thread.daemon = True
+        thread.start()
+
+        handler = QueuedSocketHandler(*server.server_address, batch_size=16)
+        try:
+            for ndx in range(100):
+                handler.handle(self.make_record('Value {}', ndx, lantz_driver='aDriver', lantz_name='inst'))
+            self.assertTrue(done.wait(5))
+            self.assertEqual([record.getMessage() for record in received],
+                             ['Value {}'.format(ndx) for ndx in range(100)])
+            self.assertEqual(handler.dropped, 0)
+        finally:
+            handler.close()
+            server.stop()
+            thread.join()
+
+    def test_queued_socket_snapshot(self):
+        handler = QueuedSocketHandler('localhost', 1, capacity=10, timeout=.1)
+        sent = []
+        try:
+            handler._send = sent.extend
+            payload = bytearray(b'spam')
+            record = self.make_record('Read {!r}', payload)
+            handler.handle(record)
+            payload[:] = b'eggs'
+            handler.flush()
+            self.assertEqual([item.getMessage() for item in sent], ["Read bytearray(b'spam')"])
+            self.assertEqual(record.getMessage(), "Read bytearray(b'eggs')")
+        finally:
+            handler.close()
+
+    def test_queued_socket_drops(self):
+        # Nobody listens on this port.
+        handler = QueuedSocketHandler('localhost', 1, capacity=10, timeout=.1)
+        tic = time.time()
+        for ndx in range(1000):
+            handler.handle(self.make_record('Value {}', ndx))
+        self.assertLess(time.time() - tic, 1)
+        handler.flush()
+        handler.close()
+        self.assertEqual(handler.dropped, 1000)
+
+    @unittest.skipIf(np is None, 'NumPy not available')
+    def test_feat_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run')
+            handler = FeatFileHandler(path, max_bytes=4096)
+            t0 = time.time()
+            for ndx in range(1000):
+                for name, value in (('power', '{} milliwatt'.format(ndx)), ('step', str(ndx))):
+                    record = self.make_record('{} was set to {}', name, value, lantz_name='laser',
+                                              lantz_feat=(name, value))
+                    record.created = t0 + ndx
+                    handler.handle(record)
+            handler.handle(self.make_record('Value {}', 1, lantz_name='laser'))
+            record = self.make_record('', lantz_name='laser', lantz_feat=('mode', 'fast'))
+            record.created = t0 + 1000
+            handler.handle(record)
+            handler.flush()
+
+            reader = FeatLogReader(path)
+            self.assertGreater(len(reader.segments), 2)
+            self.assertEqual(reader.keys(), ['laser.mode', 'laser.power', 'laser.step'])
+            self.assertEqual(reader.units('laser.power'), 'milliwatt')
+            self.assertIsNone(reader.units('laser.step'))
+
+            times, values = reader.query('laser.power', t0 + 10, t0 + 500)
+            self.assertEqual(values.dtype, np.float64)
+            np.testing.assert_array_equal(values, np.arange(10, 500))
+            np.testing.assert_array_equal(times, t0 + np.arange(10, 500))
+            self.assertEqual(len(reader.query('laser.step')[0]), 1000)
+            self.assertEqual(len(reader.query('laser.other')[0]), 0)
+            self.assertEqual(reader.value_at('laser.power', t0 + 421.5), 421)
+            self.assertEqual(reader.value_at('laser.mode', t0 + 2000), 'fast')
+            self.assertRaises(KeyError, reader.value_at, 'laser.mode', t0)
+
+            # Values appended later are indexed incrementally.
+            record = self.make_record('', lantz_name='laser', lantz_feat=('step', '1000'))
+            record.created = t0 + 1001
+            handler.handle(record)
+            handler.close()
+            reader.refresh()
+            self.assertEqual(reader.value_at('laser.step', t0 + 1001), 1000)
+
+            # A new reader uses the stored index.
+            self.assertTrue(os.path.exists(reader.segments[0].index_filename))
+            other = FeatLogReader(path)
+            np.testing.assert_array_equal(other.query('laser.step')[1], np.arange(1001))
+
+            # New handlers start a new file and remove old ones.
+            handler = FeatFileHandler(path, max_bytes=4096, max_files=2)
+            handler.close()
+            self.assertEqual(len(FeatLogReader(path).segments), 2)
+
+    @unittest.skipIf(np is None, 'NumPy not available')
+    def test_feat_file_flush_interval(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run')
+            handler = FeatFileHandler(path, flush_interval=.05)
+            self.addCleanup(handler.close)
+            handler.handle(self.make_record('', lantz_name='laser', lantz_feat=('step', '1')))
+
+            # A single value is written without further records or flush calls.
+            size = os.path.getsize(handler.filename)
+            tic = time.time()
+            while os.path.getsize(handler.filename) == size and time.time() - tic < 5:
+                time.sleep(.01)
+            self.assertEqual(FeatLogReader(path).value_at('laser.step', time.time()), 1)
+            self.assertIsNone(handler._timer)
+
+
+if __name__ == '__main__':
+    unittest.main()
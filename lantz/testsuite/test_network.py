@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import unittest
+
+from lantz.drivers.legacy.network import TCPDriver
+
+
+class EchoDriver(TCPDriver):
+
+    RETRY_START = .01
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replayed = 0
+
+    def on_reconnect(self):
+        self.replayed += 1
+
+
+def serve(listener, drop_first, partial=b''):
+    """Accept connections, dropping the first one after sending partial
+    if drop_first and echoing every received line on the others.
+    """
+    for drop in (drop_first, False):
+        conn, _ = listener.accept()
+        with conn:
+            buffer = b''
+            while True:
+                data = conn.recv(1024)
+                if not data:
+                    break
+                if drop:
+                    conn.sendall(partial)
+                    conn.shutdown(socket.SHUT_RDWR)
+                    break
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    conn.sendall(b'echo ' + line + b'\n')
+    listener.close()
+
+
+class NetworkTest(unittest.TestCase):
+
+    def start_server(self, drop_first=True, partial=b''):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        self.addCleanup(listener.close)
+        thread = threading.Thread(target=serve, args=(listener, drop_first, partial), daemon=True)
+        thread.start()
+        return listener.getsockname()[1]
+
+    def test_query(self):
+        port = self.start_server(drop_first=False)
+        with EchoDriver('127.0.0.1', port) as inst:
+            self.assertEqual(inst.query('spam'), 'echo spam')
+            self.assertEqual(inst.query('eggs'), 'echo eggs')
+            self.assertEqual(inst.reconnect_count, 0)
+
+    def test_reconnect(self):
+        port = self.start_server()
+        with EchoDriver('127.0.0.1', port) as inst:
+            inst.socket.settimeout(5)
+            self.assertRaises(ConnectionResetError, inst.query, 'spam')
+            self.assertEqual(inst.reconnect_count, 1)
+            self.assertEqual(inst.replayed, 1)
+            self.assertTrue(inst.is_open())
+            self.assertEqual(inst.query('eggs'), 'echo eggs')
+            self.assertEqual(inst.reconnect_count, 1)
+
+    def test_reconnect_partial_reply(self):
+        port = self.start_server(partial=b'part')
+        with EchoDriver('127.0.0.1', port) as inst:
+            inst.socket.settimeout(5)
+            self.assertRaises(ConnectionResetError, inst.query, 'spam')
+            self.assertEqual(inst.reconnect_count, 1)
+            self.assertEqual(inst.query('eggs'), 'echo eggs')
+
+    def test_no_reconnect(self):
+        port = self.start_server()
+        with EchoDriver('127.0.0.1', port) as inst:
+            inst.socket.settimeout(5)
+            inst.RECONNECT = False
+            self.assertEqual(inst.raw_send(b'spam\n'), 5)
+            self.assertEqual(inst.raw_recv(16), b'')
+            self.assertEqual(inst.reconnect_count, 0)
+
+    def test_recv_into(self):
+        port = self.start_server(drop_first=False)
+        with EchoDriver('127.0.0.1', port) as inst:
+            inst.socket.settimeout(5)
+            inst.raw_send(b'spam\n')
+            buffer = bytearray(32)
+            received = 0
+            while not buffer[:received].endswith(b'\n'):
+                view = memoryview(buffer)[received:]
+                received += inst.raw_recv_into(view)
+            self.assertEqual(buffer[:received], b'echo spam\n')
+            self.assertEqual(inst.raw_recv_into(memoryview(buffer)[:0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
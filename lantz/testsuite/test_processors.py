@@ -3,6 +3,11 @@
 import unittest
 import doctest
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from lantz import Q_
 
 import lantz.processors as processors
@@ -45,5 +50,69 @@ class TestProcessors(unittest.TestCase):
 
         self.assertRaises(ValueError, processors.convert_to(V, on_dimensionless='raise'), 1000)
 
+    def test_reverse_map(self):
+        conv = processors.ReverseMapProcessor({'A': 1, 'B': 2})
+        self.assertEqual(conv(1), 'A')
+        self.assertEqual(conv(2), 'B')
+        self.assertRaises(ValueError, conv, 3)
+
+        hits = processors._reversed_mapping.cache_info().hits
+        processors.ReverseMapProcessor({'A': 1, 'B': 2})
+        self.assertEqual(processors._reversed_mapping.cache_info().hits, hits + 1)
+
+        # A mapping modified in place must not reuse the old reversed mapping.
+        values = {'A': 1}
+        processors.ReverseMapProcessor(values)
+        values['A'] = 2
+        self.assertEqual(processors.ReverseMapProcessor(values)(2), 'A')
+
+        # Equal keys of different types must not share the cached mapping.
+        processors.ReverseMapProcessor({True: '1', False: '0'})
+        out = processors.ReverseMapProcessor({1: '1', 0: '0'})('1')
+        self.assertIs(type(out), int)
+        self.assertIs(type(processors.ReverseMapProcessor({1: 'x'})('x')), int)
+        self.assertIs(type(processors.ReverseMapProcessor({1.: 'x'})('x')), float)
+
+    def test_cached_factors(self):
+        conv = processors.convert_to('mV', return_float=True)
+        self.assertEqual(conv(Q_(2, 'V')), 2000)
+        self.assertIn((V.units, mv.units), processors._CONVERSION_FACTORS)
+        self.assertEqual(conv(Q_(3, 'V')), 3000)
+
+        conv = processors.convert_to('degF', return_float=True)
+        self.assertAlmostEqual(conv(Q_(100, 'degC')), 212)
+        self.assertAlmostEqual(conv(Q_(300, 'kelvin')), 80.33)
+        self.assertAlmostEqual(processors.convert_to('kelvin')(Q_(0, 'degC')).magnitude, 273.15)
+
+    def test_offset_factors(self):
+        for source, target in (('kelvin', 'degF'), ('degF', 'degC'), ('degC', 'degF')):
+            conv = processors.convert_to(target, return_float=True)
+            for value in (-40., 0.5, 123.456, 1e4):
+                expected = Q_(value, source).to(target).magnitude
+                self.assertAlmostEqual(conv(Q_(value, source)), expected, delta=1e-14 * max(abs(expected), 1.))
+
+    @unittest.skipIf(np is None, 'NumPy not installed')
+    def test_arrays(self):
+        values = np.array([1., 2., 3.])
+
+        out = processors.convert_to(V, return_float=True)(values * mv)
+        np.testing.assert_allclose(out, values / 1000)
+        out = processors.convert_to(mv, on_dimensionless='ignore')(values)
+        np.testing.assert_allclose(out.magnitude, values)
+        self.assertEqual(out.units, mv.units)
+
+        checker = processors.check_range_and_coerce_step(0, 10, 2)
+        np.testing.assert_equal(checker(np.array([0.9, 5.2, 10])), [0, 6, 10])
+        self.assertRaises(ValueError, checker, np.array([1, 11]))
+
+        checker = processors.check_membership({1, 2, 3})
+        np.testing.assert_equal(checker(np.array([[1, 2], [3, 1]])), [[1, 2], [3, 1]])
+        self.assertRaises(ValueError, checker, np.array([1, 4]))
+
+        getter = processors.get_mapping({1: 'a', 2: 'b'})
+        np.testing.assert_equal(getter(np.array([[2, 1], [1, 1]])), [['b', 'a'], ['a', 'a']])
+        self.assertRaises(ValueError, getter, np.array([1, 4]))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import unittest
+from unittest import mock
+
+from lantz.drivers.legacy import rpc
+
+# Byte strings produced by xdrlib.Packer for the same calls.
+PACKED = (
+    ('pack_uint', (1, ), b'\x00\x00\x00\x01'),
+    ('pack_int', (-2, ), b'\xff\xff\xff\xfe'),
+    ('pack_enum', (3, ), b'\x00\x00\x00\x03'),
+    ('pack_bool', (True, ), b'\x00\x00\x00\x01'),
+    ('pack_uhyper', (1 << 40, ), b'\x00\x00\x01\x00\x00\x00\x00\x00'),
+    ('pack_hyper', (-1, ), b'\xff\xff\xff\xff\xff\xff\xff\xff'),
+    ('pack_float', (1.5, ), b'\x3f\xc0\x00\x00'),
+    ('pack_double', (-2.5, ), b'\xc0\x04\x00\x00\x00\x00\x00\x00'),
+    ('pack_fstring', (3, b'abc'), b'abc\x00'),
+    ('pack_fopaque', (6, b'abc'), b'abc\x00\x00\x00\x00\x00'),
+    ('pack_string', (b'spam!', ), b'\x00\x00\x00\x05spam!\x00\x00\x00'),
+    ('pack_opaque', (b'', ), b'\x00\x00\x00\x00'),
+    ('pack_bytes', (b'eggs', ), b'\x00\x00\x00\x04eggs'),
+)
+
+
+class FakeSocket(object):
+    """Socket whose sendmsg writes at most max_sent bytes per call.
+    """
+
+    def __init__(self, max_sent):
+        self.max_sent = max_sent
+        self.data = bytearray()
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        sent = 0
+        for buffer in buffers:
+            chunk = bytes(buffer[:self.max_sent - sent])
+            self.data += chunk
+            sent += len(chunk)
+            if sent == self.max_sent:
+                break
+        return sent
+
+
+class XDRTest(unittest.TestCase):
+
+    def test_pack(self):
+        for name, args, expected in PACKED:
+            packer = rpc.XDRPacker()
+            getattr(packer, name)(*args)
+            self.assertEqual(packer.get_buf(), expected, name)
+
+    def test_unpack(self):
+        for name, args, expected in PACKED:
+            unpacker = rpc.XDRUnpacker(expected)
+            value = getattr(unpacker, 'un' + name)(*args[:-1])
+            unpacker.done()
+            if name == 'pack_fopaque':
+                self.assertEqual(bytes(value), b'abc\x00\x00\x00')
+            else:
+                self.assertEqual(bytes(value) if isinstance(value, memoryview) else value,
+                                 args[-1], name)
+
+    def test_lists(self):
+        packer = rpc.XDRPacker()
+        packer.pack_list([1, 2], packer.pack_uint)
+        packer.pack_array([3], packer.pack_int)
+        packer.pack_farray(2, [4, 5], packer.pack_uint)
+        data = packer.get_buf()
+        self.assertEqual(data, b'\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x02'
+                               b'\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x03'
+                               b'\x00\x00\x00\x04\x00\x00\x00\x05')
+
+        unpacker = rpc.XDRUnpacker(data)
+        self.assertEqual(unpacker.unpack_list(unpacker.unpack_uint), [1, 2])
+        self.assertEqual(unpacker.unpack_array(unpacker.unpack_int), [3])
+        self.assertEqual(unpacker.unpack_farray(2, unpacker.unpack_uint), [4, 5])
+        unpacker.done()
+
+    def test_unpack_errors(self):
+        unpacker = rpc.XDRUnpacker(b'\x00\x00\x00\x08abc\x00')
+        self.assertRaises(EOFError, unpacker.unpack_opaque)
+        unpacker = rpc.XDRUnpacker(b'\x00\x00\x00\x01\x00')
+        unpacker.unpack_uint()
+        self.assertRaises(rpc.RPCUnpackError, unpacker.done)
+
+    def test_opaque_view(self):
+        data = bytearray(b'\x00\x00\x00\x04spam')
+        value = rpc.XDRUnpacker(data).unpack_opaque()
+        self.assertIsInstance(value, memoryview)
+        data[4:8] = b'eggs'
+        self.assertEqual(bytes(value), b'eggs')
+
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = socket.socketpair()
+        self.addCleanup(self.sender.close)
+        self.addCleanup(self.receiver.close)
+
+    def test_fragments(self):
+        self.sender.sendall(b'\x00\x00\x00\x05hello' b'\x80\x00\x00\x06 world')
+        record = rpc.RecordReceiver(4).recv(self.receiver)
+        self.assertEqual(bytes(record), b'hello world')
+
+    def test_sendrecord_fragments(self):
+        with mock.patch.object(rpc, 'MAX_FRAGMENT', 4):
+            rpc.sendrecord(self.sender, b'0123456789')
+        self.assertEqual(rpc.recvfrag(self.receiver), (False, bytearray(b'0123')))
+        self.assertEqual(rpc.recvfrag(self.receiver), (False, bytearray(b'4567')))
+        self.assertEqual(rpc.recvfrag(self.receiver), (True, bytearray(b'89')))
+
+    def test_round_trip(self):
+        with mock.patch.object(rpc, 'MAX_FRAGMENT', 3):
+            rpc.sendrecord(self.sender, b'spam and eggs')
+        self.assertEqual(bytes(rpc.recvrecord(self.receiver)), b'spam and eggs')
+
+    def test_eof(self):
+        self.sender.sendall(b'\x80\x00\x00\x08spam')
+        self.sender.close()
+        self.assertRaises(EOFError, rpc.RecordReceiver().recv, self.receiver)
+
+    def test_buffer_reuse(self):
+        receiver = rpc.RecordReceiver(8)
+
+        rpc.sendrecord(self.sender, b'spam')
+        first = receiver.recv(self.receiver)
+        buffer = receiver.buffer
+
+        # The first record is alive, so the second goes to a new buffer.
+        rpc.sendrecord(self.sender, b'eggs')
+        second = receiver.recv(self.receiver)
+        self.assertIsNot(receiver.buffer, buffer)
+        self.assertEqual(bytes(first), b'spam')
+        self.assertEqual(bytes(second), b'eggs')
+
+        # Once released, the buffer is reused and grown if needed.
+        buffer = receiver.buffer
+        first.release()
+        second.release()
+        rpc.sendrecord(self.sender, b'spam and eggs')
+        third = receiver.recv(self.receiver)
+        self.assertIs(receiver.buffer, buffer)
+        self.assertEqual(bytes(third), b'spam and eggs')
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.
+
+    def monotonic(self):
+        return self.now
+
+
+class FakePortMapper(object):
+
+    ports = {}
+    lookups = []
+
+    def __init__(self, host):
+        self.host = host
+
+    def get_port(self, mapping):
+        self.lookups.append((self.host, mapping))
+        return self.ports.get((self.host, mapping[0]), 0)
+
+    def close(self):
+        pass
+
+
+class PortCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        FakePortMapper.ports = {('host', 1): 1234, ('other', 1): 4321}
+        FakePortMapper.lookups = []
+        for name, value in (('time', self.clock),
+                            ('TCPPortMapperClient', FakePortMapper),
+                            ('UDPPortMapperClient', FakePortMapper),
+                            ('PORT_CACHE_TTL', 60.)):
+            patcher = mock.patch.object(rpc, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        rpc.clear_port_cache()
+        self.addCleanup(rpc.clear_port_cache)
+
+    def test_cached(self):
+        self.assertEqual(rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP), 1234)
+        self.clock.now += 59.
+        self.assertEqual(rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP), 1234)
+        self.assertEqual(FakePortMapper.lookups, [('host', (1, 2, rpc.IPPROTO_TCP, 0))])
+
+    def test_keys(self):
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP)
+        self.assertEqual(rpc.get_port('other', 1, 2, rpc.IPPROTO_TCP), 4321)
+        rpc.get_port('host', 1, 3, rpc.IPPROTO_TCP)
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_UDP)
+        self.assertEqual(len(FakePortMapper.lookups), 4)
+
+    def test_expired(self):
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP)
+        self.clock.now += 60.
+        FakePortMapper.ports[('host', 1)] = 5678
+        self.assertEqual(rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP), 5678)
+        self.assertEqual(len(FakePortMapper.lookups), 2)
+        self.clock.now += 30.
+        self.assertEqual(rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP), 5678)
+        self.assertEqual(len(FakePortMapper.lookups), 2)
+
+    def test_disabled(self):
+        rpc.PORT_CACHE_TTL = 0
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP)
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP)
+        self.assertEqual(len(FakePortMapper.lookups), 2)
+
+    def test_forget(self):
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP)
+        rpc.get_port('other', 1, 2, rpc.IPPROTO_TCP)
+        rpc.forget_port('host', 1, 2, rpc.IPPROTO_TCP)
+        rpc.get_port('host', 1, 2, rpc.IPPROTO_TCP)
+        rpc.get_port('other', 1, 2, rpc.IPPROTO_TCP)
+        self.assertEqual(len(FakePortMapper.lookups), 3)
+        rpc.clear_port_cache()
+        rpc.get_port('other', 1, 2, rpc.IPPROTO_TCP)
+        self.assertEqual(len(FakePortMapper.lookups), 4)
+
+    def test_not_registered(self):
+        self.assertRaises(rpc.RPCError, rpc.get_port, 'host', 9, 2, rpc.IPPROTO_TCP)
+        self.assertRaises(rpc.RPCError, rpc.get_port, 'host', 9, 2, rpc.IPPROTO_TCP)
+        self.assertEqual(len(FakePortMapper.lookups), 2)
+
+    def test_stale_port(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        self.addCleanup(listener.close)
+        stale = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        stale.bind(('127.0.0.1', 0))
+        FakePortMapper.ports = {('127.0.0.1', 1): stale.getsockname()[1]}
+        rpc.get_port('127.0.0.1', 1, 2, rpc.IPPROTO_TCP)
+        stale.close()
+
+        FakePortMapper.ports = {('127.0.0.1', 1): listener.getsockname()[1]}
+        client = rpc.TCPClient('127.0.0.1', 1, 2)
+        self.addCleanup(client.close)
+        self.assertEqual(client.port, listener.getsockname()[1])
+        self.assertEqual(len(FakePortMapper.lookups), 2)
+
+
+class SendTest(unittest.TestCase):
+
+    def test_short_writes(self):
+        sock = FakeSocket(3)
+        rpc._sendall(sock, (b'\x00\x01', b'', b'spam', bytearray(b'eggs')))
+        self.assertEqual(sock.data, b'\x00\x01spameggs')
+        self.assertEqual(sock.calls, 4)
+
+    def test_short_write_within_buffer(self):
+        sock = FakeSocket(1)
+        rpc.sendfrag(sock, True, b'ab')
+        self.assertEqual(sock.data, b'\x80\x00\x00\x02ab')
+        self.assertEqual(sock.calls, 6)
+
+    def test_no_sendmsg(self):
+        sock = mock.Mock(spec=['sendall'])
+        rpc._sendall(sock, (b'spam', memoryview(b'eggs')))
+        sock.sendall.assert_called_once_with(b'spameggs')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+import unittest
+
+try:
+    from lantz.drivers.legacy.serial import SerialDriver, LantzSerialTimeoutError
+    from serial import SerialTimeoutException
+except ImportError:
+    SerialDriver = None
+
+from lantz.errors import LantzTimeoutError
+from lantz.testsuite.test_driver import driver_log
+
+
+class FakeSerial(object):
+    """Port receiving the bytes given to feed. respond is called
+    with the bytes written, and the bytes it returns are fed.
+    """
+
+    def __init__(self, timeout=1):
+        self.timeout = timeout
+        self.port = 'fake'
+        self.opened = True
+        self.respond = None
+        self.written = []
+        self.reads = 0
+        self.polls = 0
+        self.cancelled = 0
+        self._received = bytearray()
+        self._error = None
+        self._cancel = False
+        self._ready = threading.Condition()
+
+    def feed(self, data):
+        with self._ready:
+            self._received += data
+            self._ready.notify_all()
+
+    def fail(self, error):
+        with self._ready:
+            self._error = error
+            self._ready.notify_all()
+
+    def inWaiting(self):
+        with self._ready:
+            self.polls += 1
+            return len(self._received)
+
+    def read(self, size=1):
+        with self._ready:
+            self.reads += 1
+            self._ready.wait_for(lambda: self._received or self._error or self._cancel, self.timeout)
+            if self._error is not None:
+                raise self._error
+            self._cancel = False
+            data = bytes(self._received[:size])
+            del self._received[:size]
+            return data
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        if self.respond is not None:
+            reply = self.respond(data)
+            if reply:
+                self.feed(reply)
+        return len(data)
+
+    def cancel_read(self):
+        with self._ready:
+            self.cancelled += 1
+            self._cancel = True
+            self._ready.notify_all()
+
+    def isOpen(self):
+        return self.opened
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+
+if SerialDriver is not None:
+
+    class Device(SerialDriver):
+
+        RECV_TERMINATION = '\n'
+        SEND_TERMINATION = '\n'
+
+    class PrefixDevice(Device):
+
+        def is_unsolicited(self, frame):
+            return frame.startswith('!')
+
+
+@unittest.skipIf(SerialDriver is None, 'PySerial is not installed')
+class SerialTest(unittest.TestCase):
+
+    def make(self, cls=None, timeout=1, reader=False):
+        inst = (cls or Device)(port='fake', timeout=timeout)
+        inst.serial = FakeSerial(timeout)
+        if reader:
+            inst.start_reader()
+            self.addCleanup(inst.stop_reader)
+        return inst
+
+    def feed_later(self, port, *chunks):
+        def feed():
+            for chunk in chunks:
+                time.sleep(.02)
+                port.feed(chunk)
+        thread = threading.Thread(target=feed)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_raw_recv(self):
+        inst = self.make()
+        inst.serial.feed(b'spam')
+        self.assertEqual(inst.raw_recv(-1), b'spam')
+        reads = inst.serial.reads
+        self.assertEqual(inst.raw_recv(-1), b'')
+        self.assertEqual(inst.serial.reads, reads)
+        inst.serial.feed(b'eggs')
+        self.assertEqual(inst.raw_recv(2), b'eg')
+        self.assertEqual(inst.raw_recv(0), b'g')
+
+    def test_recv(self):
+        inst = self.make()
+        inst.serial.feed(b'spam\neggs\n')
+        self.assertEqual(inst.recv(), 'spam')
+        self.assertEqual(inst.recv(), 'eggs')
+
+        inst.serial.feed(b'sp')
+        self.feed_later(inst.serial, b'am', b'\n')
+        self.assertEqual(inst.recv(), 'spam')
+        # Waiting for the bytes instead of spinning.
+        self.assertLess(inst.serial.polls, 10)
+
+    def test_recv_timeout(self):
+        inst = self.make(timeout=.05)
+        inst.serial.feed(b'spam')
+        self.assertRaises(LantzTimeoutError, inst.recv)
+
+    def test_query(self):
+        inst = self.make(reader=True)
+        inst.serial.respond = lambda data: b'ok\n' if data == b'*IDN?\n' else None
+        self.assertEqual(inst.query('*IDN?'), 'ok')
+        self.assertEqual(inst.serial.written, [b'*IDN?\n'])
+        self.assertEqual(inst._expected, 0)
+        self.assertFalse(inst._replies)
+
+    def test_split_frames(self):
+        inst = self.make(PrefixDevice, reader=True)
+        frames = queue.Queue()
+        inst.subscribe(frames.put)
+        inst.serial.respond = lambda data: self.feed_later(inst.serial, b'o', b'k\n!ev', b'ent\n')
+        self.assertEqual(inst.query('*IDN?'), 'ok')
+        self.assertEqual(frames.get(timeout=5), '!event')
+        self.assertEqual(inst._expected, 0)
+
+    def test_unsolicited(self):
+        inst = self.make(reader=True)
+        frames = queue.Queue()
+        inst.subscribe(frames.put)
+        inst.serial.feed(b'event\n')
+        self.assertEqual(frames.get(timeout=5), 'event')
+        self.assertFalse(inst._replies)
+
+        inst.serial.respond = lambda data: b'ok\n'
+        self.assertEqual(inst.query('*IDN?'), 'ok')
+        self.assertTrue(frames.empty())
+
+    def test_reply_before_recv(self):
+        inst = self.make(PrefixDevice, reader=True)
+        inst.serial.feed(b'early\n')
+        tic = time.monotonic()
+        while not inst._replies and time.monotonic() - tic < 5:
+            time.sleep(.01)
+        self.assertEqual(inst.recv(), 'early')
+        self.assertEqual(inst._expected, 0)
+
+    def test_timeout(self):
+        inst = self.make(timeout=.05, reader=True)
+        frames = queue.Queue()
+        inst.subscribe(frames.put)
+        self.assertRaises(LantzTimeoutError, inst.query, '*IDN?')
+        self.assertEqual(inst._expected, 0)
+        # A late reply is no longer expected.
+        inst.serial.feed(b'late\n')
+        self.assertEqual(frames.get(timeout=5), 'late')
+        self.assertFalse(inst._replies)
+
+    def test_send_error(self):
+        inst = self.make(reader=True)
+
+        def respond(data):
+            raise SerialTimeoutException('Write timeout')
+
+        inst.serial.respond = respond
+        self.assertRaises(LantzSerialTimeoutError, inst.query, '*IDN?')
+        self.assertEqual(inst._expected, 0)
+
+    def test_callback_error(self):
+        inst = self.make(reader=True)
+        frames = queue.Queue()
+
+        def fail(frame):
+            raise ValueError('bad frame')
+
+        inst.subscribe(fail)
+        inst.subscribe(frames.put)
+        with driver_log(logging.ERROR) as hdl:
+            inst.serial.feed(b'event\n')
+            self.assertEqual(frames.get(timeout=5), 'event')
+        self.assertTrue(any('bad frame' in message for message in hdl.history))
+        self.assertTrue(inst._reader.is_alive())
+
+        inst.unsubscribe(fail)
+        inst.unsubscribe(frames.put)
+        self.assertEqual(inst._subscribers, ())
+
+    def test_stop_reader(self):
+        inst = self.make(reader=True)
+        reader = inst._reader
+        self.assertTrue(reader.is_alive())
+        inst.stop_reader()
+        self.assertIsNone(inst._reader)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(inst.serial.cancelled, 1)
+
+        # recv reads the port again.
+        inst.serial.feed(b'spam\n')
+        self.assertEqual(inst.recv(), 'spam')
+
+    def test_read_error(self):
+        inst = self.make(reader=True)
+        reader = inst._reader
+        with driver_log(logging.ERROR) as hdl:
+            inst.serial.fail(OSError('port closed'))
+            reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertTrue(any('port closed' in message for message in hdl.history))
+
+    def test_initialize(self):
+        inst = self.make()
+        inst.background_reader = True
+        inst.serial.opened = False
+        inst.initialize()
+        reader = inst._reader
+        self.assertTrue(inst.is_open())
+        self.assertTrue(reader.is_alive())
+        inst.finalize()
+        self.assertFalse(inst.is_open())
+        self.assertFalse(reader.is_alive())
+
+    def test_requires_termination(self):
+        inst = self.make(SerialDriver)
+        self.assertRaises(ValueError, inst.start_reader)
+        self.assertIsNone(inst._reader)
+
+
+if __name__ == '__main__':
+    unittest.main()
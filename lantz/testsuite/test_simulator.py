@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import unittest
+
+# The simulators configure the root logger when imported.
+_root = logging.getLogger()
+_handlers, _level = _root.handlers[:], _root.level
+from lantz.simulators import instrument
+from lantz.simulators.instrument import InstrumentHandler, SimError
+from lantz.simulators.fungen import SimFunctionGenerator
+from lantz.simulators.voltmeter import SimVoltmeter
+_root.handlers[:] = _handlers
+_root.setLevel(_level)
+
+
+# Replies of the former if/elif dispatch, in order.
+FUNGEN_REPLIES = (
+    ('?IDN', 'FunctionGenerator Serial #12345'),
+    ('?AMP', '0.0000'),
+    ('!AMP 1.5', 'OK'),
+    ('?AMP', '1.5000'),
+    ('!AMP 20', 'ERROR'),
+    ('?AMP', '1.5000'),
+    ('?WVF', '0'),
+    ('!WVF 2', 'OK'),
+    ('?WVF', '2'),
+    ('!WVF 7', 'ERROR'),
+    ('?FRE', '1000.0000'),
+    ('!FRE 12.5', 'OK'),
+    ('?fre', '12.5000'),
+    ('?DOU 3', '0'),
+    ('!DOU 3 1', 'OK'),
+    ('?DOU 3', '1'),
+    ('?DIN 1', '0'),
+    ('?DOU', 'ERROR'),
+    ('!OUT 1', 'OK'),
+    ('?OUT', '1'),
+    ('!TES 1 2', 'OK'),
+    ('?TES 1', 'ERROR'),
+    ('!TES', 'ERROR'),
+    ('!CAL', 'OK'),
+    ('?MEAS 0', 'ERROR'),
+    ('?XYZ', 'ERROR'),
+    ('xAMP', 'ERROR'),
+    ('?', 'ERROR'),
+    ('', 'ERROR'),
+)
+
+VOLTMETER_REPLIES = (
+    ('?IDN', 'Simple DC Voltmeter #54321'),
+    ('?RANGE 0', '4'),
+    ('!RANGE 1 2', 'OK'),
+    ('?RANGE 1', '2'),
+    ('?MEAS 0', '1.0000'),
+    ('?MEAS 1', '2.0000'),
+    ('?MEAS 3', 'ERROR'),
+    ('!ARANGE 1', 'OK'),
+    ('!TES', 'OK'),
+    ('!CAL', 'OK'),
+    ('?AMP', 'ERROR'),
+)
+
+
+class Handler(InstrumentHandler):
+
+    def __init__(self):
+        self.count = 3
+        self._level = 0.5
+        self.name = 'spam'
+        self.channels = {1: 0.0, 2: 0.0}
+        self.channels_key_convert = int
+        self.calls = []
+
+    @property
+    def level(self):
+        return self._level
+
+    @level.setter
+    def level(self, value):
+        if value < 0:
+            raise SimError
+        self._level = value
+
+    @property
+    def version(self):
+        return 2
+
+    def add(self, a, b):
+        return int(a) + int(b)
+
+    def reset(self):
+        self.calls.append('reset')
+
+    def fail(self):
+        raise RuntimeError('broken')
+
+
+class SimulatorTest(unittest.TestCase):
+
+    def assertReplies(self, inst, replies):
+        for command, reply in replies:
+            self.assertEqual(inst.handle(command), reply, command)
+
+    def test_fungen(self):
+        self.assertReplies(SimFunctionGenerator(), FUNGEN_REPLIES)
+
+    def test_voltmeter(self):
+        self.assertReplies(SimVoltmeter(lambda: 1.0, lambda: 2.0), VOLTMETER_REPLIES)
+
+    def test_attribute(self):
+        inst = Handler()
+        self.assertReplies(inst, (('?COUNT', '3'), ('!COUNT 5', 'OK'), ('?count', '5'),
+                                  ('?NAME', 'spam'), ('!NAME eggs', 'OK'), ('?NAME', 'eggs'),
+                                  ('!COUNT 1.5', 'ERROR'), ('!COUNT', 'ERROR'), ('?COUNT', '5')))
+        self.assertEqual(inst.count, 5)
+
+    def test_property(self):
+        inst = Handler()
+        self.assertReplies(inst, (('?LEVEL', '0.5000'), ('!LEVEL 2', 'OK'), ('?LEVEL', '2.0000'),
+                                  ('!LEVEL -1', 'ERROR'), ('?LEVEL', '2.0000'),
+                                  ('?VERSION', '2'), ('!VERSION 3', 'ERROR')))
+
+    def test_dict(self):
+        inst = Handler()
+        self.assertReplies(inst, (('?CHANNELS 1', '0.0000'), ('!CHANNELS 2 1.5', 'OK'),
+                                  ('?CHANNELS 2', '1.5000'), ('?CHANNELS 3', 'ERROR'),
+                                  ('?CHANNELS x', 'ERROR'), ('!CHANNELS 1', 'ERROR'),
+                                  ('?CHANNELS', 'ERROR')))
+        self.assertEqual(inst.channels, {1: 0.0, 2: 1.5})
+
+    def test_method(self):
+        inst = Handler()
+        self.assertReplies(inst, (('?ADD 1 2', '3'), ('!ADD 1 2', 'OK'), ('?ADD 1', 'ERROR'),
+                                  ('!RESET', 'OK'), ('?RESET', 'OK')))
+        self.assertEqual(inst.calls, ['reset', 'reset'])
+
+    def test_method_error(self):
+        inst = Handler()
+        logging.disable(logging.CRITICAL)
+        try:
+            self.assertEqual(inst.handle('!FAIL'), 'ERROR')
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def test_unknown(self):
+        inst = Handler()
+        self.assertReplies(inst, (('?SPAM', 'ERROR'), ('!SPAM 1', 'ERROR'), ('', 'ERROR'),
+                                  ('  ', 'ERROR'), ('?', 'ERROR'), ('*COUNT', 'ERROR')))
+
+    def test_class_commands(self):
+        commands = instrument._class_commands(Handler)
+        Handler().handle('?LEVEL')
+        self.assertIs(instrument._class_commands(Handler), commands)
+        self.assertEqual(sorted(name for name in commands if not name.startswith('_')),
+                         ['add', 'dispatch', 'fail', 'handle', 'level', 'reset', 'version'])
+        self.assertNotIn('count', commands)
+        # Bound to each instance at call time.
+        first, second = Handler(), Handler()
+        first.handle('!LEVEL 3')
+        self.assertEqual(second.handle('?LEVEL'), '0.5000')
+
+    def test_attribute_kind_change(self):
+        inst = Handler()
+        self.assertEqual(inst.handle('?COUNT'), '3')
+        inst.count = {1: 4}
+        inst.count_key_convert = int
+        self.assertEqual(inst.handle('?COUNT 1'), '4')
+        inst.count = 2.5
+        self.assertEqual(inst.handle('?COUNT'), '2.5000')
+
+    def test_conversion(self):
+
+        class Quoted(Handler):
+            CONVERSION = {float: '{:.4f}', int: '{:d}', str: '<{}>'}
+
+        inst = Quoted()
+        self.assertReplies(inst, (('?NAME', '<spam>'), ('!NAME eggs', '<OK>'),
+                                  ('?SPAM', '<ERROR>'), ('?COUNT', '3')))
+
+if __name__ == '__main__':
+    unittest.main()
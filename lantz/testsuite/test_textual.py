@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz import Driver
+from lantz.drivers.legacy.textual import TextualMixin
+
+
+class FakeTextual(TextualMixin, Driver):
+
+    RECV_TERMINATION = '\n'
+    RECV_CHUNK = 1024
+
+    def __init__(self, chunks=()):
+        super().__init__()
+        self.chunks = list(chunks)
+        self.sizes = []
+
+    def raw_recv(self, size):
+        self.sizes.append(size)
+        return self.chunks.pop(0)
+
+
+class TextualTest(unittest.TestCase):
+
+    def test_single_chunk(self):
+        inst = FakeTextual([b'spam\n'])
+        self.assertEqual(inst.recv(), 'spam')
+        self.assertEqual(inst.sizes, [1024])
+
+    def test_split_termination(self):
+        inst = FakeTextual([b'spam\r', b'\neggs\r', b'\n'])
+        self.assertEqual(inst.recv(termination='\r\n'), 'spam')
+        self.assertEqual(inst.recv(termination='\r\n'), 'eggs')
+        self.assertEqual(inst.chunks, [])
+
+    def test_multibyte_termination(self):
+        inst = FakeTextual([b'sp', b'amEN', b'DeggsE', b'ND'])
+        self.assertEqual(inst.recv(termination='END'), 'spam')
+        self.assertEqual(inst.recv(termination='END'), 'eggs')
+        # A partial termination must not be found twice.
+        inst = FakeTextual([b'ENENDspamEND'])
+        self.assertEqual(inst.recv(termination='END'), 'EN')
+        self.assertEqual(inst.recv(termination='END'), 'spam')
+
+    def test_leftover(self):
+        inst = FakeTextual([b'one\ntwo\nthr', b'ee\n'])
+        self.assertEqual(inst.recv(), 'one')
+        self.assertEqual(inst.recv(), 'two')
+        self.assertEqual(len(inst.sizes), 1)
+        self.assertEqual(inst.recv(), 'three')
+        self.assertEqual(len(inst.sizes), 2)
+
+    def test_encoding(self):
+        inst = FakeTextual(['µ\n'.encode('utf-8')[:1], 'µ\n'.encode('utf-8')[1:]])
+        self.assertEqual(inst.recv(encoding='utf-8'), 'µ')
+
+    def test_eom(self):
+        inst = FakeTextual()
+        chunks = [(b'spa', False), (b'm', True), (b'eggs\nha', True), (b'm', True)]
+
+        def read():
+            return chunks.pop(0)
+
+        # The end of the message returns the bytes without termination.
+        self.assertEqual(inst._recv_message('\n', 'ascii', read), 'spam')
+        # The termination takes precedence and the rest is kept.
+        self.assertEqual(inst._recv_message('\n', 'ascii', read), 'eggs')
+        self.assertEqual(inst._recv_message('\n', 'ascii', read), 'ham')
+        self.assertEqual(chunks, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
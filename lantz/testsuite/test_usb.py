@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import array
+import errno
+import queue
+import threading
+import time
+import unittest
+
+try:
+    import usb
+    from lantz.drivers.legacy.usb import FrameRing, USBDriver, LantzUSBTimeoutError
+except ImportError:
+    usb = None
+
+from lantz import Driver
+from lantz.errors import InstrumentError
+
+
+def fill(ring, data):
+    frame = ring.next_free()
+    frame[:len(data)] = array.array('B', data)
+    ring.commit(len(data))
+
+
+class StreamEndpoint(object):
+    """IN endpoint returning the queued items, one per read: bytes are
+    received and exceptions raised. Without items, reads time out.
+    """
+
+    def __init__(self):
+        self.items = queue.Queue()
+        self.timeouts = 0
+
+    def read(self, buffer, timeout=None):
+        try:
+            item = self.items.get(timeout=timeout / 1000.)
+        except queue.Empty:
+            self.timeouts += 1
+            raise usb.core.USBError('Operation timed out', errno=errno.ETIMEDOUT)
+        if isinstance(item, Exception):
+            raise item
+        buffer[:len(item)] = array.array('B', item)
+        return len(item)
+
+
+if usb is not None:
+
+    class FakeUSB(USBDriver):
+
+        STREAM_TIMEOUT = 10
+
+        def __init__(self, endpoint):
+            Driver.__init__(self)
+            self.usb_recv_ep = endpoint
+            self.stream_buffer = None
+            self._stream = None
+            self._stream_stop = threading.Event()
+            self._stream_error = None
+
+
+@unittest.skipIf(usb is None, 'PyUSB is not installed')
+class FrameRingTest(unittest.TestCase):
+
+    def test_order(self):
+        ring = FrameRing(4, 8)
+        for data in (b'a', b'bc', b'def'):
+            fill(ring, data)
+        self.assertEqual(len(ring), 3)
+        self.assertEqual([bytes(ring.get()) for _ in range(3)], [b'a', b'bc', b'def'])
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.overflows, 0)
+
+    def test_wrap_around(self):
+        ring = FrameRing(3, 8)
+        for n in range(10):
+            fill(ring, bytes([n]))
+            self.assertEqual(bytes(ring.get()), bytes([n]))
+        self.assertEqual(ring.overflows, 0)
+
+    def test_overflow(self):
+        ring = FrameRing(3, 8)
+        for n in range(5):
+            fill(ring, bytes([n]))
+        self.assertEqual(ring.overflows, 2)
+        self.assertEqual(len(ring), 3)
+        self.assertEqual([bytes(ring.get()) for _ in range(3)], [b'\x02', b'\x03', b'\x04'])
+        self.assertIsNone(ring.get(0))
+
+    def test_frame_kept_while_reading(self):
+        ring = FrameRing(2, 8)
+        fill(ring, b'spam')
+        frame = ring.get()
+        for _ in range(5):
+            fill(ring, b'eggs')
+        self.assertEqual(bytes(frame), b'spam')
+        self.assertEqual(ring.overflows, 3)
+        frame.release()
+        self.assertEqual(bytes(ring.get()), b'eggs')
+
+    def test_timeout(self):
+        ring = FrameRing(2, 8)
+        tic = time.monotonic()
+        self.assertIsNone(ring.get(.05))
+        self.assertGreaterEqual(time.monotonic() - tic, .04)
+
+    def test_close(self):
+        ring = FrameRing(2, 8)
+        fill(ring, b'spam')
+        ring.close()
+        self.assertEqual(bytes(ring.get()), b'spam')
+        self.assertIsNone(ring.get())
+
+    def test_wake_up(self):
+        ring = FrameRing(2, 8)
+        got = []
+        waiting = threading.Thread(target=lambda: got.append(ring.get()))
+        waiting.start()
+        time.sleep(.05)
+        fill(ring, b'spam')
+        waiting.join(5)
+        self.assertEqual(bytes(got[0]), b'spam')
+
+        waiting = threading.Thread(target=lambda: got.append(ring.get()))
+        waiting.start()
+        time.sleep(.05)
+        ring.close()
+        waiting.join(5)
+        self.assertFalse(waiting.is_alive())
+        self.assertIsNone(got[1])
+
+
+@unittest.skipIf(usb is None, 'PyUSB is not installed')
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.endpoint = StreamEndpoint()
+        self.inst = FakeUSB(self.endpoint)
+        self.addCleanup(self.inst.stop_stream)
+
+    def wait_consumed(self, frames):
+        ring = self.inst.stream_buffer
+        tic = time.monotonic()
+        while ring.head < frames and time.monotonic() - tic < 5:
+            time.sleep(.01)
+        self.assertEqual(ring.head, frames)
+
+    def test_not_started(self):
+        self.assertRaises(InstrumentError, next, self.inst.iter_frames())
+        self.assertEqual(self.inst.stream_overflows, 0)
+
+    def test_stream(self):
+        self.inst.start_stream(frame_size=8, frames=4, endpoint=self.endpoint)
+        for data in (b'a', b'bc', b'def'):
+            self.endpoint.items.put(data)
+        frames = self.inst.iter_frames(timeout=5)
+        self.assertEqual([bytes(next(frames)) for _ in range(3)], [b'a', b'bc', b'def'])
+        self.inst.stop_stream()
+        self.assertEqual(list(frames), [])
+
+    def test_timeouts(self):
+        self.inst.start_stream(frame_size=8, frames=4, endpoint=self.endpoint)
+        time.sleep(.05)
+        self.assertGreater(self.endpoint.timeouts, 0)
+        self.endpoint.items.put(b'spam')
+        frames = self.inst.iter_frames(timeout=5)
+        self.assertEqual(bytes(next(frames)), b'spam')
+        self.assertTrue(self.inst._stream.is_alive())
+
+    def test_iter_timeout(self):
+        self.inst.start_stream(frame_size=8, frames=4, endpoint=self.endpoint)
+        self.assertRaises(LantzUSBTimeoutError, next, self.inst.iter_frames(timeout=.05))
+
+    def test_overflow(self):
+        self.inst.start_stream(frame_size=8, frames=2, endpoint=self.endpoint)
+        for n in range(5):
+            self.endpoint.items.put(bytes([n]))
+        self.wait_consumed(5)
+        self.assertEqual(self.inst.stream_overflows, 3)
+        frames = self.inst.iter_frames(timeout=5)
+        self.assertEqual([bytes(next(frames)) for _ in range(2)], [b'\x03', b'\x04'])
+
+    def test_stop_keeps_buffered(self):
+        self.inst.start_stream(frame_size=8, frames=4, endpoint=self.endpoint)
+        self.endpoint.items.put(b'spam')
+        self.endpoint.items.put(b'eggs')
+        self.wait_consumed(2)
+        self.inst.stop_stream()
+        self.assertEqual([bytes(frame) for frame in self.inst.iter_frames()], [b'spam', b'eggs'])
+
+    def test_error(self):
+        self.inst.start_stream(frame_size=8, frames=4, endpoint=self.endpoint)
+        self.endpoint.items.put(b'spam')
+        self.endpoint.items.put(usb.core.USBError('Pipe error', errno=errno.EPIPE))
+        frames = self.inst.iter_frames(timeout=5)
+        self.assertEqual(bytes(next(frames)), b'spam')
+        self.assertRaises(InstrumentError, next, frames)
+        self.inst._stream.join(5)
+        self.assertFalse(self.inst._stream.is_alive())
+        self.assertTrue(self.inst.stream_buffer.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import array
+import logging
+import struct
+import unittest
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from lantz.drivers.legacy.usbtmc import USBTMCDriver, MSGID, HEADER_SIZE
+except ImportError:
+    USBTMCDriver = None
+
+from lantz import Driver
+from lantz.errors import InstrumentError
+from lantz.testsuite.test_driver import driver_log
+
+
+class FakeEndpoint(object):
+    """Bulk-OUT and Bulk-IN endpoints of a USBTMC device answering each
+    REQUEST_DEV_DEP_MSG_IN with the next bytes of message.
+
+    :param split: maximum number of bytes returned by each read, so that
+                  a bulk message is received in several reads.
+    """
+
+    def __init__(self, split=None):
+        self.message = b''
+        self.split = split
+        self.received = bytearray()
+        self.requests = []
+        self.pending = deque()
+        self.btag = None
+
+    def write(self, data, timeout=None):
+        data = bytes(data)
+        msgid, btag, size = data[0], data[1], struct.unpack_from('<L', data, 4)[0]
+        if msgid == MSGID.DEV_DEP_MSG_OUT:
+            self.received += data[HEADER_SIZE:HEADER_SIZE + size]
+        elif msgid == MSGID.REQUEST_DEV_DEP_MSG_IN:
+            self.requests.append(size)
+            chunk, self.message = self.message[:size], self.message[size:]
+            btag = btag if self.btag is None else self.btag
+            header = struct.pack('<BBBxLBxxx', MSGID.DEV_DEP_MSG_IN, btag, ~btag & 0xFF,
+                                 len(chunk), 0 if self.message else 1)
+            self.pending.append(header + chunk + bytes(-len(chunk) % 4))
+        return len(data)
+
+    def read(self, size_or_buffer, timeout=None):
+        message = self.pending[0]
+        if isinstance(size_or_buffer, int):
+            size = size_or_buffer
+        else:
+            size = len(size_or_buffer)
+        size = min(size, len(message), self.split or len(message))
+        data, self.pending[0] = message[:size], message[size:]
+        if not self.pending[0]:
+            self.pending.popleft()
+        if isinstance(size_or_buffer, int):
+            return array.array('B', data)
+        size_or_buffer[:size] = array.array('B', data)
+        return size
+
+
+if USBTMCDriver is not None:
+
+    class FakeTMC(USBTMCDriver):
+
+        RECV_CHUNK = 16
+
+        def __init__(self, endpoint):
+            Driver.__init__(self)
+            self.usb_send_ep = self.usb_recv_ep = endpoint
+            self._btag = 0
+
+
+@unittest.skipIf(USBTMCDriver is None, 'PyUSB is not installed')
+class USBTMCTest(unittest.TestCase):
+
+    def setUp(self):
+        self.endpoint = FakeEndpoint()
+        self.inst = FakeTMC(self.endpoint)
+
+    def test_send(self):
+        self.inst.send_bytes(b'x' * 40)
+        self.assertEqual(self.endpoint.received, b'x' * 40)
+        self.inst.send('*IDN?')
+        self.assertEqual(self.endpoint.received[40:], b'*IDN?')
+
+    def test_recv(self):
+        self.endpoint.message = b'spam and eggs and ham\n'
+        self.assertEqual(self.inst.recv(), 'spam and eggs and ham')
+        self.assertEqual(self.endpoint.requests, [16, 16])
+
+    def test_recv_bytes(self):
+        message = bytes(range(100))
+        self.endpoint.message = message
+        self.assertEqual(self.inst.recv_bytes(), message)
+        self.assertEqual(len(self.endpoint.requests), 7)
+
+    def test_recv_bytes_size(self):
+        self.endpoint.message = bytes(range(100))
+        self.assertEqual(self.inst.recv_bytes(20), bytes(range(20)))
+        self.assertEqual(self.endpoint.requests, [16, 4])
+        self.assertEqual(self.inst.recv_bytes(), bytes(range(20, 100)))
+
+    def test_recv_into_eom(self):
+        self.endpoint.message = bytes(range(40))
+        buffer = bytearray(100)
+        self.assertEqual(self.inst.recv_into(buffer), 40)
+        self.assertEqual(buffer[:40], bytes(range(40)))
+        self.assertEqual(self.endpoint.requests, [16, 16, 16])
+
+    def test_recv_into_pending(self):
+        self.endpoint.message = b'ab\nxyz'
+        self.assertEqual(self.inst.recv(), 'ab')
+        buffer = bytearray(2)
+        self.assertEqual(self.inst.recv_into(buffer), 2)
+        self.assertEqual(buffer, b'xy')
+        self.assertEqual(self.inst.recv_into(buffer), 1)
+        self.assertEqual(buffer[:1], b'z')
+        self.assertEqual(len(self.endpoint.requests), 1)
+
+    def test_recv_bytes_pending(self):
+        self.endpoint.message = b'ab\nxyz'
+        self.assertEqual(self.inst.recv(), 'ab')
+        self.assertEqual(self.inst.recv_bytes(), b'xyz')
+        self.assertEqual(len(self.endpoint.requests), 1)
+
+        self.endpoint.message = bytes(range(40))
+        self.inst.RECV_CHUNK = 64
+        self.assertEqual(self.inst.recv(termination='\x05'), '\x00\x01\x02\x03\x04')
+        self.inst.RECV_CHUNK = 16
+        self.assertEqual(self.inst.recv_bytes(), bytes(range(6, 40)))
+        self.assertEqual(len(self.endpoint.requests), 2)
+
+    def test_split_reads(self):
+        self.inst.RECV_CHUNK = 64
+        self.endpoint.split = 16
+        message = bytes(range(150))
+        self.endpoint.message = message
+        self.assertEqual(self.inst.recv_bytes(), message)
+
+    def test_wrong_btag(self):
+        self.endpoint.btag = 200
+        self.endpoint.message = b'spam\n'
+        self.assertRaises(InstrumentError, self.inst.recv_bytes)
+
+    def test_recv_block(self):
+        data = bytes(range(50))
+        self.endpoint.message = b'#250' + data + b'\n'
+        self.assertEqual(self.inst.recv_block(), data)
+        self.assertEqual(self.endpoint.message, b'')
+        self.assertEqual(self.endpoint.requests, [16, 16, 16, 6, 16])
+
+    def test_recv_block_pending(self):
+        self.endpoint.message = b'OK\n#15hello\n'
+        self.assertEqual(self.inst.recv(), 'OK')
+        self.assertEqual(self.inst.recv_block(), b'hello')
+        self.assertEqual(len(self.endpoint.requests), 1)
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_recv_block_dtype(self):
+        data = np.arange(20, dtype='<f4')
+        self.endpoint.message = b'#280' + data.tobytes() + b'\n'
+        np.testing.assert_array_equal(self.inst.recv_block('<f4'), data)
+
+    def test_recv_block_errors(self):
+        self.endpoint.message = b'#A1234\n'
+        self.assertRaises(InstrumentError, self.inst.recv_block)
+        self.endpoint.message = b'1234\n'
+        self.assertRaises(InstrumentError, self.inst.recv_block)
+        self.endpoint.message = b'#220abc\n'
+        self.assertRaises(InstrumentError, self.inst.recv_block)
+
+    def test_log(self):
+        with driver_log(logging.DEBUG) as hdl:
+            self.endpoint.message = b'spam'
+            self.inst.recv_bytes()
+            self.endpoint.message = b'eggs'
+            buffer = bytearray(10)
+            self.inst.recv_into(buffer)
+            self.endpoint.message = b'#13ham'
+            self.inst.recv_block()
+        self.assertEqual(hdl.history, ["Received bytearray(b'spam')",
+                                       "Received b'eggs'",
+                                       "Received block bytearray(b'ham')"])
+        # The record did not keep the buffer exported.
+        buffer.append(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
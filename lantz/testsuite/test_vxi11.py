@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import struct
+import threading
+import unittest
+from unittest import mock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lantz.drivers.legacy import rpc, vxi11
+from lantz.drivers.legacy.vxi11 import Vxi11Driver, Vxi11Error
+
+
+class FakeDevice(rpc.TCPServer):
+    """VXI-11 core channel of an instrument answering device_read with the
+    bytes of message, at most max_reply bytes per reply. A device_read after
+    the end of the message is answered with an I/O timeout error (a real
+    instrument would wait for io_timeout) and counted in late_reads.
+    """
+
+    def __init__(self):
+        super().__init__('127.0.0.1', vxi11.DEVICE_CORE_PROG, vxi11.DEVICE_CORE_VERS, 0)
+        self.port = self.sock.getsockname()[1]
+        self.message = b''
+        self.position = 0
+        self.max_reply = 1 << 20
+        self.reads = []
+        self.late_reads = 0
+        self.written = bytearray()
+        self.links = 0
+        self.destroyed = []
+        self.intr = None
+        self.intr_error = 0
+        self.srq_handle = None
+
+    def addpackers(self):
+        self.packer = vxi11.Vxi11Packer()
+        self.unpacker = vxi11.Vxi11Unpacker(b'')
+
+    def serve(self):
+        while True:
+            try:
+                connection = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self.session, args=(connection, ), daemon=True).start()
+
+    def session(self, connection):
+        sock = connection[0]
+        with sock:
+            while True:
+                try:
+                    call = rpc.recvrecord(sock)
+                    reply = self.handle(call)
+                    if reply is not None:
+                        rpc.sendrecord(sock, reply)
+                except (EOFError, OSError):
+                    break
+
+    def set_message(self, message):
+        self.message = message
+        self.position = 0
+
+    def handle_10(self):
+        u = self.unpacker
+        u.unpack_int(), u.unpack_bool(), u.unpack_uint(), u.unpack_string()
+        self.turn_around()
+        self.links += 1
+        p = self.packer
+        p.pack_int(0), p.pack_int(self.links), p.pack_uint(0), p.pack_uint(64)
+
+    def handle_11(self):
+        u = self.unpacker
+        u.unpack_int(), u.unpack_uint(), u.unpack_uint(), u.unpack_int()
+        data = u.unpack_opaque().tobytes()
+        self.turn_around()
+        self.written += data
+        self.packer.pack_int(0)
+        self.packer.pack_uint(len(data))
+
+    def handle_12(self):
+        u = self.unpacker
+        u.unpack_int()
+        size = u.unpack_uint()
+        u.unpack_uint(), u.unpack_uint(), u.unpack_int(), u.unpack_int()
+        self.turn_around()
+        self.reads.append(size)
+        p = self.packer
+        if self.position >= len(self.message):
+            self.late_reads += 1
+            p.pack_int(vxi11.ERROR_CODES.IO_TIMEOUT), p.pack_int(0), p.pack_opaque(b'')
+            return
+        chunk = self.message[self.position:self.position + min(size, self.max_reply)]
+        self.position += len(chunk)
+        reason = vxi11.RX_END if self.position >= len(self.message) else 0
+        p.pack_int(0), p.pack_int(reason), p.pack_opaque(chunk)
+
+    def handle_23(self):
+        self.destroyed.append(self.unpacker.unpack_int())
+        self.turn_around()
+        self.packer.pack_int(0)
+
+    def handle_20(self):
+        u = self.unpacker
+        u.unpack_int()
+        enable = u.unpack_bool()
+        handle = u.unpack_opaque().tobytes()
+        self.turn_around()
+        self.srq_handle = handle if enable else None
+        self.packer.pack_int(0)
+
+    def handle_25(self):
+        u = self.unpacker
+        host_addr, host_port = u.unpack_uint(), u.unpack_uint()
+        u.unpack_uint(), u.unpack_uint(), u.unpack_int()
+        self.turn_around()
+        self.packer.pack_int(self.intr_error)
+        if not self.intr_error:
+            host = socket.inet_ntoa(struct.pack('!I', host_addr))
+            self.intr = rpc.RawTCPClient(host, vxi11.DEVICE_INTR_PROG, vxi11.DEVICE_INTR_VERS, host_port)
+            self.intr.packer = rpc.Packer()
+            self.intr.unpacker = rpc.Unpacker(b'')
+
+    def handle_26(self):
+        self.turn_around()
+        self.packer.pack_int(0)
+        self.intr.close()
+        self.intr = None
+
+    def fire_srq(self):
+        """Send a device_intr_srq call through the interrupt channel.
+        """
+        self.intr.make_call(vxi11.DEVICE_INTR_SRQ, self.srq_handle, self.intr.packer.pack_opaque, None)
+
+
+class FakeClock(object):
+    """Replaces the time module of another module with a clock set by the test.
+    """
+
+    def __init__(self):
+        self.now = 1000.
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeClient(object):
+    """Core channel client of a link, connected to the peer socket.
+    """
+
+    def __init__(self, fail=None):
+        self.sock, self.peer = socket.socketpair()
+        self.destroyed = []
+        self.closed = False
+        self.fail = fail
+
+    def destroy_link(self, link):
+        self.destroyed.append(link)
+        if self.fail is not None:
+            raise self.fail
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        self.peer.close()
+
+
+class LinkPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(vxi11, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = vxi11.LinkPool(max_idle=10.)
+        self.addCleanup(self.pool.clear)
+
+    def client(self, **kwargs):
+        client = FakeClient(**kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_is_open(self):
+        client = self.client()
+        self.assertTrue(vxi11._is_open(client.sock))
+        client.peer.sendall(b'x')
+        self.assertTrue(vxi11._is_open(client.sock))
+        self.assertEqual(client.sock.recv(1), b'x')
+        client.sock.settimeout(2.)
+        client.peer.close()
+        self.assertFalse(vxi11._is_open(client.sock))
+        self.assertEqual(client.sock.gettimeout(), 2.)
+        client.sock.close()
+        self.assertFalse(vxi11._is_open(client.sock))
+
+    def test_reuse(self):
+        client = self.client()
+        self.assertIsNone(self.pool.acquire('host', 'inst0'))
+        self.pool.release('host', 'inst0', client, 7, 1024)
+        self.assertIsNone(self.pool.acquire('host', 'inst1'))
+        self.assertEqual(self.pool.acquire('host', 'inst0'), (client, 7, 1024))
+        self.assertIsNone(self.pool.acquire('host', 'inst0'))
+        self.assertEqual(client.destroyed, [])
+
+    def test_last_released_first(self):
+        first, second = self.client(), self.client()
+        self.pool.release('host', 'inst0', first, 1, 1024)
+        self.pool.release('host', 'inst0', second, 2, 1024)
+        self.assertEqual(self.pool.acquire('host', 'inst0')[1], 2)
+        self.assertEqual(self.pool.acquire('host', 'inst0')[1], 1)
+
+    def test_dead_link(self):
+        alive, dead = self.client(), self.client()
+        self.pool.release('host', 'inst0', alive, 1, 1024)
+        self.pool.release('host', 'inst0', dead, 2, 1024)
+        dead.peer.close()
+        self.assertEqual(self.pool.acquire('host', 'inst0'), (alive, 1, 1024))
+        self.assertEqual(dead.destroyed, [2])
+        self.assertTrue(dead.closed)
+        self.assertFalse(alive.closed)
+
+    def test_expired(self):
+        old, new = self.client(), self.client()
+        self.pool.release('host', 'inst0', old, 1, 1024)
+        self.clock.now += 8.
+        self.pool.release('host', 'inst1', new, 2, 1024)
+        self.clock.now += 5.
+        self.assertIsNone(self.pool.acquire('host', 'inst0'))
+        self.assertEqual(old.destroyed, [1])
+        self.assertTrue(old.closed)
+        self.assertEqual(self.pool.acquire('host', 'inst1'), (new, 2, 1024))
+
+    def test_expired_on_release(self):
+        old, new = self.client(), self.client()
+        self.pool.release('host', 'inst0', old, 1, 1024)
+        self.clock.now += 11.
+        self.pool.release('host', 'inst1', new, 2, 1024)
+        self.assertTrue(old.closed)
+        self.assertFalse(new.closed)
+
+    def test_clear(self):
+        clients = [self.client(), self.client(fail=EOFError()), self.client(fail=OSError())]
+        for link, client in enumerate(clients):
+            self.pool.release('host', 'inst{}'.format(link), client, link, 1024)
+        self.pool.clear()
+        for link, client in enumerate(clients):
+            self.assertEqual(client.destroyed, [link])
+            self.assertTrue(client.closed)
+        self.assertIsNone(self.pool.acquire('host', 'inst0'))
+
+
+class Vxi11Test(unittest.TestCase):
+
+    def setUp(self):
+        self.device = FakeDevice()
+        self.addCleanup(self.device.sock.close)
+        self.device.sock.listen(5)
+        threading.Thread(target=self.device.serve, daemon=True).start()
+        patcher = mock.patch.object(rpc, 'get_port', return_value=self.device.port)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(vxi11.LINK_POOL.clear)
+
+    def driver(self, **kwargs):
+        inst = Vxi11Driver('127.0.0.1', **kwargs)
+        inst.initialize()
+        self.addCleanup(lambda: inst.client is not None and inst.finalize())
+        return inst
+
+    def count_in_flight(self, inst):
+        """Record the largest number of calls in flight of a driver.
+        """
+        client = inst.client
+        send_call, recv_reply = client.send_call, client.recv_reply
+        counts = {'now': 0, 'max': 0}
+
+        def counted_send(*args):
+            counts['now'] += 1
+            counts['max'] = max(counts['max'], counts['now'])
+            return send_call(*args)
+
+        def counted_recv(*args):
+            counts['now'] -= 1
+            return recv_reply(*args)
+
+        client.send_call, client.recv_reply = counted_send, counted_recv
+        return counts
+
+    def test_write(self):
+        inst = self.driver()
+        inst.write_raw(b'x' * 150)
+        self.assertEqual(self.device.written, b'x' * 150)
+
+    def test_read_raw(self):
+        inst = self.driver()
+        self.device.set_message(b'spam and eggs')
+        self.assertEqual(inst.read_raw(), b'spam and eggs')
+        self.assertEqual(self.device.late_reads, 0)
+
+    def test_read_raw_limit(self):
+        inst = self.driver()
+        self.device.set_message(b'spam and eggs')
+        self.assertEqual(inst.read_raw(4), b'spam')
+        self.assertEqual(self.device.reads, [4])
+        self.assertEqual(inst.read_raw(), b' and eggs')
+
+    def test_read_raw_short_reply(self):
+        inst = self.driver()
+        inst.READ_CHUNK = 100
+        self.device.max_reply = 30
+        self.device.set_message(bytes(range(200)))
+        self.assertEqual(inst.read_raw(1 << 20), bytes(range(200)))
+        self.assertEqual(self.device.late_reads, 0)
+
+    def test_read_into_short_reply(self):
+        inst = self.driver()
+        inst.READ_CHUNK = 100
+        self.device.max_reply = 30
+        self.device.set_message(bytes(range(200)))
+        counts = self.count_in_flight(inst)
+        buffer = bytearray(1000)
+        self.assertEqual(inst.read_into(buffer), 200)
+        self.assertEqual(buffer[:200], bytes(range(200)))
+        self.assertEqual(self.device.late_reads, 0)
+        self.assertEqual(counts['max'], 1)
+
+    def test_read_into_exact(self):
+        inst = self.driver()
+        inst.READ_CHUNK = 100
+        self.device.max_reply = 70
+        message = bytes(range(256)) * 4
+        self.device.set_message(message)
+        counts = self.count_in_flight(inst)
+        buffer = bytearray(len(message))
+        self.assertEqual(inst.read_into(buffer, exact=True), len(message))
+        self.assertEqual(buffer, message)
+        self.assertEqual(self.device.late_reads, 0)
+        self.assertEqual(counts['max'], inst.PIPELINE_DEPTH)
+
+    def test_read_block(self):
+        inst = self.driver()
+        inst.READ_CHUNK = 100
+        data = bytes(range(256)) * 4
+        self.device.set_message(b'#41024' + data + b'\n')
+        counts = self.count_in_flight(inst)
+        self.assertEqual(inst.read_block(), data)
+        self.assertEqual(self.device.late_reads, 0)
+        self.assertEqual(counts['max'], inst.PIPELINE_DEPTH)
+        self.assertEqual(self.device.position, len(self.device.message))
+
+    def test_read_block_ended(self):
+        inst = self.driver()
+        self.device.set_message(b'#15hello')
+        self.assertEqual(inst.read_block(), b'hello')
+        self.assertEqual(self.device.late_reads, 0)
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_read_block_dtype(self):
+        inst = self.driver()
+        data = np.arange(10, dtype='<u2')
+        self.device.set_message(b'#220' + data.tobytes() + b'\n')
+        np.testing.assert_array_equal(inst.read_block('<u2'), data)
+
+    def test_read_block_errors(self):
+        inst = self.driver()
+        self.device.set_message(b'#A1234\n')
+        self.assertRaises(Vxi11Error, inst.read_block)
+        self.device.set_message(b'1234\n')
+        self.assertRaises(Vxi11Error, inst.read_block)
+        self.device.set_message(b'#210abc\n')
+        self.assertRaises(Vxi11Error, inst.read_block)
+
+    def test_read_error(self):
+        inst = self.driver()
+        self.assertRaises(Vxi11Error, inst.read_raw)
+        self.assertRaises(Vxi11Error, inst.read_into, bytearray(10), exact=True)
+
+    def test_broken_pipeline_is_not_pooled(self):
+        inst = self.driver(keep_link=True)
+        inst.READ_CHUNK = 10
+        self.device.set_message(bytes(100))
+        client = inst.client
+        recv_reply = client.recv_reply
+
+        def failing_recv(*args):
+            client.recv_reply = recv_reply
+            recv_reply(*args)
+            raise KeyboardInterrupt
+
+        client.recv_reply = failing_recv
+        self.assertRaises(KeyboardInterrupt, inst.read_into, bytearray(100), exact=True)
+        inst.finalize()
+        self.assertEqual(client.sock.fileno(), -1)
+        self.assertIsNone(vxi11.LINK_POOL.acquire('127.0.0.1', 'inst0'))
+
+    def intr_threads(self):
+        return [thread for thread in threading.enumerate() if thread.name.startswith('vxi11-intr-')]
+
+    def test_srq(self):
+        inst = self.driver()
+        inst.enable_srq()
+        self.assertEqual(self.device.srq_handle, str(inst.link).encode('ascii'))
+        called = []
+        inst.subscribe_srq(lambda: called.append(1))
+        future = inst.srq_future()
+        self.assertFalse(inst.wait_srq(0))
+
+        self.device.fire_srq()
+        self.assertTrue(inst.wait_srq(5))
+        self.assertIsNone(future.result(5))
+        self.assertEqual(called, [1])
+        self.assertFalse(inst.wait_srq(0))
+
+        # The service request arrives before the wait.
+        future = inst.srq_future()
+        self.device.fire_srq()
+        self.assertTrue(inst.wait_srq(0))
+        self.assertTrue(future.done())
+        self.assertEqual(called, [1, 1])
+
+    def test_srq_callback_error(self):
+        inst = self.driver()
+        inst.enable_srq()
+        called = []
+
+        def failing():
+            raise ValueError
+
+        inst.subscribe_srq(failing)
+        inst.subscribe_srq(lambda: called.append(1))
+        self.device.fire_srq()
+        self.assertTrue(inst.wait_srq(5))
+        self.assertEqual(called, [1])
+        inst.unsubscribe_srq(failing)
+        self.assertEqual(len(inst._srq_subscribers), 1)
+
+    def test_disable_srq(self):
+        inst = self.driver()
+        inst.enable_srq()
+        server = inst._intr
+        self.assertEqual(len(self.intr_threads()), 1)
+        inst.disable_srq()
+        self.assertIsNone(inst._intr)
+        self.assertIsNone(self.device.intr)
+        self.assertIsNone(self.device.srq_handle)
+        self.assertEqual(server.sock.fileno(), -1)
+        self.assertFalse(server._thread.is_alive())
+        self.assertEqual(self.intr_threads(), [])
+        inst.disable_srq()
+
+    def test_finalize_disables_srq(self):
+        inst = self.driver()
+        inst.enable_srq()
+        server = inst._intr
+        inst.finalize()
+        self.assertFalse(server._thread.is_alive())
+        self.assertIsNone(self.device.intr)
+
+    def test_intr_chan_error(self):
+        inst = self.driver()
+        self.device.intr_error = vxi11.ERROR_CODES.CHANNEL_NOT_ESTABLISHED
+        self.assertRaises(Vxi11Error, inst.enable_srq)
+        self.assertIsNone(inst._intr)
+        self.assertEqual(self.intr_threads(), [])
+
+    def test_keep_link(self):
+        inst = self.driver(keep_link=True)
+        link = inst.link
+        inst.finalize()
+        inst = self.driver(keep_link=True)
+        self.assertEqual(inst.link, link)
+        self.assertEqual(self.device.links, 1)
+        inst.finalize()
+        inst = self.driver()
+        self.assertEqual(self.device.links, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()